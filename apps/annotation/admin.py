@@ -5,6 +5,7 @@ from simple_history.admin import SimpleHistoryAdmin
 
 from apps.annotation.models import Annotation
 from apps.annotation.models import AnnotationRequest
+from apps.annotation.models import URLAlias
 
 
 def truncate(string, allowed_max=20):
@@ -26,12 +27,12 @@ def truncate_url(string, allowed_max):
 class AnnotationAdmin(SimpleHistoryAdmin):
     date_hierarchy = 'create_date'
     list_display = ('short_url', 'publisher', 'short_quote', 'active', 'check_status',
-                    'annotation_link_title', 'create_date', 'short_annotation_link', 'short_comment', 'count_upvote')
+                    'annotation_link_title', 'create_date', 'short_annotation_link', 'short_comment', 'upvote_count')
     list_filter = ('active', 'check_status')
     list_editable = ('check_status',)
     fields = ('user', 'url', 'publisher', 'quote', 'active', 'check_status',
-              'annotation_link_title', 'create_date', 'annotation_link', 'comment', 'count_upvote')
-    readonly_fields = ('user', 'create_date', 'count_upvote')
+              'annotation_link_title', 'create_date', 'annotation_link', 'comment', 'upvote_count')
+    readonly_fields = ('user', 'create_date', 'upvote_count')
 
     url_path_max_chars = 20
 
@@ -62,3 +63,16 @@ class AnnotationRequestAdmin(SimpleHistoryAdmin):
 
 
 admin.site.register(AnnotationRequest, AnnotationRequestAdmin)
+
+
+class URLAliasAdmin(admin.ModelAdmin):
+    """
+    Saving an alias merges everything stored under the alias URL into the canonical URL
+    """
+    list_display = ('alias_url_id', 'canonical_url_id', 'create_date')
+    search_fields = ('alias_url_id', 'canonical_url_id')
+    fields = ('alias_url', 'canonical_url', 'alias_url_id', 'canonical_url_id', 'create_date')
+    readonly_fields = ('alias_url_id', 'canonical_url_id', 'create_date')
+
+
+admin.site.register(URLAlias, URLAliasAdmin)
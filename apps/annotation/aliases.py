@@ -0,0 +1,105 @@
+"""
+Resolution of alternate URLs of a page (see URLAlias) to its canonical URL.
+
+Every annotation lookup by URL resolves it first, so mappings are cached twice:
+  - in the shared cache (invalidated when an alias is saved or deleted, see signals),
+  - in the process memory, for a short time only (ANNOTATION_URL_ALIAS_LOCAL_TIMEOUT), since other processes
+    cannot invalidate it; this is also as long as a new alias may be ignored by some of the processes.
+URLs without an alias are cached as well, so a miss costs a single query of the unique alias_hash index.
+"""
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
+
+from apps.annotation.models import Annotation, AnnotationRequest, URLAlias
+from apps.annotation.utils import get_url_id_domain, hash_url_id
+
+URL_ALIAS_KEY = 'url-alias:{url_hash}'
+
+# url_hash -> (expiration time, (canonical url_id, canonical url_hash) or () if the URL is not an alias)
+_local_aliases = {}
+
+
+def resolve_url_alias(url_id):
+    """
+    Return (url_id, url_hash) of the canonical URL of url_id (url_id itself if it is not an alias)
+    """
+    return resolve_url_aliases([url_id])[url_id]
+
+
+def resolve_url_aliases(url_ids):
+    """
+    Batch version of resolve_url_alias: return dict of url_id -> (canonical url_id, canonical url_hash)
+    """
+    now = time.monotonic()
+    url_hashes = {url_id: hash_url_id(url_id) for url_id in url_ids}
+    canonical = {}
+    for url_id, url_hash in url_hashes.items():
+        expires, value = _local_aliases.get(url_hash, (0, ()))
+        if expires > now or not url_hash:
+            canonical[url_hash] = value
+
+    missing = {URL_ALIAS_KEY.format(url_hash=url_hash): url_hash
+               for url_hash in set(url_hashes.values()) - set(canonical)}
+    if missing:
+        fetched = {missing[key]: value for key, value in cache.get_many(missing).items()}
+        not_cached = set(missing.values()) - set(fetched)
+        if not_cached:
+            aliases = {alias_hash: (canonical_url_id, canonical_hash) for alias_hash, canonical_url_id, canonical_hash
+                       in URLAlias.objects.filter(alias_hash__in=not_cached).values_list(
+                           'alias_hash', 'canonical_url_id', 'canonical_hash')}
+            fetched.update({url_hash: aliases.get(url_hash, ()) for url_hash in not_cached})
+            cache.set_many({URL_ALIAS_KEY.format(url_hash=url_hash): fetched[url_hash] for url_hash in not_cached},
+                           settings.ANNOTATION_URL_ALIAS_CACHE_TIMEOUT)
+        _set_local(fetched, now)
+        canonical.update(fetched)
+
+    return {url_id: canonical[url_hash] or (url_id, url_hash) for url_id, url_hash in url_hashes.items()}
+
+
+def _set_local(aliases, now):
+    if len(_local_aliases) + len(aliases) > settings.ANNOTATION_URL_ALIAS_LOCAL_SIZE:
+        _local_aliases.clear()
+    expires = now + settings.ANNOTATION_URL_ALIAS_LOCAL_TIMEOUT
+    _local_aliases.update({url_hash: (expires, value) for url_hash, value in aliases.items()})
+
+
+def invalidate_url_alias(url_hash):
+    if not url_hash:
+        return
+    key = URL_ALIAS_KEY.format(url_hash=url_hash)
+    cache.delete(key)
+    transaction.on_commit(lambda: cache.delete(key))
+    _local_aliases.pop(url_hash, None)
+
+
+def merge_url_alias(alias):
+    """
+    Move everything stored under the alias URL to the canonical URL; return hashes of the affected URLs
+    """
+    # Aliases of the alias (now an alias itself) point at the canonical URL from now on
+    for alias_hash in URLAlias.objects.filter(canonical_hash=alias.alias_hash).values_list('alias_hash', flat=True):
+        invalidate_url_alias(alias_hash)
+    URLAlias.objects.filter(canonical_hash=alias.alias_hash).update(
+        canonical_url=alias.canonical_url, canonical_url_id=alias.canonical_url_id,
+        canonical_hash=alias.canonical_hash
+    )
+    domain = get_url_id_domain(alias.canonical_url_id)
+    moved_ids = list(Annotation.objects.filter(url_hash=alias.alias_hash).values_list('id', flat=True))
+    for model in (Annotation, AnnotationRequest):
+        model.objects.filter(url_hash=alias.alias_hash).update(
+            url_id=alias.canonical_url_id, url_hash=alias.canonical_hash, domain=domain
+        )
+    # The history keeps the URL annotations had and gets the move recorded, the same as a save would,
+    # so the changes feed lists the annotations as gone from the alias URL and new at the canonical one
+    History = Annotation.history.model
+    history_date = timezone.now()
+    History.objects.bulk_create([History(
+        history_date=history_date, history_type='~',
+        **{field.attname: getattr(annotation, field.attname) for field in Annotation._meta.fields
+           if field.name not in History._history_excluded_fields}
+    ) for annotation in Annotation.objects.filter(id__in=moved_ids)])
+    return alias.alias_hash, alias.canonical_hash
@@ -0,0 +1,139 @@
+"""
+Columnar snapshots of annotation data for analytical queries run off the production database.
+
+Every table is written (see write_snapshot, run daily by Celery) to a separate gzipped JSON file:
+
+    {"table": "annotations", "row_count": 2, "columns": {
+        "id": {"values": [1, 2]},
+        "create_date": {"values": [1546300800, 1546387200]},                   # Unix timestamps
+        "publisher": {"dictionary": ["PP", "DEMAGOG"], "values": [0, 0]},      # dictionary encoded
+        ...
+    }}
+
+Low-cardinality columns are dictionary encoded: values are indexes into the dictionary.
+Columns can be read with the query helpers, e.g. upvotes per publisher per month:
+
+    annotations, upvotes = load_table('annotations'), load_table('annotationUpvotes')
+    publishers = dict(annotations.rows('id', 'publisher'))
+    count_by(upvotes.rows('annotation_id', 'create_date'), lambda id, date: (publishers[id], month(date)))
+"""
+import gzip
+import json
+import os
+from collections import Counter
+from datetime import datetime
+
+from django.conf import settings
+from django.utils import timezone
+
+from apps.annotation.models import Annotation, AnnotationReport, AnnotationRequest, AnnotationUpvote
+
+
+# Table name -> (model, columns, dictionary encoded columns)
+SNAPSHOT_TABLES = {
+    'annotations': (
+        Annotation,
+        ('id', 'user_id', 'create_date', 'active', 'publisher', 'pp_category', 'demagog_category', 'check_status',
+         'annotation_request_id', 'upvote_count', 'domain'),
+        ('publisher', 'pp_category', 'demagog_category', 'check_status', 'domain'),
+    ),
+    'annotationRequests': (
+        AnnotationRequest,
+        ('id', 'user_id', 'create_date', 'active', 'domain'),
+        ('domain',),
+    ),
+    'annotationUpvotes': (
+        AnnotationUpvote,
+        ('id', 'user_id', 'annotation_id', 'create_date'),
+        (),
+    ),
+    'annotationReports': (
+        AnnotationReport,
+        ('id', 'user_id', 'annotation_id', 'create_date', 'reason'),
+        ('reason',),
+    ),
+}
+
+
+def get_snapshot_path(table, directory=None):
+    return os.path.join(directory or settings.ANALYTICS_SNAPSHOT_DIR, '{}.json.gz'.format(table))
+
+
+def encode_value(value):
+    if isinstance(value, datetime):
+        return int(value.timestamp())
+    return value
+
+
+def dictionary_encode(values):
+    dictionary = {}
+    encoded = [dictionary.setdefault(value, len(dictionary)) for value in values]
+    return {'dictionary': list(dictionary), 'values': encoded}
+
+
+def build_table(table):
+    model, columns, dictionary_columns = SNAPSHOT_TABLES[table]
+    values = {column: [] for column in columns}
+    rows = model.objects.order_by('pk').values_list(*columns).iterator(chunk_size=settings.ANNOTATION_EXPORT_CHUNK_SIZE)
+    for row in rows:
+        for column, value in zip(columns, row):
+            values[column].append(encode_value(value))
+
+    encoded_columns = {
+        column: dictionary_encode(values[column]) if column in dictionary_columns else {'values': values[column]}
+        for column in columns
+    }
+    return {'table': table, 'row_count': len(values['id']), 'columns': encoded_columns}
+
+
+def write_snapshot(directory=None):
+    directory = directory or settings.ANALYTICS_SNAPSHOT_DIR
+    os.makedirs(directory, exist_ok=True)
+    for table in SNAPSHOT_TABLES:
+        path = get_snapshot_path(table, directory)
+        # Readers never see a partially written file
+        temporary_path = '{}.tmp'.format(path)
+        with gzip.open(temporary_path, 'wt', encoding='utf8') as snapshot_file:
+            json.dump(build_table(table), snapshot_file, separators=(',', ':'))
+        os.replace(temporary_path, path)
+
+
+class Table:
+    def __init__(self, name, row_count, columns):
+        self.name = name
+        self.row_count = row_count
+        self.columns = columns
+
+    def column(self, name):
+        column = self.columns[name]
+        if 'dictionary' in column:
+            dictionary = column['dictionary']
+            return [dictionary[index] for index in column['values']]
+        return column['values']
+
+    def rows(self, *names):
+        return zip(*(self.column(name) for name in names))
+
+    def value_counts(self, name):
+        """
+        Number of rows per value of the column, computed without decoding dictionary encoded columns
+        """
+        column = self.columns[name]
+        counts = Counter(column['values'])
+        if 'dictionary' in column:
+            return Counter({column['dictionary'][index]: count for index, count in counts.items()})
+        return counts
+
+
+def load_table(name, directory=None):
+    with gzip.open(get_snapshot_path(name, directory), 'rt', encoding='utf8') as snapshot_file:
+        data = json.load(snapshot_file)
+    return Table(data['table'], data['row_count'], data['columns'])
+
+
+def count_by(rows, key):
+    return Counter(key(*row) for row in rows)
+
+
+def month(timestamp):
+    return timezone.localtime(datetime.fromtimestamp(timestamp, timezone.utc)).strftime('%Y-%m')
@@ -0,0 +1,87 @@
+"""
+Cache of user-independent annotation data per URL (identified by url_hash, see AnnotationBase).
+
+Annotations of a single (popular) page are requested over and over again by all users visiting it,
+so everything that does not depend on the request user is kept in the shared cache and invalidated
+on every write concerning the URL (see signals).
+
+Every such write also changes the version of the URL, which lets the API answer conditional requests
+(If-None-Match) without querying anything.
+"""
+import hashlib
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+URL_ANNOTATIONS_KEY = 'annotations:url:{url_hash}'
+URL_VERSION_KEY = 'annotations:url-version:{url_hash}'
+
+
+def get_url_annotations(url_hash, fetch):
+    """
+    Return cached list of annotations for url_hash; on cache miss evaluate fetch() and cache the result.
+    """
+    return get_many_url_annotations([url_hash], lambda url_hashes: fetch())[url_hash]
+
+
+def get_many_url_annotations(url_hashes, fetch):
+    """
+    Batch version of get_url_annotations: return dict of url_hash -> list of annotations.
+    On cache miss fetch(missing_url_hashes) is evaluated just once for all the missing URLs.
+    """
+    # Lists are tagged with the URL version read before fetching them (the same way as snapshots),
+    # so a list fetched before a concurrent write, but cached after its invalidation, is never used
+    versions = {url_hash: get_url_version(url_hash) for url_hash in url_hashes}
+    keys = {URL_ANNOTATIONS_KEY.format(url_hash=url_hash): url_hash for url_hash in url_hashes}
+    url_annotations = {keys[key]: entry['annotations'] for key, entry in cache.get_many(keys).items()
+                       if entry['version'] == versions[keys[key]]}
+
+    missing_url_hashes = set(url_hashes) - set(url_annotations)
+    if missing_url_hashes:
+        fetched = {url_hash: [] for url_hash in missing_url_hashes}
+        for annotation in fetch(missing_url_hashes):
+            fetched[annotation.url_hash].append(annotation)
+        cache.set_many({URL_ANNOTATIONS_KEY.format(url_hash=url_hash): {
+            'version': versions[url_hash],
+            'annotations': annotations,
+        } for url_hash, annotations in fetched.items()}, settings.ANNOTATION_URL_CACHE_TIMEOUT)
+        url_annotations.update(fetched)
+    return url_annotations
+
+
+def invalidate_url(url_hash):
+    if not url_hash:
+        return
+    key = URL_ANNOTATIONS_KEY.format(url_hash=url_hash)
+    cache.delete(key)
+    # Until the transaction is committed other requests can still fetch (and cache) the old data, so repeat it
+    transaction.on_commit(lambda: cache.delete(key))
+    bump_url_version(url_hash)
+
+
+def get_url_version(url_hash):
+    key = URL_VERSION_KEY.format(url_hash=url_hash)
+    # Versions are random rather than incremented, so a version evicted from the cache is never reused
+    version = uuid.uuid4().hex
+    if not cache.add(key, version, settings.ANNOTATION_URL_VERSION_TIMEOUT):
+        version = cache.get(key, version)
+    return version
+
+
+def bump_url_version(url_hash):
+    if not url_hash:
+        return
+    key = URL_VERSION_KEY.format(url_hash=url_hash)
+    cache.set(key, uuid.uuid4().hex, settings.ANNOTATION_URL_VERSION_TIMEOUT)
+    # Data read (and tagged with the new version) before the commit is outdated as well
+    transaction.on_commit(lambda: cache.set(key, uuid.uuid4().hex, settings.ANNOTATION_URL_VERSION_TIMEOUT))
+
+
+def get_url_etag(url_hash, *parts):
+    """
+    Strong ETag of a response depending only on data of url_hash and on parts (e.g. the request user and query)
+    """
+    value = '|'.join(str(part) for part in (url_hash, get_url_version(url_hash)) + parts)
+    return '"{}"'.format(hashlib.md5(value.encode('utf8')).hexdigest())
@@ -0,0 +1,67 @@
+"""
+Index of annotated URLs per domain (see AnnotatedURL).
+
+Counting annotations of a whole domain on request would mean grouping all its rows, so the counts are kept
+per URL instead and every write concerning a URL recounts just that URL (a couple of queries of the url_hash index).
+Writes bypassing model signals (queryset updates) refresh the URLs they touch explicitly.
+
+Two transactions may recount the same URL not indexed yet at once, so on PostgreSQL the counts are upserted
+(INSERT ... ON CONFLICT) rather than inserted after a lookup, which would fail the later insert on the unique url_hash.
+"""
+from django.db import connection
+from django.db.models import Count, Max
+
+from apps.annotation.models import AnnotatedURL, Annotation, AnnotationRequest
+from apps.annotation.utils import get_url_id_domain
+
+
+def refresh_annotated_urls(url_hashes):
+    url_hashes = {url_hash for url_hash in url_hashes if url_hash}
+    if not url_hashes:
+        return
+
+    def count(model, **extra):
+        return {
+            row['url_hash']: row for row in model.objects.filter(
+                active=True, url_hash__in=url_hashes
+            ).order_by().values('url_hash').annotate(count=Count('id'), url_id=Max('url_id'), **extra)
+        }
+
+    annotation_counts = count(Annotation, last_date=Max('create_date'))
+    request_counts = count(AnnotationRequest)
+
+    AnnotatedURL.objects.filter(url_hash__in=url_hashes - set(annotation_counts) - set(request_counts)).delete()
+    rows = []
+    # In the order of the index, so that concurrent upserts of several URLs lock them in the same order
+    for url_hash in sorted(set(annotation_counts) | set(request_counts)):
+        annotations = annotation_counts.get(url_hash, {})
+        requests = request_counts.get(url_hash, {})
+        url_id = annotations.get('url_id') or requests['url_id']
+        rows.append({
+            'url_hash': url_hash,
+            'url_id': url_id,
+            'domain': get_url_id_domain(url_id),
+            'annotation_count': annotations.get('count', 0),
+            'annotation_request_count': requests.get('count', 0),
+            'last_annotation_date': annotations.get('last_date'),
+        })
+    if not rows:
+        return
+    if connection.vendor == 'postgresql':
+        upsert_annotated_urls(rows)
+    else:
+        for row in rows:
+            AnnotatedURL.objects.update_or_create(url_hash=row.pop('url_hash'), defaults=row)
+
+
+def upsert_annotated_urls(rows):
+    columns = list(rows[0])
+    sql = 'INSERT INTO {table} ({columns}) VALUES {values} ON CONFLICT (url_hash) DO UPDATE SET {updates}'.format(
+        table=AnnotatedURL._meta.db_table,
+        columns=', '.join(columns),
+        values=', '.join(['({})'.format(', '.join(['%s'] * len(columns)))] * len(rows)),
+        updates=', '.join('{column} = EXCLUDED.{column}'.format(column=column)
+                          for column in columns if column != 'url_hash'),
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [row[column] for row in rows for column in columns])
@@ -0,0 +1,56 @@
+"""
+Full dumps of annotation data (for backups and research partners) as NDJSON or CSV.
+
+Rows are read with a server-side cursor in chunks and formatted one by one, so an export of any size
+is produced in constant memory; both the export view and the export_annotations command stream it.
+"""
+import csv
+import json
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+
+from apps.annotation.models import Annotation, AnnotationRequest, AnnotationUpvote
+
+EXPORT_MODELS = {
+    'annotations': Annotation,
+    'annotationRequests': AnnotationRequest,
+    'annotationUpvotes': AnnotationUpvote,
+}
+EXPORT_FORMATS = {
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv',
+}
+# Personal data, left out of the exports
+EXCLUDED_FIELDS = {'notification_email'}
+
+
+def get_export_fields(model):
+    return [field.attname for field in model._meta.concrete_fields if field.name not in EXCLUDED_FIELDS]
+
+
+def export_rows(model, since=None):
+    queryset = model.objects.order_by('pk')
+    if since is not None:
+        queryset = queryset.filter(create_date__gte=since)
+    return queryset.values_list(*get_export_fields(model)).iterator(chunk_size=settings.ANNOTATION_EXPORT_CHUNK_SIZE)
+
+
+class Echo:
+    # File-like object for csv.writer, which just returns the written line
+    def write(self, value):
+        return value
+
+
+def export_lines(model, export_format, since=None):
+    fields = get_export_fields(model)
+    rows = export_rows(model, since)
+    if export_format == 'csv':
+        writer = csv.writer(Echo())
+        yield writer.writerow(fields)
+        for row in rows:
+            # Structured values (range) as JSON rather than as Python reprs
+            yield writer.writerow([json.dumps(value) if isinstance(value, (dict, list)) else value for value in row])
+    else:
+        for row in rows:
+            yield json.dumps(dict(zip(fields, row)), cls=DjangoJSONEncoder) + '\n'
@@ -8,6 +8,7 @@ from django_filters.constants import EMPTY_VALUES
 from drf_yasg import openapi
 from rest_framework.filters import BaseFilterBackend
 
+from apps.annotation.aliases import resolve_url_alias
 from apps.annotation.utils import standardize_url_id
 
 
@@ -27,18 +28,29 @@ class StandardizedURLFilterBackend(BaseFilterBackend):
         assert hasattr(view, 'url_filter_model_field'), \
             f"{self.__class__.__name__} filter requires view to define url_filter_model_field attr"
 
+        url_hash = self.get_url_hash(request)
+        if url_hash:
+            # url_filter_model_field is expected to hold hash_url_id digest (of the canonical URL, see URLAlias),
+            # which (contrary to url_id) is indexed
+            return queryset.filter(**{
+                "{field}__exact".format(field=view.url_filter_model_field): url_hash
+            })
+        return queryset
+
+    def get_filter_value(self, request):
         header_value = request.META.get(self.secret_url_meta_key)
         param_value = request.query_params.get(self.url_data_query_param)
         if header_value and param_value and header_value != param_value:
             raise ConflictingFilterValueError({'url': 'Different URLs specified via header and via params; '
                                                       'please use only one of these'})
+        return header_value or param_value
 
-        filter_value = header_value or param_value
+    def get_url_hash(self, request):
+        filter_value = self.get_filter_value(request)
         if filter_value:
-            return queryset.filter(**{
-                "{field}__exact".format(field=view.url_filter_model_field): standardize_url_id(filter_value)
-            })
-        return queryset
+            url_id, url_hash = resolve_url_alias(standardize_url_id(filter_value))
+            return url_hash
+        return None
 
     # This non-standard header filter requires header param definiton to be injected manually into auto_swagger_schema;
     # It is provided by this method
@@ -0,0 +1,54 @@
+"""
+Indexes created with SQL by migrations, since Django (2.0) cannot declare partial indexes nor build them concurrently.
+
+On PostgreSQL they are built concurrently, so the tables are not locked for writes meanwhile
+(which cannot be done inside a transaction, so migrations using them are not atomic).
+On other databases (tests) plain composite indexes are created instead, since a partial index is used there only
+if the query repeats its predicate literally (while Django binds True as a parameter).
+
+SQLite alters tables by rebuilding them, losing indexes created with SQL, so migrations altering the tables
+create LIST_INDEXES again (restore_list_indexes, which does nothing on PostgreSQL, so those migrations stay atomic).
+"""
+
+# (name, table, columns, predicate) of indexes matching the list queries: annotations (and requests) of a URL
+# newest first, everything newest first (keyset pagination) and the lookup of Demagog statements when syncing
+LIST_INDEXES = [
+    ('annotation_active_url_date_idx', 'annotation_annotation', '(url_hash, create_date DESC)', 'active'),
+    ('annotation_active_date_idx', 'annotation_annotation', '(create_date DESC, id DESC)', 'active'),
+    ('annotation_publisher_id_idx', 'annotation_annotation', '(publisher, publisher_annotation_id)',
+     'publisher_annotation_id IS NOT NULL'),
+    ('annotationrequest_active_url_date_idx', 'annotation_annotationrequest', '(url_hash, create_date DESC)',
+     'active'),
+    ('annotationrequest_active_date_idx', 'annotation_annotationrequest', '(create_date DESC, id DESC)', 'active'),
+]
+
+
+def create_index(schema_editor, name, table, columns, predicate=None):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute('CREATE INDEX CONCURRENTLY IF NOT EXISTS {} ON {} {}{}'.format(
+            name, table, columns, ' WHERE {}'.format(predicate) if predicate else ''
+        ))
+    else:
+        schema_editor.execute('CREATE INDEX IF NOT EXISTS {} ON {} {}'.format(name, table, columns))
+
+
+def drop_index(schema_editor, name):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute('DROP INDEX CONCURRENTLY IF EXISTS {}'.format(name))
+    else:
+        schema_editor.execute('DROP INDEX IF EXISTS {}'.format(name))
+
+
+def create_list_indexes(apps, schema_editor):
+    for name, table, columns, predicate in LIST_INDEXES:
+        create_index(schema_editor, name, table, columns, predicate)
+
+
+def drop_list_indexes(apps, schema_editor):
+    for name, table, columns, predicate in LIST_INDEXES:
+        drop_index(schema_editor, name)
+
+
+def restore_list_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor == 'sqlite':
+        create_list_indexes(apps, schema_editor)
@@ -0,0 +1,40 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Case, CharField, Value, When
+
+from apps.annotation.models import Annotation, AnnotationRequest
+from apps.annotation.utils import hash_url_id
+
+
+class Command(BaseCommand):
+    help = 'Fill url_hash of rows saved before the field was introduced. ' \
+           'Works in small batches (one short transaction each), so it is safe to interrupt and run again.'
+
+    models = (Annotation, AnnotationRequest, Annotation.history.model)
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--start-id', type=int, default=0,
+                            help='Skip rows with primary key lower than this value')
+
+    def handle(self, *args, **options):
+        for model in self.models:
+            updated = self.backfill(model, options['batch_size'], options['start_id'])
+            self.stdout.write('{model}: {updated} rows updated'.format(model=model.__name__, updated=updated))
+
+    def backfill(self, model, batch_size, start_id):
+        # Rows already hashed are skipped, which makes the command resumable
+        queryset = model.objects.filter(url_hash='').exclude(url_id='').order_by('pk')
+        last_id = start_id - 1
+        updated = 0
+        while True:
+            batch = list(queryset.filter(pk__gt=last_id).values_list('pk', 'url_id')[:batch_size])
+            if not batch:
+                return updated
+            with transaction.atomic():
+                updated += model.objects.filter(pk__in=[pk for pk, url_id in batch]).update(url_hash=Case(
+                    *[When(pk=pk, then=Value(hash_url_id(url_id))) for pk, url_id in batch],
+                    output_field=CharField()
+                ))
+            last_id = batch[-1][0]
+            self.stdout.write('{model}: processed up to id={last_id}'.format(model=model.__name__, last_id=last_id))
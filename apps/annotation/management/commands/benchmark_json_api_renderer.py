@@ -0,0 +1,56 @@
+import timeit
+
+from django.contrib.auth.models import AnonymousUser
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework.request import Request
+from rest_framework_json_api.renderers import JSONRenderer as JSONAPIRenderer
+
+from apps.annotation.snapshots import SnapshotRequest
+from apps.api.renderers import JSONRenderer
+
+
+class Command(BaseCommand):
+    help = 'Measure the time of rendering a page of annotations by the JSON:API renderer of the project ' \
+           'compared with the one of rest_framework_json_api'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--size', type=int, default=10, help='Number of annotations of a response (page size)')
+        parser.add_argument('--number', type=int, default=1000, help='Number of responses rendered')
+        parser.add_argument('--repeat', type=int, default=3)
+
+    def handle(self, *args, **options):
+        from apps.annotation.views.annotations import AnnotationViewSet
+
+        # Rendered outside of any request, like snapshots are
+        request = Request(SnapshotRequest())
+        request.user = AnonymousUser()
+        view = AnnotationViewSet(request=request, action='list', format_kwarg=None, kwargs={})
+        annotations = list(view.get_shared_queryset()[:options['size']])
+        if not annotations:
+            raise CommandError('There are no annotations')
+        for annotation in annotations:
+            annotation.user_annotation_upvotes = []
+        data = view.get_serializer(annotations, many=True).data
+        renderer_context = {'view': view, 'request': request}
+
+        def render(renderer):
+            return lambda: renderer.render(data, renderer_context=renderer_context)
+
+        if render(JSONRenderer())() != render(JSONAPIRenderer())():
+            raise CommandError('Output differs')
+
+        timings = [
+            (name, min(timeit.repeat(render(renderer), number=options['number'],
+                                     repeat=options['repeat'])) / options['number'])
+            for name, renderer in (
+                ('original', JSONAPIRenderer()),
+                ('project', JSONRenderer()),
+            )
+        ]
+        self.stdout.write('{} annotations per response, output identical'.format(len(annotations)))
+        for name, elapsed in timings:
+            self.stdout.write('{:>8}: {:.3f} ms per response'.format(name, elapsed * 1000))
+        (_, original_time), (_, project_time) = timings
+        self.stdout.write('Saved: {:.3f} ms per response ({:.1%})'.format(
+            (original_time - project_time) * 1000, (original_time - project_time) / original_time
+        ))
@@ -0,0 +1,64 @@
+import copy
+import json
+import timeit
+
+from django.contrib.auth.models import AnonymousUser
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework.request import Request
+
+from apps.annotation.models import Annotation
+from apps.annotation.snapshots import SnapshotRequest
+from apps.annotation.serializers import AnnotationSerializer
+from apps.api.fields import ObjectField
+
+
+class TextRangeAnnotationSerializer(AnnotationSerializer):
+    # The way range was serialized when stored as text: parsed on every response
+    range = ObjectField(json_internal_type=True, required=False, allow_null=True)
+
+
+class Command(BaseCommand):
+    help = 'Measure the time of serializing a page of annotations with range stored as JSON (passed through) ' \
+           'compared with range stored as text (parsed on every response)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--size', type=int, default=10, help='Number of annotations of a response (page size)')
+        parser.add_argument('--number', type=int, default=1000, help='Number of responses serialized')
+        parser.add_argument('--repeat', type=int, default=3)
+
+    def handle(self, *args, **options):
+        annotations = list(Annotation.objects.select_related('user', 'annotation_request')[:options['size']])
+        if not annotations:
+            raise CommandError('There are no annotations')
+        text_annotations = [copy.copy(annotation) for annotation in annotations]
+        for annotation, text_annotation in zip(annotations, text_annotations):
+            annotation.user_annotation_upvotes = text_annotation.user_annotation_upvotes = []
+            text_annotation.range = json.dumps(annotation.range)
+
+        # Serialized outside of any request, like snapshots are
+        request = Request(SnapshotRequest())
+        request.user = AnonymousUser()
+
+        def serialize(serializer_class, instances):
+            return lambda: serializer_class(instances, many=True, context={'request': request}).data
+
+        json_data = serialize(AnnotationSerializer, annotations)()
+        text_data = serialize(TextRangeAnnotationSerializer, text_annotations)()
+        if json.dumps(json_data) != json.dumps(text_data):
+            raise CommandError('Output differs')
+
+        timings = [
+            (name, min(timeit.repeat(serialize(serializer_class, instances), number=options['number'],
+                                     repeat=options['repeat'])) / options['number'])
+            for name, serializer_class, instances in (
+                ('text', TextRangeAnnotationSerializer, text_annotations),
+                ('json', AnnotationSerializer, annotations),
+            )
+        ]
+        self.stdout.write('{} annotations per response, output identical'.format(len(annotations)))
+        for name, elapsed in timings:
+            self.stdout.write('{:>5}: {:.3f} ms per response'.format(name, elapsed * 1000))
+        (_, text_time), (_, json_time) = timings
+        self.stdout.write('Saved: {:.3f} ms per response ({:.1%})'.format(
+            (text_time - json_time) * 1000, (text_time - json_time) / text_time
+        ))
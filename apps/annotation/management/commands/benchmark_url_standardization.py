@@ -0,0 +1,120 @@
+import fnmatch
+import random
+import re
+import timeit
+from urllib.parse import parse_qsl, urlencode, urlsplit
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.annotation.models import Annotation
+from apps.annotation.utils import canonicalize_url, standardize_url, standardize_url_id
+
+
+def reference_standardize(data, with_scheme, with_host_aliases):
+    # Straightforward implementation (each form parsed separately, rules not precompiled, nothing cached)
+    # used as the reference of the expected output
+    if not data:
+        return ''
+    config = settings.URL_CANONICALIZATION
+    url_parsed = urlsplit(data)
+    new_query_tuples = [(var_name, val) for var_name, val in parse_qsl(url_parsed.query)
+                        if not any(fnmatch.fnmatchcase(var_name, pattern) for pattern in config['OMITTED_QUERY_VARS'])]
+    path = url_parsed.path
+    for pattern, replacement in config['PATH_RULES']:
+        path = re.sub(pattern, replacement, path)
+    netloc = url_parsed.netloc
+    if with_host_aliases:
+        netloc = re.sub(config['HOST_ALIAS_PREFIX'], '', netloc, count=1)
+    return '{scheme}{netloc}{path}{query}'.format(
+        scheme=url_parsed.scheme + '://' if url_parsed.scheme and with_scheme else '',
+        netloc=netloc,
+        path=path if path else '/',
+        query='?' + urlencode(new_query_tuples) if new_query_tuples else ''
+    )
+
+
+def reference_standardize_url_id(data):
+    return reference_standardize(data, with_scheme=False, with_host_aliases=True)
+
+
+def reference_standardize_url(data):
+    return reference_standardize(data, with_scheme=True, with_host_aliases=False)
+
+
+def generate_corpus(size, distinct, seed=0):
+    """
+    URLs the way they come from the extension: article pages of news sites, often with tracking params
+    and anchors; a few popular pages make most of the traffic (Zipf-like distribution)
+    """
+    rng = random.Random(seed)
+    domains = ['wiadomosci.example.pl', 'www.news.example.com', 'm.portal.example.pl', 'blog.example.org']
+    urls = []
+    for i in range(distinct):
+        url = '{scheme}://{domain}/{section}/{slug}-{id}{extension}'.format(
+            scheme=rng.choice(['http', 'https']), domain=rng.choice(domains),
+            section=rng.choice(['kraj', 'swiat', 'gospodarka', 'nauka']), slug='artykul-o-czyms-waznym', id=i,
+            extension=rng.choice(['', '.html', '/amp'])
+        )
+        query = [(name, str(rng.randint(1, 100))) for name in rng.sample(['page', 'id', 'a'], rng.randint(0, 2))]
+        trackers = ['utm_source', 'utm_medium', 'utm_campaign', 'fbclid', 'gclid', 'ref']
+        query += [(name, 'facebook') for name in rng.sample(trackers, rng.randint(0, 3))]
+        rng.shuffle(query)
+        if query:
+            url += '?' + urlencode(query)
+        if rng.random() < 0.2:
+            url += '#comments'
+        urls.append(url)
+    weights = [1 / (rank + 1) for rank in range(distinct)]
+    return rng.choices(urls, weights, k=size)
+
+
+class Command(BaseCommand):
+    help = 'Compare throughput of URL standardization (both forms per URL) with a straightforward implementation ' \
+           'and check that the output is identical'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--size', type=int, default=100000, help='Number of URLs standardized')
+        parser.add_argument('--distinct', type=int, default=5000, help='Number of distinct URLs of the corpus')
+        parser.add_argument('--from-db', action='store_true', help='Use URLs of the stored annotations instead')
+        parser.add_argument('--repeat', type=int, default=3)
+
+    def handle(self, *args, **options):
+        if options['from_db']:
+            urls = list(Annotation.objects.values_list('url', flat=True)[:options['size']])
+            if not urls:
+                raise CommandError('There are no annotations')
+        else:
+            urls = generate_corpus(options['size'], options['distinct'])
+
+        mismatches = [url for url in set(urls)
+                      if (standardize_url(url), standardize_url_id(url)) !=
+                      (reference_standardize_url(url), reference_standardize_url_id(url))]
+        if mismatches:
+            raise CommandError('Output differs for {} URLs, e.g. {}'.format(len(mismatches), mismatches[0]))
+
+        def run_reference():
+            for url in urls:
+                reference_standardize_url(url)
+                reference_standardize_url_id(url)
+
+        def run_engine():
+            for url in urls:
+                standardize_url(url)
+                standardize_url_id(url)
+
+        reference_time = min(timeit.repeat(run_reference, number=1, repeat=options['repeat']))
+        # Every cold pass starts with an empty cache, so only the URLs repeated within the corpus are cache hits;
+        # in warm passes (after the cold ones) all of them are, so these measure the cache lookups alone
+        engine_time = min(timeit.repeat(run_engine, setup=canonicalize_url.cache_clear,
+                                        number=1, repeat=options['repeat']))
+        cold_cache_info = canonicalize_url.cache_info()
+        warm_engine_time = min(timeit.repeat(run_engine, number=1, repeat=options['repeat']))
+
+        self.stdout.write('{} URLs ({} distinct), output identical'.format(len(urls), len(set(urls))))
+        for name, elapsed in (('reference', reference_time), ('engine', engine_time),
+                              ('warm cache', warm_engine_time)):
+            self.stdout.write('{:>10}: {:.3f}s, {:,.0f} URLs/s'.format(name, elapsed, len(urls) / elapsed))
+        self.stdout.write('Speedup: {:.1f}x ({:.1f}x with a warm cache), cold pass {}'.format(
+            reference_time / engine_time, reference_time / warm_engine_time, cold_cache_info
+        ))
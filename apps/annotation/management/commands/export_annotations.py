@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from apps.annotation import exports
+
+
+class Command(BaseCommand):
+    help = 'Dump all annotations, annotation requests or upvotes as NDJSON or CSV (to stdout or a file)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('resource', choices=list(exports.EXPORT_MODELS))
+        parser.add_argument('--format', dest='export_format', choices=list(exports.EXPORT_FORMATS),
+                            default='ndjson')
+        parser.add_argument('--since', help='Export only rows created since then (ISO 8601 date and time)')
+        parser.add_argument('--output', help='File to write to, stdout by default')
+
+    def handle(self, *args, **options):
+        since = None
+        if options['since']:
+            since = parse_datetime(options['since'])
+            if since is None:
+                raise CommandError('Invalid --since date and time: {}'.format(options['since']))
+            if timezone.is_naive(since):
+                since = timezone.make_aware(since)
+
+        lines = exports.export_lines(exports.EXPORT_MODELS[options['resource']], options['export_format'], since)
+        if options['output']:
+            with open(options['output'], 'w', newline='') as output:
+                output.writelines(lines)
+        else:
+            for line in lines:
+                self.stdout.write(line, ending='')
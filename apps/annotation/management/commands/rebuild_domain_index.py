@@ -0,0 +1,50 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Case, CharField, Value, When
+
+from apps.annotation import domains
+from apps.annotation.models import AnnotatedURL, Annotation, AnnotationRequest
+from apps.annotation.utils import get_url_id_domain
+
+
+class Command(BaseCommand):
+    help = 'Fill domain of rows saved before the field was introduced and recount annotated URLs (AnnotatedURL). ' \
+           'Works in small batches (one short transaction each), so it is safe to interrupt and run again.'
+
+    models = (Annotation, AnnotationRequest, Annotation.history.model)
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        for model in self.models:
+            updated = self.backfill(model, options['batch_size'])
+            self.stdout.write('{model}: {updated} rows updated'.format(model=model.__name__, updated=updated))
+        counted = self.recount(options['batch_size'])
+        self.stdout.write('AnnotatedURL: {counted} URLs recounted'.format(counted=counted))
+
+    def backfill(self, model, batch_size):
+        # Rows already filled are skipped, which makes the command resumable
+        queryset = model.objects.filter(domain='').exclude(url_id='').order_by('pk')
+        last_id = -1
+        updated = 0
+        while True:
+            batch = list(queryset.filter(pk__gt=last_id).values_list('pk', 'url_id')[:batch_size])
+            if not batch:
+                return updated
+            with transaction.atomic():
+                updated += model.objects.filter(pk__in=[pk for pk, url_id in batch]).update(domain=Case(
+                    *[When(pk=pk, then=Value(get_url_id_domain(url_id))) for pk, url_id in batch],
+                    output_field=CharField()
+                ))
+            last_id = batch[-1][0]
+
+    def recount(self, batch_size):
+        url_hashes = set()
+        for model in (Annotation, AnnotationRequest, AnnotatedURL):
+            url_hashes.update(model.objects.exclude(url_hash='').values_list('url_hash', flat=True).distinct())
+        url_hashes = sorted(url_hashes)
+        for start in range(0, len(url_hashes), batch_size):
+            with transaction.atomic():
+                domains.refresh_annotated_urls(url_hashes[start:start + batch_size])
+        return len(url_hashes)
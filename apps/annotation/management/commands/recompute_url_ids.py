@@ -0,0 +1,98 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Case, CharField, Value, When
+from django.utils import timezone
+
+from apps.annotation import cache, domains
+from apps.annotation.aliases import invalidate_url_alias, resolve_url_aliases
+from apps.annotation.models import Annotation, AnnotationRequest, URLAlias, URLCanonicalizationRun
+from apps.annotation.tasks import rebuild_membership_filter
+from apps.annotation.utils import get_canonicalization_rules_fingerprint, get_url_id_domain, standardize_url_id
+
+
+class Command(BaseCommand):
+    help = 'Recompute url_id (and url_hash and domain) of stored rows after the URL canonicalization rules changed. ' \
+           'Works in small batches (one short transaction each, no table locks); ' \
+           'an interrupted run is resumed where it stopped.'
+
+    models = (Annotation, AnnotationRequest, Annotation.history.model)
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--start-id', type=int, default=None,
+                            help='Skip rows with primary key lower than this value (instead of resuming)')
+        parser.add_argument('--if-rules-changed', action='store_true',
+                            help='Do nothing if the current rules have been applied already')
+
+    def handle(self, *args, **options):
+        fingerprint = get_canonicalization_rules_fingerprint()
+        run, created = URLCanonicalizationRun.objects.get_or_create(fingerprint=fingerprint)
+        if options['if_rules_changed'] and run.finish_date is not None:
+            self.stdout.write('URL canonicalization rules have not changed')
+            return
+
+        self.recompute_aliases()
+        for model in self.models:
+            start_id = options['start_id'] if options['start_id'] is not None else \
+                run.progress.get(model.__name__, -1) + 1
+            updated = self.recompute(model, options['batch_size'], start_id, run)
+            self.stdout.write('{model}: {updated} rows updated'.format(model=model.__name__, updated=updated))
+
+        # Some URLs may have no annotations left
+        rebuild_membership_filter.apply_async()
+        run.progress = {}
+        run.finish_date = timezone.now()
+        run.save()
+
+    def recompute_aliases(self):
+        # Aliases are few, and they are needed to find the canonical URLs of all the other rows
+        aliases = list(URLAlias.objects.all())
+        for alias in aliases:
+            invalidate_url_alias(alias.alias_hash)
+        for alias in aliases:
+            alias.save()
+            invalidate_url_alias(alias.alias_hash)
+        self.stdout.write('URLAlias: {count} rows recomputed'.format(count=len(aliases)))
+
+    def recompute(self, model, batch_size, start_id, run):
+        queryset = model.objects.order_by('pk')
+        last_id = start_id - 1
+        updated = 0
+        while True:
+            batch = list(queryset.filter(pk__gt=last_id).values_list(
+                'pk', 'url', 'url_id', 'url_hash', 'domain'
+            )[:batch_size])
+            if not batch:
+                return updated
+
+            canonical_urls = resolve_url_aliases({standardize_url_id(url) for pk, url, _, _, _ in batch})
+            changed = {}
+            for pk, url, url_id, url_hash, domain in batch:
+                new_url_id, new_url_hash = canonical_urls[standardize_url_id(url)]
+                new_domain = get_url_id_domain(new_url_id)
+                # Rows saved with a blank or stale url_hash or domain (e.g. by a previous release) are fixed as well
+                if (new_url_id, new_url_hash, new_domain) != (url_id, url_hash, domain):
+                    changed[pk] = (new_url_id, new_url_hash, new_domain, url_hash)
+            if changed:
+                with transaction.atomic():
+                    model.objects.filter(pk__in=changed).update(
+                        url_id=Case(*[When(pk=pk, then=Value(values[0])) for pk, values in changed.items()],
+                                    output_field=CharField()),
+                        url_hash=Case(*[When(pk=pk, then=Value(values[1])) for pk, values in changed.items()],
+                                      output_field=CharField()),
+                        domain=Case(*[When(pk=pk, then=Value(values[2])) for pk, values in changed.items()],
+                                    output_field=CharField()),
+                    )
+                    if model is not Annotation.history.model:
+                        url_hashes = set()
+                        for new_url_id, new_url_hash, new_domain, old_url_hash in changed.values():
+                            url_hashes.update((old_url_hash, new_url_hash))
+                            cache.invalidate_url(old_url_hash)
+                            cache.invalidate_url(new_url_hash)
+                        domains.refresh_annotated_urls(url_hashes)
+                updated += len(changed)
+
+            last_id = batch[-1][0]
+            run.progress[model.__name__] = last_id
+            run.save(update_fields=['progress'])
+            self.stdout.write('{model}: processed up to id={last_id}'.format(model=model.__name__, last_id=last_id))
@@ -0,0 +1,54 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Case, Count, IntegerField, Value, When
+
+from apps.annotation.models import Annotation, AnnotationUpvote
+
+
+class Command(BaseCommand):
+    help = 'Repair Annotation.upvote_count values that drifted from the actual number of AnnotationUpvote rows. ' \
+           'Works in batches (one short transaction each), so it is safe to interrupt and run again.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--dry-run', action='store_true', help='Only report drifted annotations')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        last_id = 0
+        checked, repaired = 0, 0
+        while True:
+            batch = dict(Annotation.objects.filter(pk__gt=last_id).order_by('pk').values_list(
+                'pk', 'upvote_count'
+            )[:batch_size])
+            if not batch:
+                break
+            actual_counts = dict(AnnotationUpvote.objects.filter(annotation__in=batch).order_by().values(
+                'annotation'
+            ).annotate(count=Count('*')).values_list('annotation', 'count'))
+            drifted = {pk: actual_counts.get(pk, 0) for pk, upvote_count in batch.items()
+                       if actual_counts.get(pk, 0) != upvote_count}
+
+            if drifted and not options['dry_run']:
+                with transaction.atomic():
+                    # Lock the rows and count again, so concurrent upvotes (and their F() updates) are not lost
+                    list(Annotation.objects.select_for_update().filter(pk__in=drifted).values_list('pk'))
+                    recounted = dict(AnnotationUpvote.objects.filter(annotation__in=drifted).order_by().values(
+                        'annotation'
+                    ).annotate(count=Count('*')).values_list('annotation', 'count'))
+                    Annotation.objects.filter(pk__in=drifted).update(upvote_count=Case(
+                        *[When(pk=pk, then=Value(recounted.get(pk, 0))) for pk in drifted],
+                        output_field=IntegerField()
+                    ))
+            for pk, actual_count in drifted.items():
+                self.stdout.write('Annotation id={pk}: upvote_count={stored}, actual={actual}'.format(
+                    pk=pk, stored=batch[pk], actual=actual_count
+                ))
+
+            checked += len(batch)
+            repaired += len(drifted)
+            last_id = max(batch)
+
+        self.stdout.write('Checked {checked} annotations, {repaired} drifted{dry_run}'.format(
+            checked=checked, repaired=repaired, dry_run=' (dry run, nothing changed)' if options['dry_run'] else ''
+        ))
@@ -0,0 +1,115 @@
+"""
+Bloom filter of URLs (url_hash values) having at least one active annotation.
+
+The extension downloads it to skip asking the API about pages that surely have no annotations (most of them).
+A Bloom filter may report false positives (then the extension just makes a needless API call), but never
+false negatives, so it must always contain every annotated URL:
+  - URLs are added to it as soon as annotations are saved (and committed),
+  - items cannot be removed from a Bloom filter, so it is rebuilt from scratch periodically (see CELERYBEAT_SCHEDULE);
+    until then URLs with no active annotations left are just false positives.
+The filter is built by a Celery task only, never while answering a request.
+
+Bit positions of a url_hash (hex sha1 of url_id) are computed using double hashing:
+    h1 = int(url_hash[0:8], 16), h2 = int(url_hash[8:16], 16) | 1
+    position_i = (h1 + i * h2) % size, for i in 0..hash_count-1
+and bit at position p is (bits[p // 8] >> (p % 8)) & 1.
+"""
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+from apps.annotation.models import Annotation, URLAlias
+
+MEMBERSHIP_FILTER_KEY = 'annotations:membership-filter'
+MEMBERSHIP_FILTER_LOCK_KEY = 'annotations:membership-filter:lock'
+MEMBERSHIP_FILTER_PENDING_KEY = 'annotations:membership-filter:pending'
+
+
+class BloomFilter:
+    def __init__(self, size, hash_count, bits=None):
+        self.size = size
+        self.hash_count = hash_count
+        self.bits = bytearray(bits) if bits is not None else bytearray((size + 7) // 8)
+
+    def positions(self, url_hash):
+        h1 = int(url_hash[0:8], 16)
+        h2 = int(url_hash[8:16], 16) | 1
+        return [(h1 + i * h2) % self.size for i in range(self.hash_count)]
+
+    def add(self, url_hash):
+        for position in self.positions(url_hash):
+            self.bits[position // 8] |= 1 << (position % 8)
+
+    def __contains__(self, url_hash):
+        return all(self.bits[position // 8] & (1 << (position % 8)) for position in self.positions(url_hash))
+
+
+def build_membership_filter():
+    membership_filter = BloomFilter(settings.ANNOTATION_MEMBERSHIP_FILTER_SIZE,
+                                    settings.ANNOTATION_MEMBERSHIP_FILTER_HASH_COUNT)
+    url_hashes = Annotation.objects.filter(active=True).exclude(url_hash='').values_list('url_hash', flat=True)
+    for url_hash in url_hashes.distinct().iterator():
+        membership_filter.add(url_hash)
+    # The extension checks the URL it is at, which may be an alias of the annotated one
+    for alias_hash in URLAlias.objects.filter(canonical_hash__in=url_hashes).values_list('alias_hash', flat=True):
+        membership_filter.add(alias_hash)
+    return membership_filter
+
+
+def get_membership_filter():
+    """
+    Return the filter, None if it has not been built yet (then its build is scheduled)
+    """
+    membership_filter = cache.get(MEMBERSHIP_FILTER_KEY)
+    if membership_filter is None:
+        request_membership_filter()
+    return membership_filter
+
+
+def request_membership_filter():
+    """
+    Schedule building of the filter, unless it has been scheduled already
+    """
+    from apps.annotation.tasks import rebuild_membership_filter as rebuild_membership_filter_task
+
+    if cache.add(MEMBERSHIP_FILTER_PENDING_KEY, True, settings.ANNOTATION_MEMBERSHIP_FILTER_LOCK_TIMEOUT):
+        rebuild_membership_filter_task.apply_async()
+
+
+def add_to_membership_filter(url_hash):
+    url_hashes = [url_hash] + list(URLAlias.objects.filter(canonical_hash=url_hash).values_list('alias_hash', flat=True))
+
+    def add(membership_filter):
+        if membership_filter is not None and any(url_hash not in membership_filter for url_hash in url_hashes):
+            for url_hash in url_hashes:
+                membership_filter.add(url_hash)
+            return membership_filter
+        # Nothing to change, missing filter is going to be built (including url_hash) by the task
+        return None
+
+    _update_membership_filter(add)
+
+
+def rebuild_membership_filter():
+    membership_filter = _update_membership_filter(lambda membership_filter: build_membership_filter())
+    cache.delete(MEMBERSHIP_FILTER_PENDING_KEY)
+    return membership_filter
+
+
+def _update_membership_filter(update):
+    # Read-modify-write of the whole filter, so all updates are serialized with a lock (cache.add is atomic);
+    # Rebuilding under the lock also guarantees no URL added in the meantime gets lost
+    lock_timeout = settings.ANNOTATION_MEMBERSHIP_FILTER_LOCK_TIMEOUT
+    deadline = time.monotonic() + lock_timeout
+    while not cache.add(MEMBERSHIP_FILTER_LOCK_KEY, True, lock_timeout):
+        if time.monotonic() > deadline:
+            raise TimeoutError('Could not acquire annotation membership filter lock')
+        time.sleep(0.05)
+    try:
+        membership_filter = update(cache.get(MEMBERSHIP_FILTER_KEY))
+        if membership_filter is not None:
+            cache.set(MEMBERSHIP_FILTER_KEY, membership_filter, None)
+        return membership_filter
+    finally:
+        cache.delete(MEMBERSHIP_FILTER_LOCK_KEY)
@@ -0,0 +1,51 @@
+# Generated by Django 2.0.13 on 2026-10-18 17:32
+
+from apps.annotation.utils import hash_url_id
+from django.db import migrations, models
+from django.db.models import Case, CharField, Value, When
+
+BATCH_SIZE = 1000
+
+
+def hash_url_ids(apps, schema_editor):
+    # Lookups move to url_hash in the same release, so existing rows are hashed right away
+    # (rows written by the previous release meanwhile are left to the backfill_url_hash command)
+    for model_name in ('Annotation', 'AnnotationRequest', 'HistoricalAnnotation'):
+        model = apps.get_model('annotation', model_name)
+        queryset = model.objects.exclude(url_id='').order_by('pk')
+        last_id = -1
+        while True:
+            batch = list(queryset.filter(pk__gt=last_id).values_list('pk', 'url_id')[:BATCH_SIZE])
+            if not batch:
+                break
+            model.objects.filter(pk__in=[pk for pk, url_id in batch]).update(url_hash=Case(
+                *[When(pk=pk, then=Value(hash_url_id(url_id))) for pk, url_id in batch],
+                output_field=CharField()
+            ))
+            last_id = batch[-1][0]
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('annotation', '0012_set_range_nullable'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='annotation',
+            name='url_hash',
+            field=models.CharField(blank=True, db_index=True, max_length=40),
+        ),
+        migrations.AddField(
+            model_name='annotationrequest',
+            name='url_hash',
+            field=models.CharField(blank=True, db_index=True, max_length=40),
+        ),
+        migrations.AddField(
+            model_name='historicalannotation',
+            name='url_hash',
+            field=models.CharField(blank=True, db_index=True, max_length=40),
+        ),
+        migrations.RunPython(hash_url_ids, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 2.0.13 on 2026-10-18 17:42
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery, IntegerField
+from django.db.models.functions import Coalesce
+
+
+def count_upvotes(apps, schema_editor):
+    Annotation = apps.get_model('annotation', 'Annotation')
+    AnnotationUpvote = apps.get_model('annotation', 'AnnotationUpvote')
+    upvote_counts = AnnotationUpvote.objects.filter(
+        annotation=OuterRef('pk')
+    ).order_by().values('annotation').annotate(count=Count('*')).values('count')
+    Annotation.objects.update(upvote_count=Coalesce(Subquery(upvote_counts, output_field=IntegerField()), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('annotation', '0013_add_url_hash'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='annotation',
+            name='upvote_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(count_upvotes, migrations.RunPython.noop),
+    ]
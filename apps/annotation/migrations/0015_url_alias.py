@@ -0,0 +1,30 @@
+# Generated by Django 2.0.13 on 2026-10-18 18:12
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('annotation', '0014_annotation_upvote_count'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='URLAlias',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('alias_url', models.CharField(max_length=2048)),
+                ('alias_url_id', models.CharField(editable=False, max_length=2048)),
+                ('alias_hash', models.CharField(editable=False, max_length=40, unique=True)),
+                ('canonical_url', models.CharField(max_length=2048)),
+                ('canonical_url_id', models.CharField(editable=False, max_length=2048)),
+                ('canonical_hash', models.CharField(db_index=True, editable=False, max_length=40)),
+                ('create_date', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+            options={
+                'verbose_name_plural': 'URL aliases',
+            },
+        ),
+    ]
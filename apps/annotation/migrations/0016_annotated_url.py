@@ -0,0 +1,98 @@
+# Generated by Django 2.0.13 on 2026-10-18 18:15
+
+from apps.annotation.utils import get_url_id_domain
+from django.db import migrations, models
+from django.db.models import Case, CharField, Count, Max, Value, When
+
+BATCH_SIZE = 1000
+
+
+def fill_domains(apps, schema_editor):
+    for model_name in ('Annotation', 'AnnotationRequest', 'HistoricalAnnotation'):
+        model = apps.get_model('annotation', model_name)
+        queryset = model.objects.exclude(url_id='').order_by('pk')
+        last_id = -1
+        while True:
+            batch = list(queryset.filter(pk__gt=last_id).values_list('pk', 'url_id')[:BATCH_SIZE])
+            if not batch:
+                break
+            model.objects.filter(pk__in=[pk for pk, url_id in batch]).update(domain=Case(
+                *[When(pk=pk, then=Value(get_url_id_domain(url_id))) for pk, url_id in batch],
+                output_field=CharField()
+            ))
+            last_id = batch[-1][0]
+
+
+def count_annotated_urls(apps, schema_editor):
+    # The same counts as apps.annotation.domains.refresh_annotated_urls, for all URLs at once
+    AnnotatedURL = apps.get_model('annotation', 'AnnotatedURL')
+
+    def count(model_name, **extra):
+        model = apps.get_model('annotation', model_name)
+        return {
+            row['url_hash']: row for row in model.objects.filter(active=True).exclude(
+                url_hash=''
+            ).order_by().values('url_hash').annotate(count=Count('id'), url_id=Max('url_id'), **extra)
+        }
+
+    annotation_counts = count('Annotation', last_date=Max('create_date'))
+    request_counts = count('AnnotationRequest')
+    annotated_urls = []
+    for url_hash in set(annotation_counts) | set(request_counts):
+        annotations = annotation_counts.get(url_hash, {})
+        requests = request_counts.get(url_hash, {})
+        url_id = annotations.get('url_id') or requests['url_id']
+        annotated_urls.append(AnnotatedURL(
+            url_hash=url_hash,
+            url_id=url_id,
+            domain=get_url_id_domain(url_id),
+            annotation_count=annotations.get('count', 0),
+            annotation_request_count=requests.get('count', 0),
+            last_annotation_date=annotations.get('last_date'),
+        ))
+    AnnotatedURL.objects.bulk_create(annotated_urls, batch_size=BATCH_SIZE)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('annotation', '0015_url_alias'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AnnotatedURL',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('url_hash', models.CharField(max_length=40, unique=True)),
+                ('url_id', models.CharField(max_length=2048)),
+                ('domain', models.CharField(max_length=255)),
+                ('annotation_count', models.PositiveIntegerField(default=0)),
+                ('annotation_request_count', models.PositiveIntegerField(default=0)),
+                ('last_annotation_date', models.DateTimeField(blank=True, null=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='annotation',
+            name='domain',
+            field=models.CharField(blank=True, db_index=True, max_length=255),
+        ),
+        migrations.AddField(
+            model_name='annotationrequest',
+            name='domain',
+            field=models.CharField(blank=True, db_index=True, max_length=255),
+        ),
+        migrations.AddField(
+            model_name='historicalannotation',
+            name='domain',
+            field=models.CharField(blank=True, db_index=True, max_length=255),
+        ),
+        migrations.AddIndex(
+            model_name='annotatedurl',
+            index=models.Index(fields=['domain', '-annotation_count'], name='annotatedurl_domain_count_idx'),
+        ),
+        # The index is read in the same release, so existing rows are counted right away
+        # (rows written by the previous release meanwhile are left to the rebuild_domain_index command)
+        migrations.RunPython(fill_domains, migrations.RunPython.noop),
+        migrations.RunPython(count_annotated_urls, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,16 @@
+from django.db import migrations
+
+from apps.annotation.indexes import create_list_indexes, drop_list_indexes
+
+
+class Migration(migrations.Migration):
+    # CREATE INDEX CONCURRENTLY cannot run inside a transaction
+    atomic = False
+
+    dependencies = [
+        ('annotation', '0016_annotated_url'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_list_indexes, drop_list_indexes),
+    ]
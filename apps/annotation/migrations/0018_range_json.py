@@ -0,0 +1,32 @@
+import apps.annotation.models
+from apps.annotation.indexes import restore_list_indexes
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+    # The text column is replaced in three steps, so that only the copy of the values (0019) runs outside
+    # a transaction, in batches, while the schema changes before (here) and after (0020) stay atomic
+
+    dependencies = [
+        ('annotation', '0017_list_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='annotation',
+            name='range_data',
+            field=apps.annotation.models.JSONField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='annotationrequest',
+            name='range_data',
+            field=apps.annotation.models.JSONField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='historicalannotation',
+            name='range_data',
+            field=apps.annotation.models.JSONField(blank=True, null=True),
+        ),
+        # SQLite alters tables by rebuilding them, losing indexes created with SQL
+        migrations.RunPython(restore_list_indexes, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,61 @@
+import json
+
+from django.db import migrations
+from django.db.models import Case, Value, When
+from django.db.models.functions import Cast
+
+MODELS = ('Annotation', 'AnnotationRequest', 'HistoricalAnnotation')
+BATCH_SIZE = 1000
+
+
+def parse_range(text):
+    if not text:
+        return None
+    try:
+        return json.loads(text)
+    except ValueError:
+        return None
+
+
+def copy_ranges(apps, schema_editor, read, field_from, field_to):
+    # In batches (one UPDATE of a range of rows each), since the migration itself is not atomic
+    for model_name in MODELS:
+        model = apps.get_model('annotation', model_name)
+        output_field = model._meta.get_field(field_to)
+        queryset = model.objects.exclude(**{field_from: None}).order_by('pk')
+        last_id = -1
+        while True:
+            batch = list(queryset.filter(pk__gt=last_id).values_list('pk', field_from)[:BATCH_SIZE])
+            if not batch:
+                break
+            values = {pk: read(value) for pk, value in batch}
+            values = {pk: value for pk, value in values.items() if value is not None}
+            if values:
+                # Cast, as on PostgreSQL parameters of CASE are text, which is not assignable to jsonb
+                model.objects.filter(pk__in=values).update(**{field_to: Case(
+                    *[When(pk=pk, then=Cast(Value(value, output_field=output_field), output_field))
+                      for pk, value in values.items()],
+                    output_field=output_field
+                )})
+            last_id = batch[-1][0]
+
+
+def forwards(apps, schema_editor):
+    copy_ranges(apps, schema_editor, parse_range, 'range', 'range_data')
+
+
+def backwards(apps, schema_editor):
+    copy_ranges(apps, schema_editor, json.dumps, 'range_data', 'range')
+
+
+class Migration(migrations.Migration):
+    # Data only, so an interrupted copy leaves both columns in place and the migration can simply be run again
+    atomic = False
+
+    dependencies = [
+        ('annotation', '0018_range_json'),
+    ]
+
+    operations = [
+        migrations.RunPython(forwards, backwards),
+    ]
@@ -0,0 +1,41 @@
+from apps.annotation.indexes import restore_list_indexes
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('annotation', '0019_range_json_copy'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='annotation',
+            name='range',
+        ),
+        migrations.RemoveField(
+            model_name='annotationrequest',
+            name='range',
+        ),
+        migrations.RemoveField(
+            model_name='historicalannotation',
+            name='range',
+        ),
+        migrations.RenameField(
+            model_name='annotation',
+            old_name='range_data',
+            new_name='range',
+        ),
+        migrations.RenameField(
+            model_name='annotationrequest',
+            old_name='range_data',
+            new_name='range',
+        ),
+        migrations.RenameField(
+            model_name='historicalannotation',
+            old_name='range_data',
+            new_name='range',
+        ),
+        # SQLite alters tables by rebuilding them, losing indexes created with SQL
+        migrations.RunPython(restore_list_indexes, migrations.RunPython.noop),
+    ]
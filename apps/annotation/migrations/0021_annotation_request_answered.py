@@ -0,0 +1,31 @@
+# Generated by Django 2.0.13 on 2026-10-18 18:42
+
+from apps.annotation.indexes import restore_list_indexes
+from django.db import migrations, models
+from django.db.models import Exists, OuterRef
+
+
+def count_answered(apps, schema_editor):
+    AnnotationRequest = apps.get_model('annotation', 'AnnotationRequest')
+    Annotation = apps.get_model('annotation', 'Annotation')
+    AnnotationRequest.objects.update(answered=Exists(
+        Annotation.objects.filter(annotation_request=OuterRef('pk'), active=True)
+    ))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('annotation', '0020_range_json_swap'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='annotationrequest',
+            name='answered',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.RunPython(count_answered, migrations.RunPython.noop),
+        # SQLite alters tables by rebuilding them, losing indexes created with SQL
+        migrations.RunPython(restore_list_indexes, migrations.RunPython.noop),
+    ]
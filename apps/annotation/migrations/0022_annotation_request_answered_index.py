@@ -0,0 +1,31 @@
+from apps.annotation.indexes import create_index, drop_index
+from django.db import migrations, models
+
+
+def create_answered_index(apps, schema_editor):
+    create_index(schema_editor, 'annotationrequest_answered_idx', 'annotation_annotationrequest',
+                 '(answered, create_date DESC)')
+
+
+def drop_answered_index(apps, schema_editor):
+    drop_index(schema_editor, 'annotationrequest_answered_idx')
+
+
+class Migration(migrations.Migration):
+    # CREATE INDEX CONCURRENTLY cannot run inside a transaction
+    atomic = False
+
+    dependencies = [
+        ('annotation', '0021_annotation_request_answered'),
+    ]
+
+    operations = [
+        # The same index as declared by the model, but built concurrently on PostgreSQL (see apps.annotation.indexes)
+        migrations.SeparateDatabaseAndState(
+            database_operations=[migrations.RunPython(create_answered_index, drop_answered_index)],
+            state_operations=[migrations.AddIndex(
+                model_name='annotationrequest',
+                index=models.Index(fields=['answered', '-create_date'], name='annotationrequest_answered_idx'),
+            )],
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 2.0.13 on 2026-10-18 18:57
+
+import apps.annotation.models
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('annotation', '0022_annotation_request_answered_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='URLCanonicalizationRun',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fingerprint', models.CharField(max_length=32, unique=True)),
+                ('progress', apps.annotation.models.JSONField(default=dict)),
+                ('finish_date', models.DateTimeField(blank=True, null=True)),
+            ],
+        ),
+    ]
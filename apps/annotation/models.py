@@ -1,4 +1,7 @@
+import json
+
 from django.conf import settings
+from django.core.exceptions import ValidationError
 from django.db import models
 from django.utils import timezone
 from simple_history.models import HistoricalRecords
@@ -6,6 +9,54 @@ from simple_history.models import HistoricalRecords
 from apps.annotation import consts
 
 URL_SUPPORTED_LENGTH = 2048
+URL_HASH_LENGTH = 40
+DOMAIN_LENGTH = 255
+
+
+class JSONField(models.TextField):
+    """
+    JSON value stored natively (jsonb) in PostgreSQL and as text elsewhere (tests);
+    model instances always hold the deserialized value, so it is parsed once when loaded rather than when serialized
+    """
+    description = 'JSON value'
+
+    def db_type(self, connection):
+        if connection.vendor == 'postgresql':
+            return 'jsonb'
+        return super().db_type(connection)
+
+    def from_db_value(self, value, expression, connection):
+        # psycopg2 deserializes jsonb by itself
+        if isinstance(value, str) and connection.vendor != 'postgresql':
+            return json.loads(value)
+        return value
+
+    def get_prep_value(self, value):
+        if value is None:
+            return None
+        return json.dumps(value)
+
+    def to_python(self, value):
+        return value
+
+    def value_to_string(self, obj):
+        return json.dumps(self.value_from_object(obj))
+
+
+class DenormalizedFieldsMixin:
+    """
+    Model whose denormalized_fields are updated in the database only (concurrently, with F() expressions
+    or by signals of other models), so saving an instance never overwrites them with its in-memory values
+    """
+    denormalized_fields = ()
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding and kwargs.get('update_fields') is None and not kwargs.get('force_insert'):
+            deferred_fields = self.get_deferred_fields()
+            kwargs['update_fields'] = [field.name for field in self._meta.concrete_fields
+                                       if not field.primary_key and field.attname not in deferred_fields and
+                                       field.name not in self.denormalized_fields]
+        super().save(*args, **kwargs)
 
 
 class UserInput(models.Model):
@@ -23,21 +74,39 @@ class AnnotationBase(UserInput):
     url_id = models.CharField(max_length=URL_SUPPORTED_LENGTH, blank=True)
     # Processed URL striped of some (probably) irrelevant data that might make identification harder
 
+    url_hash = models.CharField(max_length=URL_HASH_LENGTH, blank=True, db_index=True)
+    # Fixed-width digest of url_id; url_id itself is too long to be indexed, so all lookups by URL go through it
+
+    domain = models.CharField(max_length=DOMAIN_LENGTH, blank=True, db_index=True)
+    # Host of url_id, for lookups of everything annotated under a site
+
     active = models.BooleanField(blank=True, default=True)
     # We never actually delete models -- we only mark them as not active
 
     class Meta:
         abstract = True
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Keep whether the row has been loaded active, so that signals can tell if it has been (de)activated
+        instance.previous_active = instance.__dict__.get('active')
+        return instance
+
     def save(self, *args, **kwargs):
-        from apps.annotation.utils import standardize_url_id
-        self.url_id = standardize_url_id(self.url)
+        from apps.annotation.aliases import resolve_url_alias
+        from apps.annotation.utils import get_url_id_domain, standardize_url_id
+        # Keep the URL the row has been stored under so far, so that data cached for it can be invalidated too
+        self.previous_url_hash = self.url_hash
+        # Rows are stored under the canonical URL of the page (see URLAlias)
+        self.url_id, self.url_hash = resolve_url_alias(standardize_url_id(self.url))
+        self.domain = get_url_id_domain(self.url_id)
         super().save(*args, **kwargs)
 
 
 class LocatedAnnotationBase(AnnotationBase):
     # TODO: to be removed, quote+quote_context are the only source of location
-    range = models.TextField(max_length=1000, blank=True, null=True)
+    range = JSONField(blank=True, null=True)
     # Json data with information about the annotation location
 
     quote = models.TextField(max_length=250)
@@ -51,14 +120,25 @@ class LocatedAnnotationBase(AnnotationBase):
         abstract = True
 
 
-class AnnotationRequest(LocatedAnnotationBase):
-    
+class AnnotationRequest(DenormalizedFieldsMixin, LocatedAnnotationBase):
+    denormalized_fields = ('answered',)
+
     comment = models.TextField(max_length=250, blank=True)
 
     notification_email = models.EmailField(max_length=250, blank=True)
 
+    answered = models.BooleanField(default=False)
+    # Denormalized existence of active annotations made on the request, recounted by signals on every write of them
+
+    class Meta:
+        indexes = [
+            # Answered (or not) requests, newest first
+            models.Index(fields=['answered', '-create_date'], name='annotationrequest_answered_idx'),
+        ]
 
-class Annotation(LocatedAnnotationBase):
+
+class Annotation(DenormalizedFieldsMixin, LocatedAnnotationBase):
+    denormalized_fields = ('upvote_count',)
 
     PP_PUBLISHER = 'PP'
     DEMAGOG_PUBLISHER = 'DEMAGOG'
@@ -135,7 +215,10 @@ class Annotation(LocatedAnnotationBase):
     annotation_request = models.ForeignKey('AnnotationRequest', on_delete=models.CASCADE, null=True, blank=True)
     # Null when the annotation has not been created on request
 
-    history = HistoricalRecords()
+    upvote_count = models.PositiveIntegerField(default=0)
+    # Denormalized count of AnnotationUpvote, maintained by signals (see reconcile_upvote_counts command for repair)
+
+    history = HistoricalRecords(excluded_fields=['upvote_count'])
 
     # django-simple-history used here
 
@@ -147,9 +230,17 @@ class Annotation(LocatedAnnotationBase):
     def _history_user(self, value):
         self.changed_by = value
 
-    def count_upvote(self):
-        self.upvote_count = AnnotationUpvote.objects.filter(annotation=self).count()
-        return self.upvote_count
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Keep the request the annotation has been loaded with, so that it is recounted when the annotation is moved
+        instance.previous_annotation_request_id = instance.__dict__.get('annotation_request_id')
+        return instance
+
+    @staticmethod
+    def get_upvote_count_except_user(upvote_count, user_upvote_id):
+        # upvote_count only counts flushed upvotes, so subtract the user's stored upvote, not a pending one
+        return upvote_count - int(user_upvote_id is not None)
 
 
 class AnnotationReport(UserInput):
@@ -172,3 +263,86 @@ class AnnotationRequestFeedback(models.Model):
 
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
     annotation_request = models.ForeignKey(AnnotationRequest, on_delete=models.CASCADE)
+
+
+class AnnotatedURL(models.Model):
+    """
+    Numbers of active annotations and annotation requests of a URL (identified by url_hash),
+    recounted for the URL on every write concerning it (see apps.annotation.domains)
+    """
+    url_hash = models.CharField(max_length=URL_HASH_LENGTH, unique=True)
+    url_id = models.CharField(max_length=URL_SUPPORTED_LENGTH)
+    domain = models.CharField(max_length=DOMAIN_LENGTH)
+
+    annotation_count = models.PositiveIntegerField(default=0)
+    annotation_request_count = models.PositiveIntegerField(default=0)
+    last_annotation_date = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            # URLs of a domain, most annotated first
+            models.Index(fields=['domain', '-annotation_count'], name='annotatedurl_domain_count_idx'),
+        ]
+
+
+class URLAlias(models.Model):
+    """
+    Alternate URL of a page (AMP version, publisher redirect, syndicated copy...) mapped to its canonical URL.
+    Annotations and requests made at the alias are stored (and looked up) under the canonical URL.
+    """
+    alias_url = models.CharField(max_length=URL_SUPPORTED_LENGTH)
+    alias_url_id = models.CharField(max_length=URL_SUPPORTED_LENGTH, editable=False)
+    alias_hash = models.CharField(max_length=URL_HASH_LENGTH, unique=True, editable=False)
+
+    canonical_url = models.CharField(max_length=URL_SUPPORTED_LENGTH)
+    canonical_url_id = models.CharField(max_length=URL_SUPPORTED_LENGTH, editable=False)
+    canonical_hash = models.CharField(max_length=URL_HASH_LENGTH, db_index=True, editable=False)
+
+    create_date = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        verbose_name_plural = 'URL aliases'
+
+    def __str__(self):
+        return '{} -> {}'.format(self.alias_url_id, self.canonical_url_id)
+
+    def get_url_ids(self):
+        """
+        Return (alias_url_id, alias_hash, canonical_url_id, canonical_hash) standardized from the URLs
+        """
+        from apps.annotation.aliases import resolve_url_alias
+        from apps.annotation.utils import standardize_url_id, hash_url_id
+        alias_url_id = standardize_url_id(self.alias_url)
+        # Aliases always point directly at the canonical URL, never at another alias
+        canonical_url_id, canonical_hash = resolve_url_alias(standardize_url_id(self.canonical_url))
+        return alias_url_id, hash_url_id(alias_url_id), canonical_url_id, canonical_hash
+
+    def clean(self):
+        alias_url_id, alias_hash, canonical_url_id, canonical_hash = self.get_url_ids()
+        if alias_hash == canonical_hash:
+            raise ValidationError({'canonical_url': 'The alias and the canonical URL identify the same page'})
+        if URLAlias.objects.filter(alias_hash=alias_hash).exclude(pk=self.pk).exists():
+            raise ValidationError({'alias_url': 'There is an alias of this URL already'})
+
+    def save(self, *args, **kwargs):
+        # Keep the URL aliased so far, so that its cached resolution can be invalidated too
+        self.previous_alias_hash = self.alias_hash
+        self.alias_url_id, self.alias_hash, self.canonical_url_id, self.canonical_hash = self.get_url_ids()
+        super().save(*args, **kwargs)
+
+
+class URLCanonicalizationRun(models.Model):
+    """
+    Recomputation of url_id of stored rows with the URL canonicalization rules identified by fingerprint
+    (see recompute_url_ids command). Kept in the database rather than in the cache, which may be flushed any time.
+    """
+    fingerprint = models.CharField(max_length=32, unique=True)
+
+    progress = JSONField(default=dict)
+    # Model name -> primary key of the last row processed, so an interrupted run is resumed where it stopped
+
+    finish_date = models.DateTimeField(null=True, blank=True)
+    # Null until all the rows are recomputed with the rules
+
+    def __str__(self):
+        return self.fingerprint
@@ -1,14 +1,18 @@
+import base64
 from typing import List
 
+from django.conf import settings
 from django.contrib.auth import get_user_model
+from django.utils.functional import cached_property
 from rest_framework import serializers
 from rest_framework.exceptions import ValidationError
 from rest_framework_json_api.relations import SerializerMethodResourceRelatedField
 from rest_framework_json_api.serializers import ModelSerializer
 
+from apps.annotation import upvotes
 from apps.annotation.consts import SUGGESTED_CORRECTION
-from apps.annotation.models import AnnotationReport, AnnotationRequest
-from apps.api import fields
+from apps.annotation.models import AnnotatedURL, AnnotationReport, AnnotationRequest, URL_SUPPORTED_LENGTH
+from apps.api import fields, links
 from .models import Annotation, AnnotationUpvote
 
 
@@ -22,19 +26,17 @@ class RequestUserMixin:
         return self.context['request'].user
 
 
-class AnnotationSerializer(ModelSerializer, RequestUserMixin):
+class AnnotationSharedSerializer(ModelSerializer):
+    """
+    Annotation without any request user specific fields, so the same representation can be served to everyone
+    """
+    # Links (of every row) are built from templates rather than reversed (see apps.api.links)
+    serializer_related_field = links.TemplatedResourceRelatedField
+
     url = fields.StandardizedRepresentationURLField()
-    range = fields.ObjectField(json_internal_type=True, required=False, allow_null=True)
-    upvote_count_except_user = serializers.SerializerMethodField()
-    does_belong_to_user = serializers.SerializerMethodField()
-    annotation_upvote = SerializerMethodResourceRelatedField(
-        model=AnnotationUpvote,
-        read_only=True, source='get_user_annotation_upvote',
-        related_link_view_name='api:annotation:annotation_related_upvote',
-        related_link_url_kwarg='annotation_id'
-    )
-    self_link = serializers.HyperlinkedIdentityField(view_name='api:annotation:annotation-detail',
-                                                     lookup_url_kwarg='annotation_id')
+    range = fields.ObjectField(required=False, allow_null=True)
+    self_link = links.TemplatedHyperlinkedIdentityField(view_name='api:annotation:annotation-detail',
+                                                        lookup_url_kwarg='annotation_id')
 
     class Meta:
         model = Annotation
@@ -44,14 +46,14 @@ class AnnotationSerializer(ModelSerializer, RequestUserMixin):
             'pp_category', 'demagog_category', 'comment',
             'annotation_link', 'annotation_link_title',
 
-            'publisher', 'create_date', 'upvote_count_except_user', 'does_belong_to_user',
+            'publisher', 'create_date', 'upvote_count',
 
-            'annotation_request', 'user', 'annotation_upvote',
+            'annotation_request',
 
             'self_link'
         )
         read_only_fields = (
-            'demagog_category', 'publisher', 'create_date',
+            'demagog_category', 'publisher', 'create_date', 'upvote_count',
         )
 
         extra_kwargs = {
@@ -65,21 +67,67 @@ class AnnotationSerializer(ModelSerializer, RequestUserMixin):
             }
         }
 
+
+class AnnotationSerializer(AnnotationSharedSerializer, RequestUserMixin):
+    upvote_count_except_user = serializers.SerializerMethodField()
+    does_belong_to_user = serializers.SerializerMethodField()
+    annotation_upvote = links.TemplatedSerializerMethodResourceRelatedField(
+        model=AnnotationUpvote,
+        read_only=True, source='get_user_annotation_upvote',
+        related_link_view_name='api:annotation:annotation_related_upvote',
+        related_link_url_kwarg='annotation_id'
+    )
+
+    class Meta:
+        model = Annotation
+
+        fields = (
+            'id', 'user', 'url', 'range', 'quote', 'quote_context',
+            'pp_category', 'demagog_category', 'comment',
+            'annotation_link', 'annotation_link_title',
+
+            'publisher', 'create_date', 'upvote_count_except_user', 'does_belong_to_user',
+
+            'annotation_request', 'user', 'annotation_upvote',
+
+            'self_link'
+        )
+        read_only_fields = (
+            'demagog_category', 'publisher', 'create_date',
+        )
+
+        extra_kwargs = AnnotationSharedSerializer.Meta.extra_kwargs
+
+    @cached_property
+    def pending_upvotes(self):
+        return upvotes.get_pending_upvotes(self.request_user)
+
     def get_upvote_count_except_user(self, instance):
-        return instance.total_upvote_count - int(bool(self.get_user_annotation_upvote(instance)))
+        upvote = self.get_stored_user_annotation_upvote(instance)
+        return Annotation.get_upvote_count_except_user(instance.upvote_count, upvote.id if upvote else None)
 
     def get_does_belong_to_user(self, instance):
         return self.request_user.id == instance.user_id
 
     def get_user_annotation_upvote(self, instance):
-        # This is prefetch that results in zero or one element
+        # Including the request user's upvote intents not written yet (see apps.annotation.upvotes)
+        if instance.id in self.pending_upvotes:
+            upvote_id = self.pending_upvotes[instance.id]
+            return AnnotationUpvote(id=upvote_id, annotation=instance) if upvote_id is not None else None
+        return self.get_stored_user_annotation_upvote(instance)
+
+    def get_stored_user_annotation_upvote(self, instance):
+        # Either the id annotated by the queryset (a subquery) or a prefetch that results in zero or one element
+        if hasattr(instance, 'user_annotation_upvote_id'):
+            upvote_id = instance.user_annotation_upvote_id
+            return AnnotationUpvote(id=upvote_id, annotation=instance) if upvote_id is not None else None
         upvotes = instance.user_annotation_upvotes
         return upvotes[0] if upvotes else None
 
 
 class AnnotationPatchSerializer(AnnotationSerializer):
     # Add read_only in not DRY way
-    range = fields.ObjectField(json_internal_type=True, read_only=True)
+    range = fields.ObjectField(read_only=True)
     url = fields.StandardizedRepresentationURLField(read_only=True)
 
     class Meta:
@@ -91,6 +139,46 @@ class AnnotationPatchSerializer(AnnotationSerializer):
         extra_kwargs = AnnotationSerializer.Meta.extra_kwargs
 
 
+class AnnotationBatchSerializer(serializers.Serializer):
+    urls = serializers.ListField(
+        child=serializers.CharField(max_length=URL_SUPPORTED_LENGTH),
+        min_length=1, max_length=settings.ANNOTATION_BATCH_MAX_URLS
+    )
+
+
+class AnnotationChangesQuerySerializer(serializers.Serializer):
+    token = serializers.IntegerField(required=False, min_value=0)
+    since = serializers.DateTimeField(required=False)
+
+
+class AnnotationUserStateQuerySerializer(serializers.Serializer):
+    ids = serializers.ListField(
+        child=serializers.IntegerField(),
+        min_length=1, max_length=settings.ANNOTATION_BATCH_MAX_IDS
+    )
+
+
+class AnnotationUserStateSerializer(serializers.Serializer):
+    id = serializers.CharField()
+    does_belong_to_user = serializers.BooleanField()
+    annotation_upvote = serializers.CharField(allow_null=True, help_text="Id of the user's upvote, if any")
+    upvote_count = serializers.IntegerField()
+    upvote_count_except_user = serializers.IntegerField()
+
+
+class AnnotationExistsSerializer(serializers.Serializer):
+    exists = serializers.BooleanField()
+
+
+class AnnotationMembershipFilterSerializer(serializers.Serializer):
+    size = serializers.IntegerField(help_text='Number of bits')
+    hash_count = serializers.IntegerField()
+    bits = serializers.SerializerMethodField(help_text='Base64 encoded bit array')
+
+    def get_bits(self, instance) -> str:
+        return base64.b64encode(instance.bits).decode('ascii')
+
+
 class AnnotationReportSerializer(ModelSerializer):
     user = serializers.HiddenField(default=serializers.CurrentUserDefault())
 
@@ -117,6 +205,14 @@ class AnnotationUpvoteSerializer(ModelSerializer):
         fields = ('id', 'annotation', 'user')
 
 
+class AnnotationUpvoteIntentSerializer(AnnotationUpvoteSerializer):
+    """
+    Upvote recorded in the write-behind mode (see apps.annotation.upvotes), where upvoting again is not an error
+    """
+    class Meta(AnnotationUpvoteSerializer.Meta):
+        validators = []
+
+
 class UserSerializer(ModelSerializer):
     class Meta:
         model = get_user_model()
@@ -125,7 +221,7 @@ class UserSerializer(ModelSerializer):
 
 class AnnotationRequestSerializer(ModelSerializer, RequestUserMixin):
     url = fields.StandardizedRepresentationURLField()
-    range = fields.ObjectField(json_internal_type=True, required=False, allow_null=True)
+    range = fields.ObjectField(required=False, allow_null=True)
     requested_by_user = serializers.SerializerMethodField()
     annotations = SerializerMethodResourceRelatedField(read_only=True, model=Annotation, source='get_annotations')
 
@@ -141,4 +237,15 @@ class AnnotationRequestSerializer(ModelSerializer, RequestUserMixin):
         return self.request_user.id == instance.user_id
 
     def get_annotations(self, instance) -> List[Annotation]:
-        return instance.annotation_set.all()
+        # Prefetched by the view (ids only)
+        if hasattr(instance, 'active_annotations'):
+            return instance.active_annotations
+        return instance.annotation_set.filter(active=True).only('id', 'annotation_request')
+
+
+class AnnotatedURLSerializer(ModelSerializer):
+    url = serializers.CharField(source='url_id')
+
+    class Meta:
+        model = AnnotatedURL
+        fields = ('id', 'url', 'domain', 'annotation_count', 'annotation_request_count', 'last_annotation_date')
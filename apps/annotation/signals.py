@@ -1,11 +1,115 @@
-from django.db.models.signals import post_save
+from django.db import transaction
+from django.db.models import Exists, F, OuterRef
+from django.db.models.signals import post_save, post_delete
 from django.dispatch import receiver
 
-from apps.annotation.tasks import notify_annotation_url_subscribers
-from .models import Annotation
+from apps.annotation import aliases, cache, domains, snapshots
+from apps.annotation.tasks import notify_annotation_url_subscribers, add_url_to_membership_filter
+from .models import Annotation, AnnotationRequest, AnnotationUpvote, URLAlias
 
 
 @receiver(post_save, sender=Annotation)
 def notify_subscribers(sender, instance, raw, created, **kwargs):
     if created:
         notify_annotation_url_subscribers.apply_async(args=[instance.id])
+
+
+@receiver(post_save, sender=Annotation)
+@receiver(post_delete, sender=Annotation)
+def invalidate_annotation_url_cache(sender, instance, **kwargs):
+    # This includes deactivation, which is also just a save
+    for url_hash in {instance.url_hash, getattr(instance, 'previous_url_hash', '')}:
+        cache.invalidate_url(url_hash)
+        snapshots.refresh_snapshot(url_hash)
+    # Annotation requests are listed with their annotations, including the request the annotation has been moved from
+    request_ids = {instance.annotation_request_id, getattr(instance, 'previous_annotation_request_id', None)} - {None}
+    if request_ids:
+        for url_hash in set(AnnotationRequest.objects.filter(pk__in=request_ids).values_list('url_hash', flat=True)):
+            cache.bump_url_version(url_hash)
+
+
+@receiver(post_save, sender=Annotation)
+@receiver(post_save, sender=AnnotationRequest)
+def refresh_annotated_url(sender, instance, created, **kwargs):
+    # The counts depend only on the URL and on being active, so e.g. editing the comment changes nothing
+    previous_url_hash = getattr(instance, 'previous_url_hash', '')
+    if not created and previous_url_hash == instance.url_hash and \
+            getattr(instance, 'previous_active', None) == instance.active:
+        return
+    domains.refresh_annotated_urls({instance.url_hash, previous_url_hash})
+
+
+@receiver(post_delete, sender=Annotation)
+@receiver(post_delete, sender=AnnotationRequest)
+def refresh_annotated_url_on_delete(sender, instance, **kwargs):
+    domains.refresh_annotated_urls({instance.url_hash})
+
+
+@receiver(post_save, sender=Annotation)
+@receiver(post_delete, sender=Annotation)
+def refresh_annotation_request_answered(sender, instance, **kwargs):
+    # Recounted (rather than set) for creation, deactivation and moving the annotation to another request alike
+    request_ids = {instance.annotation_request_id, getattr(instance, 'previous_annotation_request_id', None)} - {None}
+    if request_ids:
+        AnnotationRequest.objects.filter(pk__in=request_ids).update(answered=Exists(
+            Annotation.objects.filter(annotation_request=OuterRef('pk'), active=True)
+        ))
+
+
+@receiver(post_save, sender=Annotation)
+def update_membership_filter(sender, instance, **kwargs):
+    # URLs left with no active annotations (deactivation, deletion, URL change) stay in the filter
+    # until its periodic rebuild (see apps.annotation.membership)
+    if instance.active and instance.url_hash:
+        add_to_membership_filter_on_commit(instance.url_hash)
+
+
+def add_to_membership_filter_on_commit(url_hash):
+    # Otherwise the task might run before the annotation is committed and a concurrent rebuild would miss it
+    transaction.on_commit(lambda: add_url_to_membership_filter.apply_async(args=[url_hash]))
+
+
+@receiver(post_save, sender=AnnotationUpvote)
+def increment_upvote_count(sender, instance, created, **kwargs):
+    if created:
+        Annotation.objects.filter(pk=instance.annotation_id).update(upvote_count=F('upvote_count') + 1)
+
+
+@receiver(post_delete, sender=AnnotationUpvote)
+def decrement_upvote_count(sender, instance, **kwargs):
+    Annotation.objects.filter(pk=instance.annotation_id, upvote_count__gt=0).update(
+        upvote_count=F('upvote_count') - 1
+    )
+
+
+@receiver(post_save, sender=AnnotationUpvote)
+@receiver(post_delete, sender=AnnotationUpvote)
+def invalidate_upvote_url_cache(sender, instance, **kwargs):
+    cache.invalidate_url(instance.annotation.url_hash)
+    snapshots.refresh_snapshot(instance.annotation.url_hash)
+
+
+@receiver(post_save, sender=AnnotationRequest)
+@receiver(post_delete, sender=AnnotationRequest)
+def bump_annotation_request_url_version(sender, instance, **kwargs):
+    for url_hash in {instance.url_hash, getattr(instance, 'previous_url_hash', '')}:
+        cache.bump_url_version(url_hash)
+
+
+@receiver(post_save, sender=URLAlias)
+def merge_url_alias(sender, instance, **kwargs):
+    for alias_hash in {instance.alias_hash, getattr(instance, 'previous_alias_hash', '')}:
+        aliases.invalidate_url_alias(alias_hash)
+    url_hashes = aliases.merge_url_alias(instance)
+    for url_hash in url_hashes:
+        cache.invalidate_url(url_hash)
+        snapshots.refresh_snapshot(url_hash)
+    domains.refresh_annotated_urls(url_hashes)
+    # Aliases of annotated URLs are in the filter as well
+    if Annotation.objects.filter(active=True, url_hash=instance.canonical_hash).exists():
+        add_to_membership_filter_on_commit(instance.canonical_hash)
+
+
+@receiver(post_delete, sender=URLAlias)
+def invalidate_url_alias(sender, instance, **kwargs):
+    aliases.invalidate_url_alias(instance.alias_hash)
@@ -0,0 +1,173 @@
+"""
+Pre-rendered snapshots of annotation lists per URL (identified by url_hash).
+
+Serializing annotations and rendering them as JSON:API (reversing links, parsing ranges, standardizing URLs)
+is what a hot URL costs the most, although the result is the same for every user but a few fields.
+So the list is rendered once by a Celery task (see signals) as seen by nobody: no annotation belongs to the user
+and none is upvoted by them. Requests then only splice the request user specific fields in (see splice_user_fields).
+
+Only hot URLs (listed ANNOTATION_SNAPSHOT_HIT_THRESHOLD times in ANNOTATION_SNAPSHOT_HIT_WINDOW seconds)
+are snapshotted and rendered again after writes, so the rendering work does not grow with every URL ever viewed.
+
+The snapshot is rendered outside of any request, so links are built with SNAPSHOT_ORIGIN, stored without it
+and prefixed with the origin of the actual request when served.
+A snapshot is tagged with the URL version (see apps.annotation.cache) read before rendering it,
+so it is used only until the first write concerning the URL.
+"""
+import json
+
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache as django_cache
+from django.db import transaction
+from django.http import HttpRequest
+from rest_framework import renderers
+from rest_framework.request import Request
+from rest_framework_json_api.utils import format_value, get_resource_type_from_model
+
+from apps.annotation import cache
+from apps.annotation.models import Annotation, AnnotationUpvote
+from apps.api.renderers import JSONRenderer
+
+URL_SNAPSHOT_KEY = 'annotations:snapshot:{url_hash}'
+URL_SNAPSHOT_PENDING_KEY = 'annotations:snapshot:{url_hash}:pending'
+URL_HITS_KEY = 'annotations:snapshot:{url_hash}:hits'
+
+SNAPSHOT_HOST = 'snapshot.invalid'
+SNAPSHOT_ORIGIN = 'http://' + SNAPSHOT_HOST
+
+
+class SnapshotRequest(HttpRequest):
+    def get_host(self):
+        return SNAPSHOT_HOST
+
+
+def render_snapshot(url_hash):
+    # The view defines the list (queryset, serializer), imported here since the view itself serves snapshots
+    from apps.annotation.views.annotations import AnnotationViewSet
+
+    version = cache.get_url_version(url_hash)
+
+    request = Request(SnapshotRequest())
+    request.user = AnonymousUser()
+    view = AnnotationViewSet(request=request, action='list', format_kwarg=None, kwargs={})
+    annotations = list(view.get_shared_queryset().filter(url_hash=url_hash).order_by(view.ordering))
+    for annotation in annotations:
+        annotation.user_annotation_upvotes = []
+
+    serializer = view.get_serializer(annotations, many=True)
+    rendered = JSONRenderer().render(serializer.data, renderer_context={'view': view, 'request': request})
+    snapshot = {
+        'version': version,
+        'annotations': [map_links(resource, lambda link: link[len(SNAPSHOT_ORIGIN):])
+                        for resource in json.loads(rendered.decode('utf8'))['data']],
+    }
+    django_cache.set(URL_SNAPSHOT_KEY.format(url_hash=url_hash), snapshot, settings.ANNOTATION_URL_CACHE_TIMEOUT)
+    django_cache.delete(URL_SNAPSHOT_PENDING_KEY.format(url_hash=url_hash))
+    return snapshot
+
+
+def get_snapshot(url_hash):
+    """
+    Return list of rendered annotations of url_hash, None if there is no up-to-date snapshot
+    """
+    snapshot = django_cache.get(URL_SNAPSHOT_KEY.format(url_hash=url_hash))
+    if snapshot is None or snapshot['version'] != cache.get_url_version(url_hash):
+        return None
+    return snapshot['annotations']
+
+
+def refresh_snapshot(url_hash):
+    """
+    Render the snapshot again (after the data changed), unless the URL has no snapshot at all or is not hot anymore
+    """
+    if url_hash and URL_SNAPSHOT_KEY.format(url_hash=url_hash) in django_cache and is_hot(url_hash):
+        transaction.on_commit(lambda: request_snapshot(url_hash))
+
+
+def record_hit(url_hash):
+    """
+    Count a list of url_hash being served; return whether the URL is hot (so worth a snapshot)
+    """
+    key = URL_HITS_KEY.format(url_hash=url_hash)
+    # Counted in fixed windows, starting with the first hit
+    django_cache.add(key, 0, settings.ANNOTATION_SNAPSHOT_HIT_WINDOW)
+    try:
+        hits = django_cache.incr(key)
+    except ValueError:
+        # The window has just expired
+        hits = 0
+    return hits >= settings.ANNOTATION_SNAPSHOT_HIT_THRESHOLD
+
+
+def is_hot(url_hash):
+    return django_cache.get(URL_HITS_KEY.format(url_hash=url_hash), 0) >= settings.ANNOTATION_SNAPSHOT_HIT_THRESHOLD
+
+
+def request_snapshot(url_hash):
+    """
+    Schedule rendering of the snapshot, unless it has been scheduled already
+    """
+    from apps.annotation.tasks import render_url_snapshot
+
+    if django_cache.add(URL_SNAPSHOT_PENDING_KEY.format(url_hash=url_hash), True,
+                        settings.ANNOTATION_SNAPSHOT_PENDING_TIMEOUT):
+        render_url_snapshot.apply_async(args=[url_hash])
+
+
+def splice_user_fields(resources, user, origin, pending_upvotes=None):
+    """
+    Return copies of the rendered annotations with the user specific fields as seen by the user
+    (including upvote intents of the user not written yet, see apps.annotation.upvotes.get_pending_upvotes)
+    and with links prefixed with origin (of the request)
+    """
+    pending_upvotes = pending_upvotes or {}
+    user_upvotes = dict(AnnotationUpvote.objects.filter(
+        user=user, annotation_id__in=[resource['id'] for resource in resources]
+    ).values_list('annotation_id', 'id'))
+    upvote_type = get_resource_type_from_model(AnnotationUpvote)
+    does_belong_to_user = format_value('does_belong_to_user')
+    upvote_count_except_user = format_value('upvote_count_except_user')
+    annotation_upvote = format_value('annotation_upvote')
+
+    spliced = []
+    for resource in resources:
+        attributes = dict(resource['attributes'])
+        relationships = dict(resource['relationships'])
+        attributes[does_belong_to_user] = relationships['user']['data']['id'] == str(user.id)
+        annotation_id = int(resource['id'])
+        # Rendered as seen by nobody, so the attribute holds the whole count
+        attributes[upvote_count_except_user] = Annotation.get_upvote_count_except_user(
+            attributes[upvote_count_except_user], user_upvotes.get(annotation_id)
+        )
+        upvote_id = pending_upvotes.get(annotation_id, user_upvotes.get(annotation_id))
+        if upvote_id is not None:
+            relationships[annotation_upvote] = dict(relationships[annotation_upvote], data={
+                'type': upvote_type, 'id': str(upvote_id)
+            })
+        spliced.append(map_links(dict(resource, attributes=attributes, relationships=relationships),
+                                 lambda link: origin + link))
+    return spliced
+
+
+def map_links(resource, map_link):
+    """
+    Return copy of the rendered resource with its links (self and of relationships) mapped with map_link
+    """
+    resource = dict(resource)
+    if 'links' in resource:
+        resource['links'] = {name: map_link(link) for name, link in resource['links'].items()}
+    if 'relationships' in resource:
+        resource['relationships'] = {
+            name: dict(relationship, links={
+                link_name: map_link(link) for link_name, link in relationship['links'].items()
+            }) if 'links' in relationship else relationship
+            for name, relationship in resource['relationships'].items()
+        }
+    return resource
+
+
+def render_document(document):
+    # Encoded the same way as the regular renderer does (see apps.api.renderers), so the bytes are the same
+    return renderers.JSONRenderer().render(document)
+
@@ -4,6 +4,7 @@ from django.conf import settings
 from django.core.signing import Signer
 from django.urls import reverse
 
+from apps.annotation import analytics, membership, snapshots, upvotes
 from apps.annotation.mailgun import send_mail, MailSendException
 from apps.annotation.models import Annotation, AnnotationRequest
 from worker import celery_app
@@ -14,7 +15,7 @@ logger = logging.getLogger('pp.annotation')
 @celery_app.task
 def notify_annotation_url_subscribers(annotation_id):
     annotation = Annotation.objects.get(pk=annotation_id)
-    annotation_requests = AnnotationRequest.objects.filter(url_id=annotation.url_id)
+    annotation_requests = AnnotationRequest.objects.filter(url_hash=annotation.url_hash)
     url = annotation.url
 
     notification_emails = []
@@ -54,3 +55,28 @@ def notify_annotation_url_subscribers(annotation_id):
             url,
             str(e),
         ))
+
+
+@celery_app.task
+def add_url_to_membership_filter(url_hash):
+    membership.add_to_membership_filter(url_hash)
+
+
+@celery_app.task
+def rebuild_membership_filter():
+    membership.rebuild_membership_filter()
+
+
+@celery_app.task
+def render_url_snapshot(url_hash):
+    snapshots.render_snapshot(url_hash)
+
+
+@celery_app.task
+def write_analytics_snapshot():
+    analytics.write_snapshot()
+
+
+@celery_app.task
+def flush_upvote_buffer():
+    upvotes.flush_upvotes()
@@ -0,0 +1,51 @@
+import json
+
+from django.test import TestCase
+from model_mommy import mommy
+from rest_framework_simplejwt.tokens import AccessToken
+
+from apps.annotation.tests.utils import create_test_user
+
+
+class AnnotatedURLsAPITest(TestCase):
+    list_url = "/api/annotatedUrls"
+
+    def setUp(self):
+        self.user, self.password = create_test_user()
+        self.token_header = 'JWT %s' % str(AccessToken.for_user(self.user))
+
+    def get(self, params):
+        response = self.client.get(self.list_url, params, HTTP_AUTHORIZATION=self.token_header)
+        self.assertEqual(response.status_code, 200)
+        return json.loads(response.content.decode('utf8'))
+
+    def test_domain(self):
+        mommy.make('annotation.Annotation', url='https://example.com/first')
+        mommy.make('annotation.Annotation', 2, url='https://m.example.com/second')
+        mommy.make('annotation.AnnotationRequest', url='https://example.com/third')
+        mommy.make('annotation.Annotation', url='https://blog.example.com/first')
+        mommy.make('annotation.Annotation', url='https://other.org/first')
+
+        for domain in ('example.com', 'www.example.com', 'EXAMPLE.com'):
+            response_data = self.get({'domain': domain})
+            self.assertEqual(response_data['meta']['pagination']['count'], 3)
+            self.assertEqual([(item['type'], item['attributes']) for item in response_data['data']], [
+                ('annotatedUrls', {'url': 'example.com/second', 'domain': 'example.com', 'annotationCount': 2,
+                                   'annotationRequestCount': 0,
+                                   'lastAnnotationDate': response_data['data'][0]['attributes']['lastAnnotationDate']}),
+                ('annotatedUrls', {'url': 'example.com/first', 'domain': 'example.com', 'annotationCount': 1,
+                                   'annotationRequestCount': 0,
+                                   'lastAnnotationDate': response_data['data'][1]['attributes']['lastAnnotationDate']}),
+                ('annotatedUrls', {'url': 'example.com/third', 'domain': 'example.com', 'annotationCount': 0,
+                                   'annotationRequestCount': 1, 'lastAnnotationDate': None}),
+            ])
+
+    def test_single_query(self):
+        mommy.make('annotation.Annotation', url='https://example.com/first')
+        with self.assertNumQueries(3):
+            # User, count and page of the domain's URLs
+            self.get({'domain': 'example.com'})
+
+    def test_unauthenticated(self):
+        response = self.client.get(self.list_url, {'domain': 'example.com'})
+        self.assertEqual(response.status_code, 401)
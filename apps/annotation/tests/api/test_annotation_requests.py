@@ -1,6 +1,8 @@
 import json
 
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
 from model_mommy import mommy
 from rest_framework_simplejwt.tokens import AccessToken
 
@@ -52,3 +54,91 @@ class AnnotationRequestSingle(TestCase):
         # Return same result as if it never existed
         response = self.client.delete(self.base_url.format(annotation_request.id), HTTP_AUTHORIZATION=self.token_header)
         self.assertEqual(response.status_code, 404)
+
+
+class AnnotationRequestAnnotationsTest(TestCase):
+    base_url = "/api/annotationRequests"
+
+    def setUp(self):
+        self.user, self.password = create_test_user()
+        self.token_header = 'JWT %s' % str(AccessToken.for_user(self.user))
+
+    def test_annotations_ids_only(self):
+        annotation_request = mommy.make('annotation.AnnotationRequest', url='https://example.com/article')
+        annotations = mommy.make('annotation.Annotation', annotation_request=annotation_request, _quantity=2)
+        mommy.make('annotation.Annotation', annotation_request=annotation_request, active=False)
+        mommy.make('annotation.AnnotationRequest', url='https://example.com/article')
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(self.base_url, {'url': 'https://example.com/article'},
+                                       HTTP_AUTHORIZATION=self.token_header)
+        self.assertEqual(response.status_code, 200)
+        annotations_query, = [query['sql'] for query in queries if 'FROM "annotation_annotation"' in query['sql']]
+        self.assertEqual(annotations_query.split(' FROM ')[0],
+                         'SELECT "annotation_annotation"."id", "annotation_annotation"."annotation_request_id"')
+
+        response_data = {item['id']: item['relationships']['annotations']['data']
+                         for item in json.loads(response.content.decode('utf8'))['data']}
+        self.assertEqual(len(response_data), 2)
+        self.assertEqual(sorted(response_data[str(annotation_request.id)], key=lambda item: item['id']),
+                         sorted([{'type': 'annotations', 'id': str(annotation.id)} for annotation in annotations],
+                                key=lambda item: item['id']))
+
+        response = self.client.get('{}/{}'.format(self.base_url, annotation_request.id),
+                                   HTTP_AUTHORIZATION=self.token_header)
+        detail = json.loads(response.content.decode('utf8'))['data']
+        self.assertEqual(len(detail['relationships']['annotations']['data']), 2)
+
+
+class AnnotationRequestAnsweredTest(TestCase):
+    base_url = "/api/annotationRequests"
+    page_url = 'https://example.com/article'
+
+    def setUp(self):
+        self.user, self.password = create_test_user()
+        self.token_header = 'JWT %s' % str(AccessToken.for_user(self.user))
+        self.annotation_request = mommy.make('annotation.AnnotationRequest', url=self.page_url)
+        self.other_request = mommy.make('annotation.AnnotationRequest', url=self.page_url)
+
+    def get_answered(self, answered):
+        response = self.client.get(self.base_url, {'url': self.page_url, 'answered': answered},
+                                   HTTP_AUTHORIZATION=self.token_header)
+        self.assertEqual(response.status_code, 200)
+        return {int(item['id']) for item in json.loads(response.content.decode('utf8'))['data']}
+
+    def assertAnswered(self, *annotation_requests):
+        answered = {annotation_request.id for annotation_request in annotation_requests}
+        self.assertEqual(self.get_answered('true'), answered)
+        self.assertEqual(self.get_answered('false'), {self.annotation_request.id, self.other_request.id} - answered)
+
+    def test_answered(self):
+        self.assertAnswered()
+
+        annotation = mommy.make('annotation.Annotation', annotation_request=self.annotation_request)
+        self.assertAnswered(self.annotation_request)
+
+        # Moved to another request
+        annotation = models.Annotation.objects.get(id=annotation.id)
+        annotation.annotation_request = self.other_request
+        annotation.save()
+        self.assertAnswered(self.other_request)
+
+        annotation.active = False
+        annotation.save()
+        self.assertAnswered()
+
+    def test_answered_until_last_annotation_deactivated(self):
+        annotations = mommy.make('annotation.Annotation', annotation_request=self.annotation_request, _quantity=2)
+        annotations[0].active = False
+        annotations[0].save()
+        self.assertAnswered(self.annotation_request)
+
+        annotations[1].delete()
+        self.assertAnswered()
+
+    def test_answered_kept_when_request_saved(self):
+        annotation_request = models.AnnotationRequest.objects.get(id=self.annotation_request.id)
+        mommy.make('annotation.Annotation', annotation_request=self.annotation_request)
+        annotation_request.comment = 'Edited'
+        annotation_request.save()
+        self.assertAnswered(self.annotation_request)
@@ -0,0 +1,102 @@
+import json
+
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from model_mommy import mommy
+from rest_framework_simplejwt.tokens import AccessToken
+
+from apps.annotation.models import Annotation, AnnotationUpvote
+from apps.annotation.tasks import flush_upvote_buffer
+from apps.annotation.tests.utils import create_test_user, mock_upvote_id_sequence
+
+
+@override_settings(ANNOTATION_UPVOTE_WRITE_BEHIND=True)
+class AnnotationUpvoteWriteBehindTest(TestCase):
+    upvote_url = "/api/annotationUpvotes"
+    upvote_single_url = "/api/annotationUpvotes/{}"
+    annotation_related_upvote_url = "/api/annotations/{}/upvote"
+    page_url = 'https://example.com/article'
+
+    def setUp(self):
+        cache.clear()
+        mock_upvote_id_sequence(self)
+        self.user, self.password = create_test_user()
+        self.token_header = 'JWT %s' % str(AccessToken.for_user(self.user))
+        self.other_user, password = create_test_user(unique=True)
+        self.other_token_header = 'JWT %s' % str(AccessToken.for_user(self.other_user))
+        self.annotation = mommy.make('annotation.Annotation', url=self.page_url)
+
+    def post_upvote(self):
+        return self.client.post(self.upvote_url, json.dumps({'data': {
+            'type': 'annotationUpvotes',
+            'relationships': {'annotation': {'data': {'type': 'annotations', 'id': str(self.annotation.id)}}},
+        }}), content_type='application/vnd.api+json', HTTP_AUTHORIZATION=self.token_header)
+
+    def get_annotation_upvote(self, token_header, headers=None):
+        response = self.client.get('/api/annotations', {'url': self.page_url}, HTTP_AUTHORIZATION=token_header,
+                                   **(headers or {}))
+        self.assertEqual(response.status_code, 200)
+        data, = json.loads(response.content.decode('utf8'))['data']
+        return data['relationships']['annotationUpvote']['data'], data['attributes']['upvoteCountExceptUser']
+
+    def test_upvote(self):
+        response = self.post_upvote()
+        self.assertEqual(response.status_code, 202)
+        upvote_id = json.loads(response.content.decode('utf8'))['data']['id']
+        self.assertFalse(AnnotationUpvote.objects.exists())
+
+        # Seen by the user at once
+        self.assertEqual(self.get_annotation_upvote(self.token_header),
+                         ({'type': 'annotationUpvotes', 'id': upvote_id}, 0))
+        self.assertEqual(self.get_annotation_upvote(self.other_token_header), (None, 0))
+        response = self.client.get(self.annotation_related_upvote_url.format(self.annotation.id),
+                                   HTTP_AUTHORIZATION=self.token_header)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(json.loads(response.content.decode('utf8'))['data']['id'], upvote_id)
+        response = self.client.get('/api/annotations/userState', {'ids': self.annotation.id},
+                                   HTTP_AUTHORIZATION=self.token_header)
+        self.assertEqual(json.loads(response.content.decode('utf8'))[0]['annotationUpvote'], upvote_id)
+
+        # Repeated
+        response = self.post_upvote()
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(json.loads(response.content.decode('utf8'))['data']['id'], upvote_id)
+
+        # And by everyone else once written
+        flush_upvote_buffer.delay()
+        self.assertEqual(str(AnnotationUpvote.objects.get(user=self.user, annotation=self.annotation).id), upvote_id)
+        self.assertEqual(Annotation.objects.get(id=self.annotation.id).upvote_count, 1)
+        self.assertEqual(self.get_annotation_upvote(self.token_header),
+                         ({'type': 'annotationUpvotes', 'id': upvote_id}, 0))
+        self.assertEqual(self.get_annotation_upvote(self.other_token_header), (None, 1))
+
+    def test_delete(self):
+        upvote_id = json.loads(self.post_upvote().content.decode('utf8'))['data']['id']
+
+        response = self.client.delete(self.upvote_single_url.format(upvote_id), HTTP_AUTHORIZATION=self.token_header)
+        self.assertEqual(response.status_code, 204)
+        self.assertEqual(self.get_annotation_upvote(self.token_header), (None, 0))
+        response = self.client.delete(self.upvote_single_url.format(upvote_id), HTTP_AUTHORIZATION=self.token_header)
+        self.assertEqual(response.status_code, 404)
+
+    def test_delete_stored(self):
+        upvote = AnnotationUpvote.objects.create(user=self.user, annotation=self.annotation)
+
+        response = self.client.delete(self.upvote_single_url.format(upvote.id),
+                                      HTTP_AUTHORIZATION=self.other_token_header)
+        self.assertEqual(response.status_code, 403)
+        response = self.client.delete(self.upvote_single_url.format(upvote.id), HTTP_AUTHORIZATION=self.token_header)
+        self.assertEqual(response.status_code, 204)
+        self.assertEqual(self.get_annotation_upvote(self.token_header), (None, 0))
+        self.assertTrue(AnnotationUpvote.objects.filter(id=upvote.id).exists())
+
+        flush_upvote_buffer.delay()
+        self.assertFalse(AnnotationUpvote.objects.filter(id=upvote.id).exists())
+        self.assertEqual(Annotation.objects.get(id=self.annotation.id).upvote_count, 0)
+
+    def test_etag_changed_by_pending_upvote(self):
+        response = self.client.get('/api/annotations', {'url': self.page_url}, HTTP_AUTHORIZATION=self.token_header)
+        etag = response['ETag']
+        self.post_upvote()
+        upvote, count = self.get_annotation_upvote(self.token_header, {'HTTP_IF_NONE_MATCH': etag})
+        self.assertIsNotNone(upvote)
@@ -2,6 +2,7 @@ import json
 from datetime import timedelta
 from urllib.parse import quote
 
+from django.core.cache import cache
 from django.test import TestCase
 from django.utils import timezone
 from parameterized import parameterized
@@ -23,13 +24,14 @@ class AnnotationAPITest(TestCase):
         self.user.save()
         self.token = str(AccessToken.for_user(self.user))
         self.token_header = 'JWT %s' % self.token
+        cache.clear()
 
     # TODO: do not hardcode data all the time, use helper to create valid annotation
     def test_get_returns_json_200(self):
         annotation = Annotation.objects.create(user=self.user,
                                                pp_category=Annotation.ADDITIONAL_INFO,
                                                comment="good job",
-                                               range='{}', url='http://localhost/',
+                                               range={}, url='http://localhost/',
                                                annotation_link="www.przypispowszechny.com",
                                                annotation_link_title="very nice")
         AnnotationUpvote.objects.create(user=self.user, annotation=annotation)
@@ -43,7 +45,7 @@ class AnnotationAPITest(TestCase):
         annotation = Annotation.objects.create(user=self.user,
                                                pp_category=Annotation.ADDITIONAL_INFO,
                                                comment="good job",
-                                               range='{}', url='http://localhost/',
+                                               range={}, url='http://localhost/',
                                                annotation_link="www.przypispowszechny.com",
                                                annotation_link_title="very nice")
         urf = AnnotationUpvote.objects.create(user=self.user, annotation=annotation)
@@ -59,7 +61,7 @@ class AnnotationAPITest(TestCase):
                     'type': 'annotations',
                     'attributes': {
                         'url': annotation.url,
-                        'range': json.loads(annotation.range),
+                        'range': annotation.range,
                         'quote': annotation.quote,
                         'quoteContext': annotation.quote_context,
                         'publisher': annotation.publisher,
@@ -104,7 +106,7 @@ class AnnotationAPITest(TestCase):
         annotation = Annotation.objects.create(user=self.user,
                                                pp_category=Annotation.ADDITIONAL_INFO,
                                                comment="good job",
-                                               range='{}', url='http://localhost/',
+                                               range={}, url='http://localhost/',
                                                annotation_link="www.przypispowszechny.com",
                                                annotation_link_title="very nice")
 
@@ -193,11 +195,11 @@ class AnnotationAPITest(TestCase):
         annotation_url = 'http://example.com/subpage.html'
         search_base_url = "/api/annotations?url={}"
         Annotation.objects.create(user=self.user, comment="good job",
-                                  range='{}', url=annotation_url,
+                                  range={}, url=annotation_url,
                                   annotation_link="www.przypispowszechny.com",
                                   annotation_link_title="very nice")
         Annotation.objects.create(user=self.user, comment="more good job",
-                                  range='{}', url=annotation_url,
+                                  range={}, url=annotation_url,
                                   annotation_link="www.przypispowszechny.com",
                                   annotation_link_title="very nice again")
 
@@ -257,7 +259,7 @@ class AnnotationAPITest(TestCase):
     def test_list_annotations__url_filtering(self, annotation_url, query_url, expected_count):
         search_base_url = "/api/annotations?&url={}"
         Annotation.objects.create(user=self.user, comment="good job",
-                                  range='{}', url=annotation_url,
+                                  range={}, url=annotation_url,
                                   annotation_link="www.przypispowszechny.com",
                                   annotation_link_title="very nice")
         response = self.client.get(search_base_url.format(quote(query_url)), HTTP_AUTHORIZATION=self.token_header)
@@ -274,7 +276,7 @@ class AnnotationAPITest(TestCase):
         search_base_url = "/api/annotations?url={}"
         # First annotation
         annotation = Annotation.objects.create(user=self.user, comment="more good job",
-                                               range='{}',
+                                               range={},
                                                url='www.przypis.pl', annotation_link="www.przypispowszechny.com",
                                                annotation_link_title="very nice again",
                                                create_date=timezone.now() + timedelta(seconds=-1000))
@@ -284,7 +286,7 @@ class AnnotationAPITest(TestCase):
 
         # Second annotation
         annotation2 = Annotation.objects.create(user=self.user, comment="good job",
-                                                range='{}',
+                                                range={},
                                                 url='www.przypis.pl',
                                                 annotation_link="www.przypispowszechny2.com",
                                                 annotation_link_title="very nice",
@@ -306,7 +308,7 @@ class AnnotationAPITest(TestCase):
              'type': 'annotations',
              'attributes': {
                  'url': annotation.url,
-                 'range': json.loads(annotation.range),
+                 'range': annotation.range,
                  'quote': annotation.quote,
                  'quoteContext': annotation.quote_context,
                  'publisher': annotation.publisher,
@@ -350,7 +352,7 @@ class AnnotationAPITest(TestCase):
              'type': 'annotations',
              'attributes': {
                  'url': annotation2.url,
-                 'range': json.loads(annotation2.range),
+                 'range': annotation2.range,
                  'quote': annotation2.quote,
                  'quoteContext': annotation.quote_context,
                  'publisher': annotation.publisher,
@@ -392,7 +394,7 @@ class AnnotationAPITest(TestCase):
     def test_list_annotations__upvote_count(self):
         list_url = '/api/annotations'
         annotation = Annotation.objects.create(user=self.user, comment="good job",
-                                               range='{}', url='http://localhost/',
+                                               range={}, url='http://localhost/',
                                                annotation_link="www.przypispowszechny.com",
                                                annotation_link_title="very nice")
 
@@ -464,6 +466,29 @@ class AnnotationAPITest(TestCase):
             'data': {'id': str(urf.id), 'type': 'annotationUpvotes'}
         })
 
+    def test_list_annotations__user_upvotes_single_query(self):
+        annotations = [Annotation.objects.create(user=self.user, range={}, url='http://localhost/')
+                       for _ in range(3)]
+        other_user, password = create_test_user(unique=True)
+        upvote = AnnotationUpvote.objects.create(user=self.user, annotation=annotations[0])
+        AnnotationUpvote.objects.create(user=other_user, annotation=annotations[0])
+        AnnotationUpvote.objects.create(user=other_user, annotation=annotations[1])
+
+        with self.assertNumQueries(3):
+            # User, COUNT(*) and the page with the user's upvotes
+            response = self.client.get('/api/annotations', HTTP_AUTHORIZATION=self.token_header)
+        self.assertEqual(response.status_code, 200)
+        upvotes = {item['id']: item['relationships']['annotationUpvote']['data']
+                   for item in json.loads(response.content.decode('utf8'))['data']}
+        self.assertEqual(upvotes[str(annotations[0].id)], {'type': 'annotationUpvotes', 'id': str(upvote.id)})
+        self.assertIsNone(upvotes[str(annotations[1].id)])
+        self.assertIsNone(upvotes[str(annotations[2].id)])
+
+        with self.assertNumQueries(2):
+            # User and the annotation with the user's upvote
+            response = self.client.get(self.base_url.format(annotations[0].id), HTTP_AUTHORIZATION=self.token_header)
+        self.assertEqual(response.status_code, 200)
+
     def get_valid_annotation_attrs(self):
         return {
             'url': "http://www.przypis.pl/",
@@ -572,13 +597,14 @@ class AnnotationAPITest(TestCase):
             response_data['data']['attributes']['range'], range
         )
 
-        # Check if range is stored as json (despite being posted and returned as normal dict)
-        self.assertEqual(new_annotation.range, json.dumps(range))
+        # Check if range is stored as json (and loaded back as the same value)
+        new_annotation.refresh_from_db()
+        self.assertEqual(new_annotation.range, range)
 
         # Reset annotation before patching it
         initial_range = self.get_valid_annotation_attrs()['range']
         annotation = Annotation.objects.last()
-        annotation.range = json.dumps(initial_range)
+        annotation.range = initial_range
         annotation.save()
 
         # PATCH - ignore changes
@@ -778,7 +804,7 @@ class AnnotationAPITest(TestCase):
         annotation = Annotation.objects.create(user=self.user,
                                                pp_category=Annotation.ADDITIONAL_INFO,
                                                comment="good job",
-                                               range='{}', url='www.przypis.pl',
+                                               range={}, url='www.przypis.pl',
                                                annotation_link="www.przypispowszechny.com",
                                                annotation_link_title="very nice",
                                                quote='not this time')
@@ -808,7 +834,7 @@ class AnnotationAPITest(TestCase):
                 'type': 'annotations',
                 'attributes': {
                     'url': annotation.url,
-                    'range': json.loads(annotation.range),
+                    'range': annotation.range,
                     'quote': annotation.quote,
                     'quoteContext': annotation.quote_context,
                     'publisher': annotation.publisher,
@@ -851,7 +877,7 @@ class AnnotationAPITest(TestCase):
     def test_patch_annotation__deny__attribute_quote(self):
         annotation = Annotation.objects.create(
             user=self.user, url='www.przypis.pl', comment="good job",
-            range='{}',
+            range={},
             annotation_link="www.przypispowszechny.com", annotation_link_title="very nice",
             quote='not this time'
         )
@@ -0,0 +1,51 @@
+import json
+
+from django.core.cache import cache
+from django.test import TestCase
+from model_mommy import mommy
+from rest_framework_simplejwt.tokens import AccessToken
+
+from apps.annotation import aliases
+from apps.annotation.models import URLAlias
+from apps.annotation.tests.utils import create_test_user
+
+
+class AnnotationAliasesTest(TestCase):
+    list_url = "/api/annotations"
+    alias_url = 'https://example.com/article/amp-version'
+    canonical_url = 'https://example.com/article'
+
+    def setUp(self):
+        self.user, self.password = create_test_user()
+        self.token_header = 'JWT %s' % str(AccessToken.for_user(self.user))
+        cache.clear()
+        aliases._local_aliases.clear()
+
+    def tearDown(self):
+        aliases._local_aliases.clear()
+
+    def get_ids(self, url):
+        response = self.client.get(self.list_url, {'url': url}, HTTP_AUTHORIZATION=self.token_header)
+        self.assertEqual(response.status_code, 200)
+        return [item['id'] for item in json.loads(response.content.decode('utf8'))['data']]
+
+    def test_list(self):
+        annotation = mommy.make('annotation.Annotation', url=self.canonical_url)
+        alias_annotation = mommy.make('annotation.Annotation', url=self.alias_url)
+        # Cached before the alias is added
+        self.assertEqual(self.get_ids(self.alias_url), [str(alias_annotation.id)])
+
+        URLAlias.objects.create(alias_url=self.alias_url, canonical_url=self.canonical_url)
+
+        expected_ids = {str(annotation.id), str(alias_annotation.id)}
+        self.assertEqual(set(self.get_ids(self.alias_url)), expected_ids)
+        self.assertEqual(set(self.get_ids(self.canonical_url)), expected_ids)
+
+    def test_list__single_query(self):
+        mommy.make('annotation.Annotation', url=self.canonical_url)
+        URLAlias.objects.create(alias_url=self.alias_url, canonical_url=self.canonical_url)
+        aliases._local_aliases.clear()
+        cache.clear()
+        with self.assertNumQueries(4):
+            # User, alias, annotations and upvotes prefetch (the URL is not hot enough for a snapshot)
+            self.get_ids(self.alias_url)
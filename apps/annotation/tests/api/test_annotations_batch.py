@@ -0,0 +1,86 @@
+import json
+
+from django.core.cache import cache
+from django.test import TestCase
+from model_mommy import mommy
+from rest_framework_simplejwt.tokens import AccessToken
+
+from apps.annotation.models import AnnotationUpvote
+from apps.annotation.tests.utils import create_test_user
+
+
+class AnnotationBatchAPITest(TestCase):
+    batch_url = "/api/annotations/batch"
+
+    def setUp(self):
+        self.user, self.password = create_test_user()
+        self.token_header = 'JWT %s' % str(AccessToken.for_user(self.user))
+        cache.clear()
+
+    def post_batch(self, urls, authorize=True):
+        headers = {'HTTP_AUTHORIZATION': self.token_header} if authorize else {}
+        return self.client.post(self.batch_url, data=json.dumps({'urls': urls}), content_type='application/json',
+                                **headers)
+
+    def test_batch__grouped_per_url(self):
+        first = mommy.make('annotation.Annotation', url='http://example.com/first')
+        second, third = mommy.make('annotation.Annotation', 2, url='http://example.com/second')
+        mommy.make('annotation.Annotation', url='http://example.com/not-requested')
+        mommy.make('annotation.Annotation', url='http://example.com/first', active=False)
+
+        urls = ['http://example.com/first', 'https://example.com/second?utm_source=fb', 'http://example.com/empty']
+        response = self.post_batch(urls)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['content-type'], 'application/vnd.api+json')
+        content = json.loads(response.content.decode('utf8'))
+        self.assertEqual(sorted(item['id'] for item in content['data']),
+                         sorted(str(annotation.id) for annotation in (first, second, third)))
+        self.assertEqual({item['type'] for item in content['data']}, {'annotations'})
+        self.assertEqual([group['url'] for group in content['meta']['urls']], urls)
+        self.assertEqual(content['meta']['urls'][0]['annotations'], [str(first.id)])
+        self.assertEqual(sorted(content['meta']['urls'][1]['annotations']), sorted([str(second.id), str(third.id)]))
+        self.assertEqual(content['meta']['urls'][2]['annotations'], [])
+
+    def test_batch__same_annotation_listed_once(self):
+        annotation = mommy.make('annotation.Annotation', url='http://example.com/first')
+
+        response = self.post_batch(['http://example.com/first', 'https://example.com/first#anchor'])
+
+        content = json.loads(response.content.decode('utf8'))
+        self.assertEqual([item['id'] for item in content['data']], [str(annotation.id)])
+        self.assertEqual([group['annotations'] for group in content['meta']['urls']],
+                         [[str(annotation.id)], [str(annotation.id)]])
+
+    def test_batch__user_specific_fields(self):
+        annotation = mommy.make('annotation.Annotation', url='http://example.com/first', user=self.user)
+        upvote = AnnotationUpvote.objects.create(user=self.user, annotation=annotation)
+
+        response = self.post_batch(['http://example.com/first'])
+
+        data = json.loads(response.content.decode('utf8'))['data'][0]
+        self.assertEqual(data['attributes']['doesBelongToUser'], True)
+        self.assertEqual(data['relationships']['annotationUpvote']['data']['id'], str(upvote.id))
+
+    def test_batch__cached_and_missing_urls_mixed(self):
+        first = mommy.make('annotation.Annotation', url='http://example.com/first')
+        self.post_batch(['http://example.com/first'])
+        second = mommy.make('annotation.Annotation', url='http://example.com/second')
+
+        response = self.post_batch(['http://example.com/first', 'http://example.com/second'])
+
+        content = json.loads(response.content.decode('utf8'))
+        self.assertEqual(sorted(item['id'] for item in content['data']), sorted([str(first.id), str(second.id)]))
+
+    def test_batch__reader_allowed(self):
+        self.user.role = self.user.ROLE_READER
+        self.user.save()
+        self.assertEqual(self.post_batch(['http://example.com/first']).status_code, 200)
+
+    def test_batch__unauthenticated_401(self):
+        self.assertEqual(self.post_batch(['http://example.com/first'], authorize=False).status_code, 401)
+
+    def test_batch__invalid_400(self):
+        self.assertEqual(self.post_batch([]).status_code, 400)
+        self.assertEqual(self.post_batch('http://example.com/first').status_code, 400)
+        self.assertEqual(self.post_batch(['http://example.com/%s' % i for i in range(101)]).status_code, 400)
@@ -0,0 +1,136 @@
+import json
+
+from django.core.cache import cache
+from django.test import TestCase
+from model_mommy import mommy
+from rest_framework_simplejwt.tokens import AccessToken
+
+from apps.annotation import cache as annotation_cache
+from apps.annotation.models import Annotation, AnnotationUpvote
+from apps.annotation.tests.utils import create_test_user
+from apps.publisher.demagog import update_or_create_annotation
+
+
+class AnnotationListCacheTest(TestCase):
+    list_url = "/api/annotations?url={}"
+    single_url = "/api/annotations/{}"
+
+    page_url = 'http://example.com/article'
+    other_page_url = 'http://example.com/other-article'
+
+    def setUp(self):
+        self.user, self.password = create_test_user()
+        self.user.role = self.user.ROLE_EDITOR
+        self.user.save()
+        self.token_header = 'JWT %s' % str(AccessToken.for_user(self.user))
+        cache.clear()
+
+    def list_annotations(self, url=page_url, **params):
+        response = self.client.get(self.list_url.format(url), params, HTTP_AUTHORIZATION=self.token_header)
+        self.assertEqual(response.status_code, 200)
+        return json.loads(response.content.decode('utf8'))['data']
+
+    def test_list__served_from_cache(self):
+        annotation = mommy.make('annotation.Annotation', url=self.page_url)
+        self.assertEqual([item['id'] for item in self.list_annotations()], [str(annotation.id)])
+
+        # Bypassing save() (and so invalidation) proves the cached data is used
+        Annotation.objects.filter(id=annotation.id).update(comment='changed')
+        self.assertNotEqual(self.list_annotations()[0]['attributes']['comment'], 'changed')
+
+    def test_list__user_specific_fields_not_shared(self):
+        annotation = mommy.make('annotation.Annotation', url=self.page_url, user=self.user)
+        AnnotationUpvote.objects.create(user=self.user, annotation=annotation)
+        self.list_annotations()
+
+        other_user, password = create_test_user(unique=True)
+        self.token_header = 'JWT %s' % str(AccessToken.for_user(other_user))
+        data = self.list_annotations()[0]
+        self.assertEqual(data['attributes']['doesBelongToUser'], False)
+        self.assertEqual(data['attributes']['upvoteCountExceptUser'], 1)
+        self.assertIsNone(data['relationships']['annotationUpvote']['data'])
+
+    def test_list__other_params_not_cached(self):
+        annotation = mommy.make('annotation.Annotation', url=self.page_url, check_status=Annotation.UNVERIFIED)
+        self.list_annotations(check_status=Annotation.UNVERIFIED)
+        Annotation.objects.filter(id=annotation.id).update(comment='changed')
+        self.assertEqual(self.list_annotations(check_status=Annotation.UNVERIFIED)[0]['attributes']['comment'],
+                         'changed')
+
+    def test_invalidate__annotation_created(self):
+        self.assertEqual(self.list_annotations(), [])
+        mommy.make('annotation.Annotation', url=self.page_url)
+        self.assertEqual(len(self.list_annotations()), 1)
+
+    def test_invalidate__annotation_destroyed(self):
+        annotation = mommy.make('annotation.Annotation', url=self.page_url, user=self.user)
+        self.assertEqual(len(self.list_annotations()), 1)
+
+        response = self.client.delete(self.single_url.format(annotation.id), HTTP_AUTHORIZATION=self.token_header)
+        self.assertEqual(response.status_code, 204)
+        self.assertEqual(self.list_annotations(), [])
+
+    def test_invalidate__annotation_url_changed(self):
+        annotation = mommy.make('annotation.Annotation', url=self.page_url)
+        self.assertEqual(len(self.list_annotations()), 1)
+        self.assertEqual(len(self.list_annotations(self.other_page_url)), 0)
+
+        annotation.url = self.other_page_url
+        annotation.save()
+        self.assertEqual(len(self.list_annotations()), 0)
+        self.assertEqual(len(self.list_annotations(self.other_page_url)), 1)
+
+    def test_invalidate__upvote(self):
+        annotation = mommy.make('annotation.Annotation', url=self.page_url)
+        other_user, password = create_test_user(unique=True)
+        self.assertEqual(self.list_annotations()[0]['attributes']['upvoteCountExceptUser'], 0)
+
+        upvote = AnnotationUpvote.objects.create(user=other_user, annotation=annotation)
+        self.assertEqual(self.list_annotations()[0]['attributes']['upvoteCountExceptUser'], 1)
+
+        upvote.delete()
+        self.assertEqual(self.list_annotations()[0]['attributes']['upvoteCountExceptUser'], 0)
+
+    def test_invalidate__demagog_sync(self):
+        demagog_user, password = create_test_user(unique=True)
+        statement_data = {
+            'id': 'hash_1fa43de44',
+            'attributes': {
+                'sources': [self.page_url],
+                'text': "it's an interesting article",
+                'rating': 'true',
+                'explanation': 'this statement is a statement that says something that is true',
+                'factchecker_uri': 'http://i-check-you-all.org',
+            }
+        }
+        update_or_create_annotation(statement_data, demagog_user)
+        self.assertEqual(self.list_annotations()[0]['attributes']['quote'], "it's an interesting article")
+
+        statement_data['attributes']['text'] = 'a changed statement'
+        update_or_create_annotation(statement_data, demagog_user)
+        self.assertEqual(self.list_annotations()[0]['attributes']['quote'], 'a changed statement')
+
+    def test_list__fetched_before_concurrent_write_not_cached(self):
+        annotation = mommy.make('annotation.Annotation', url=self.page_url)
+
+        def fetch_and_write():
+            # A write committed after the list is read, but before it is cached
+            fetched = list(Annotation.objects.filter(url_hash=annotation.url_hash))
+            Annotation.objects.filter(id=annotation.id).update(comment='changed')
+            annotation_cache.invalidate_url(annotation.url_hash)
+            return fetched
+
+        annotation_cache.get_url_annotations(annotation.url_hash, fetch_and_write)
+        annotations = annotation_cache.get_url_annotations(
+            annotation.url_hash, lambda: Annotation.objects.filter(url_hash=annotation.url_hash)
+        )
+        self.assertEqual(annotations[0].comment, 'changed')
+
+    def test_list__user_fields_not_cached(self):
+        annotation = mommy.make('annotation.Annotation', url=self.page_url)
+        self.list_annotations()
+        entry = cache.get(annotation_cache.URL_ANNOTATIONS_KEY.format(url_hash=annotation.url_hash))
+        cached, = entry['annotations']
+        self.assertEqual(cached.user.id, annotation.user_id)
+        self.assertIn('password', cached.user.get_deferred_fields())
+        self.assertIn('email', cached.user.get_deferred_fields())
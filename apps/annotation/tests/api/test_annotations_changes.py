@@ -0,0 +1,92 @@
+import json
+from datetime import timedelta
+
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from model_mommy import mommy
+from rest_framework_simplejwt.tokens import AccessToken
+
+from apps.annotation.models import URLAlias
+from apps.annotation.tests.utils import create_test_user
+
+
+@override_settings(ANNOTATION_CHANGES_TOKEN_OVERLAP=0)
+class AnnotationChangesTest(TestCase):
+    changes_url = "/api/annotations/changes"
+    page_url = 'http://example.com/article'
+    other_page_url = 'http://example.com/other-article'
+
+    def setUp(self):
+        self.user, self.password = create_test_user()
+        self.token_header = 'JWT %s' % str(AccessToken.for_user(self.user))
+
+    def get_changes(self, **params):
+        response = self.client.get(self.changes_url, {'url': self.page_url, **params},
+                                   HTTP_AUTHORIZATION=self.token_header)
+        self.assertEqual(response.status_code, 200)
+        content = json.loads(response.content.decode('utf8'))
+        return [item['id'] for item in content['data']], content['meta']['deleted'], content['meta']['token']
+
+    def test_changes(self):
+        unchanged, modified, deactivated, moved = mommy.make('annotation.Annotation', 4, url=self.page_url)
+        mommy.make('annotation.Annotation', url=self.other_page_url)
+
+        changed, deleted, token = self.get_changes()
+        self.assertEqual(sorted(changed), sorted(str(a.id) for a in (unchanged, modified, deactivated, moved)))
+        self.assertEqual(deleted, [])
+
+        modified.comment = 'changed'
+        modified.save()
+        deactivated.active = False
+        deactivated.save()
+        moved.url = self.other_page_url
+        moved.save()
+        created = mommy.make('annotation.Annotation', url=self.page_url)
+        mommy.make('annotation.Annotation', url=self.other_page_url)
+
+        changed, deleted, next_token = self.get_changes(token=token)
+        self.assertEqual(sorted(changed), sorted([str(modified.id), str(created.id)]))
+        self.assertEqual(deleted, [str(deactivated.id), str(moved.id)])
+        self.assertGreater(next_token, token)
+
+        self.assertEqual(self.get_changes(token=next_token), ([], [], next_token))
+
+    def test_changes__merged_alias(self):
+        annotation = mommy.make('annotation.Annotation', url=self.other_page_url)
+        changed, deleted, token = self.get_changes()
+
+        URLAlias.objects.create(alias_url=self.other_page_url, canonical_url=self.page_url)
+
+        self.assertEqual(self.get_changes(token=token)[:2], ([str(annotation.id)], []))
+
+    def test_changes__hard_deleted(self):
+        annotation = mommy.make('annotation.Annotation', url=self.page_url)
+        changed, deleted, token = self.get_changes()
+
+        annotation_id = annotation.id
+        annotation.delete()
+        self.assertEqual(self.get_changes(token=token)[:2], ([], [str(annotation_id)]))
+
+    def test_changes__since(self):
+        annotation = mommy.make('annotation.Annotation', url=self.page_url)
+        since = timezone.now()
+        self.assertEqual(self.get_changes(since=since.isoformat())[0], [])
+        self.assertEqual(self.get_changes(since=(since - timedelta(hours=1)).isoformat())[0], [str(annotation.id)])
+
+    def test_changes__invalid(self):
+        response = self.client.get(self.changes_url, {'token': '1'}, HTTP_AUTHORIZATION=self.token_header)
+        self.assertEqual(response.status_code, 400)
+        response = self.client.get(self.changes_url, {'url': self.page_url, 'token': 'x'},
+                                   HTTP_AUTHORIZATION=self.token_header)
+        self.assertEqual(response.status_code, 400)
+
+    @override_settings(ANNOTATION_CHANGES_TOKEN_OVERLAP=60)
+    def test_changes__recent_listed_again(self):
+        old = mommy.make('annotation.Annotation', url=self.page_url)
+        old.history.update(history_date=timezone.now() - timedelta(minutes=5))
+        recent = mommy.make('annotation.Annotation', url=self.page_url)
+
+        changed, deleted, token = self.get_changes()
+        self.assertEqual(token, old.history.get().history_id)
+        # A change still in flight when the token was read (committed with a lower id) would not be skipped
+        self.assertEqual(self.get_changes(token=token)[0], [str(recent.id)])
@@ -0,0 +1,98 @@
+import json
+
+from django.core.cache import cache
+from django.test import TestCase
+from model_mommy import mommy
+from rest_framework_simplejwt.tokens import AccessToken
+
+from apps.annotation.models import Annotation, AnnotationUpvote
+from apps.annotation.tests.utils import create_test_user
+
+
+class URLVersionETagTest(TestCase):
+    list_url = "/api/annotations"
+    requests_list_url = "/api/annotationRequests"
+    page_url = 'http://example.com/article'
+
+    def setUp(self):
+        self.user, self.password = create_test_user()
+        self.token_header = 'JWT %s' % str(AccessToken.for_user(self.user))
+        cache.clear()
+
+    def get(self, url, params=None, token_header=None, **extra):
+        return self.client.get(url, {'url': self.page_url, **(params or {})},
+                               HTTP_AUTHORIZATION=token_header or self.token_header, **extra)
+
+    def assertNotModified(self, url, etag, params=None, token_header=None, modified=False):
+        response = self.get(url, params, token_header, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200 if modified else 304)
+        return response
+
+    def test_list__not_modified(self):
+        annotation = mommy.make('annotation.Annotation', url=self.page_url)
+        etag = self.get(self.list_url)['ETag']
+
+        with self.assertNumQueries(1):
+            # Only the user (authentication)
+            response = self.assertNotModified(self.list_url, etag)
+        self.assertEqual(response['ETag'], etag)
+        self.assertEqual(response.content, b'')
+
+        annotation.comment = 'changed'
+        annotation.save()
+        response = self.assertNotModified(self.list_url, etag, modified=True)
+        self.assertEqual(json.loads(response.content.decode('utf8'))['data'][0]['attributes']['comment'], 'changed')
+        self.assertNotModified(self.list_url, response['ETag'])
+
+    def test_list__not_cached_params(self):
+        mommy.make('annotation.Annotation', url=self.page_url)
+        params = {'check_status': 'UNVERIFIED'}
+        etag = self.get(self.list_url, params)['ETag']
+
+        self.assertNotModified(self.list_url, etag, params)
+        self.assertNotModified(self.list_url, etag, modified=True)
+
+    def test_list__user_dependent(self):
+        annotation = mommy.make('annotation.Annotation', url=self.page_url)
+        etag = self.get(self.list_url)['ETag']
+
+        other_user, password = create_test_user(unique=True)
+        other_token_header = 'JWT %s' % str(AccessToken.for_user(other_user))
+        self.assertNotModified(self.list_url, etag, token_header=other_token_header, modified=True)
+
+        AnnotationUpvote.objects.create(user=self.user, annotation=annotation)
+        self.assertNotModified(self.list_url, etag, modified=True)
+
+    def test_list__without_url(self):
+        response = self.client.get(self.list_url, HTTP_AUTHORIZATION=self.token_header)
+        self.assertNotIn('ETag', response)
+
+    def test_annotation_requests__not_modified(self):
+        mommy.make('annotation.AnnotationRequest', url=self.page_url)
+        etag = self.get(self.requests_list_url)['ETag']
+        self.assertNotModified(self.requests_list_url, etag)
+
+        mommy.make('annotation.AnnotationRequest', url=self.page_url)
+        etag = self.assertNotModified(self.requests_list_url, etag, modified=True)['ETag']
+        mommy.make('annotation.AnnotationRequest', url='http://example.com/other-article')
+        self.assertNotModified(self.requests_list_url, etag)
+
+    def test_annotation_requests__answered(self):
+        annotation_request = mommy.make('annotation.AnnotationRequest', url=self.page_url)
+        etag = self.get(self.requests_list_url)['ETag']
+
+        mommy.make('annotation.Annotation', url='http://example.com/other-article',
+                   annotation_request=annotation_request)
+        self.assertNotModified(self.requests_list_url, etag, modified=True)
+
+    def test_annotation_requests__answer_moved(self):
+        annotation_request = mommy.make('annotation.AnnotationRequest', url=self.page_url)
+        annotation_id = mommy.make('annotation.Annotation', url='http://example.com/other-article',
+                                   annotation_request=annotation_request).id
+        etag = self.get(self.requests_list_url)['ETag']
+
+        annotation = Annotation.objects.get(pk=annotation_id)
+        annotation.annotation_request = mommy.make('annotation.AnnotationRequest',
+                                                   url='http://example.com/other-article')
+        annotation.save()
+        self.assertNotModified(self.requests_list_url, etag, modified=True)
@@ -0,0 +1,94 @@
+import json
+from datetime import timedelta
+
+from django.core.cache import cache
+from django.test import TestCase
+from django.utils import timezone
+from model_mommy import mommy
+from rest_framework_simplejwt.tokens import AccessToken
+
+from apps.annotation.models import Annotation
+from apps.annotation.tests.utils import create_test_user
+
+
+class KeysetPaginationTest(TestCase):
+    list_url = "/api/annotations"
+    requests_list_url = "/api/annotationRequests"
+
+    def setUp(self):
+        self.user, self.password = create_test_user()
+        self.token_header = 'JWT %s' % str(AccessToken.for_user(self.user))
+        cache.clear()
+
+        now = timezone.now()
+        # Two annotations share create_date, so the id is needed to order them
+        self.annotations = [
+            mommy.make('annotation.Annotation', create_date=now - timedelta(minutes=minutes))
+            for minutes in (0, 1, 1, 2, 3)
+        ]
+        # Including the mock data inserted by migrations
+        self.expected_ids = [str(pk) for pk in Annotation.objects.filter(active=True).order_by(
+            '-create_date', '-id'
+        ).values_list('id', flat=True)]
+
+    def get(self, url, params=None):
+        response = self.client.get(url, params, HTTP_AUTHORIZATION=self.token_header)
+        self.assertEqual(response.status_code, 200)
+        return json.loads(response.content.decode('utf8'))
+
+    def test_pages(self):
+        response_data = self.get(self.list_url, {'page[cursor]': '', 'page[limit]': 2})
+        self.assertIsNone(response_data['links']['prev'])
+        self.assertNotIn('count', response_data['meta']['pagination'])
+
+        ids = []
+        pages = [response_data]
+        while response_data['links']['next']:
+            ids.extend(item['id'] for item in response_data['data'])
+            response_data = self.get(response_data['links']['next'])
+            pages.append(response_data)
+        ids.extend(item['id'] for item in response_data['data'])
+
+        self.assertEqual(ids, self.expected_ids)
+        self.assertEqual(len(pages), (len(self.expected_ids) + 1) // 2)
+
+        # And back again
+        for page in reversed(pages[:-1]):
+            response_data = self.get(response_data['links']['prev'])
+            self.assertEqual(response_data['data'], page['data'])
+        self.assertIsNone(response_data['links']['prev'])
+
+    def test_no_count_query(self):
+        with self.assertNumQueries(2):
+            # User, annotations page (with the user's upvotes) and nothing like COUNT(*)
+            response = self.client.get(self.list_url, {'page[cursor]': ''}, HTTP_AUTHORIZATION=self.token_header)
+        self.assertEqual(response.status_code, 200)
+
+    def test_approximate_total__unsupported_database(self):
+        response_data = self.get(self.list_url, {'page[cursor]': '', 'page[total]': 'approximate'})
+        self.assertNotIn('approximateCount', response_data['meta']['pagination'])
+
+    def test_invalid_cursor(self):
+        response = self.client.get(self.list_url, {'page[cursor]': 'not-a-cursor'},
+                                   HTTP_AUTHORIZATION=self.token_header)
+        self.assertEqual(response.status_code, 404)
+
+    def test_limit_offset_by_default(self):
+        response_data = self.get(self.list_url, {'page[limit]': 2, 'page[offset]': 2})
+        self.assertEqual(response_data['meta']['pagination']['count'], len(self.expected_ids))
+        # Only create_date is ordered by, so the two annotations created at the same time may come in any order
+        self.assertEqual({item['id'] for item in response_data['data']}, set(self.expected_ids[2:4]))
+
+    def test_annotation_requests(self):
+        annotation_requests = [mommy.make('annotation.AnnotationRequest', user=self.user) for i in range(3)]
+        mommy.make('annotation.AnnotationRequest')
+
+        response_data = self.get(self.requests_list_url,
+                                 {'belongs_to_me': 'true', 'page[cursor]': '', 'page[limit]': 2})
+        next_page = self.get(response_data['links']['next'])
+
+        self.assertEqual(
+            [item['id'] for item in response_data['data'] + next_page['data']],
+            [str(annotation_request.id) for annotation_request in reversed(annotation_requests)]
+        )
+        self.assertIsNone(next_page['links']['next'])
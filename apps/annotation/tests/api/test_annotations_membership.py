@@ -0,0 +1,85 @@
+import base64
+import json
+
+from django.conf import settings
+from django.core.cache import cache
+from django.test import TestCase, TransactionTestCase
+from model_mommy import mommy
+from rest_framework_simplejwt.tokens import AccessToken
+
+from apps.annotation import membership
+from apps.annotation.membership import BloomFilter
+from apps.annotation.tests.utils import create_test_user
+from apps.annotation.utils import hash_url_id, standardize_url_id
+
+
+class AnnotationExistsAPITest(TestCase):
+    exists_url = "/api/annotations/exists"
+
+    def setUp(self):
+        self.user, self.password = create_test_user()
+        self.token_header = 'JWT %s' % str(AccessToken.for_user(self.user))
+
+    def get_exists(self, **headers):
+        response = self.client.get(self.exists_url, HTTP_AUTHORIZATION=self.token_header, **headers)
+        return response, json.loads(response.content.decode('utf8'))
+
+    def test_exists(self):
+        mommy.make('annotation.Annotation', url='http://example.com/page')
+        mommy.make('annotation.Annotation', url='http://example.com/inactive', active=False)
+
+        response, content = self.get_exists(HTTP_PP_SITE_URL='https://example.com/page#anchor')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(content, {'exists': True})
+
+        response, content = self.get_exists(HTTP_PP_SITE_URL='http://example.com/inactive')
+        self.assertEqual(content, {'exists': False})
+
+        response = self.client.get(self.exists_url, {'url': 'http://example.com/other'},
+                                   HTTP_AUTHORIZATION=self.token_header)
+        self.assertEqual(json.loads(response.content.decode('utf8')), {'exists': False})
+
+    def test_exists__no_url_400(self):
+        response, content = self.get_exists()
+        self.assertEqual(response.status_code, 400)
+
+
+class AnnotationMembershipFilterAPITest(TransactionTestCase):
+    # Annotations are added to the filter once committed
+    membership_filter_url = "/api/annotations/membershipFilter"
+
+    def setUp(self):
+        self.user, self.password = create_test_user()
+        self.token_header = 'JWT %s' % str(AccessToken.for_user(self.user))
+        cache.clear()
+
+    def test_get(self):
+        mommy.make('annotation.Annotation', url='http://example.com/page')
+
+        # Being built by the task (run at once in tests)
+        response = self.client.get(self.membership_filter_url, HTTP_AUTHORIZATION=self.token_header)
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response['Retry-After'], str(settings.ANNOTATION_MEMBERSHIP_FILTER_RETRY_AFTER))
+
+        response = self.client.get(self.membership_filter_url, HTTP_AUTHORIZATION=self.token_header)
+
+        self.assertEqual(response.status_code, 200)
+        content = json.loads(response.content.decode('utf8'))
+        self.assertEqual(set(content), {'size', 'hashCount', 'bits'})
+        bloom_filter = BloomFilter(content['size'], content['hashCount'], base64.b64decode(content['bits']))
+        self.assertIn(hash_url_id(standardize_url_id('http://example.com/page')), bloom_filter)
+
+    def test_get__not_modified(self):
+        membership.rebuild_membership_filter()
+        response = self.client.get(self.membership_filter_url, HTTP_AUTHORIZATION=self.token_header)
+        etag = response['ETag']
+
+        response = self.client.get(self.membership_filter_url, HTTP_AUTHORIZATION=self.token_header,
+                                   HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+        mommy.make('annotation.Annotation', url='http://example.com/page')
+        response = self.client.get(self.membership_filter_url, HTTP_AUTHORIZATION=self.token_header,
+                                   HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
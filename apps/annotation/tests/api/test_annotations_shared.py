@@ -0,0 +1,122 @@
+import json
+
+from django.core.cache import cache
+from django.test import TestCase
+from model_mommy import mommy
+from rest_framework_simplejwt.tokens import AccessToken
+
+from apps.annotation.models import AnnotationUpvote
+from apps.annotation.tests.utils import create_test_user
+
+
+class AnnotationSharedListTest(TestCase):
+    shared_url = "/api/annotations/shared"
+    page_url = 'http://example.com/article'
+
+    def setUp(self):
+        self.user, self.password = create_test_user()
+        self.token_header = 'JWT %s' % str(AccessToken.for_user(self.user))
+        cache.clear()
+
+    def test_shared(self):
+        annotation = mommy.make('annotation.Annotation', url=self.page_url, user=self.user)
+        mommy.make('annotation.Annotation', url='http://example.com/other-article')
+        AnnotationUpvote.objects.create(user=self.user, annotation=annotation)
+
+        response = self.client.get(self.shared_url, {'url': self.page_url}, HTTP_AUTHORIZATION=self.token_header)
+        self.assertEqual(response.status_code, 200)
+        response_data = json.loads(response.content.decode('utf8'))
+
+        self.assertEqual([item['id'] for item in response_data['data']], [str(annotation.id)])
+        attributes = response_data['data'][0]['attributes']
+        self.assertEqual(attributes['upvoteCount'], 1)
+        self.assertNotIn('doesBelongToUser', attributes)
+        self.assertNotIn('upvoteCountExceptUser', attributes)
+        self.assertNotIn('annotationUpvote', response_data['data'][0]['relationships'])
+
+    def test_shared__same_for_everyone(self):
+        mommy.make('annotation.Annotation', url=self.page_url, user=self.user)
+        response = self.client.get(self.shared_url, {'url': self.page_url}, HTTP_AUTHORIZATION=self.token_header)
+        anonymous_response = self.client.get(self.shared_url, {'url': self.page_url})
+
+        self.assertEqual(anonymous_response.status_code, 200)
+        self.assertEqual(response.content, anonymous_response.content)
+        self.assertEqual(response['ETag'], anonymous_response['ETag'])
+        self.assertIn('public', response['Cache-Control'])
+
+    def test_shared__not_modified(self):
+        annotation = mommy.make('annotation.Annotation', url=self.page_url)
+        etag = self.client.get(self.shared_url, {'url': self.page_url})['ETag']
+
+        response = self.client.get(self.shared_url, {'url': self.page_url}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+
+        annotation.comment = 'changed'
+        annotation.save()
+        response = self.client.get(self.shared_url, {'url': self.page_url}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_shared__url_required(self):
+        response = self.client.get(self.shared_url)
+        self.assertEqual(response.status_code, 400)
+
+
+class AnnotationUserStateTest(TestCase):
+    user_state_url = "/api/annotations/userState"
+
+    def setUp(self):
+        self.user, self.password = create_test_user()
+        self.token_header = 'JWT %s' % str(AccessToken.for_user(self.user))
+
+    def get_user_state(self, ids):
+        response = self.client.get(self.user_state_url, {'ids': ids}, HTTP_AUTHORIZATION=self.token_header)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('private', response['Cache-Control'])
+        return json.loads(response.content.decode('utf8'))
+
+    def test_user_state(self):
+        own_annotation = mommy.make('annotation.Annotation', user=self.user)
+        upvoted_annotation = mommy.make('annotation.Annotation')
+        upvote = AnnotationUpvote.objects.create(user=self.user, annotation=upvoted_annotation)
+        AnnotationUpvote.objects.create(user=create_test_user(unique=True)[0], annotation=own_annotation)
+        inactive_annotation = mommy.make('annotation.Annotation', user=self.user, active=False)
+
+        with self.assertNumQueries(2):
+            response_data = self.get_user_state('{},{},{}'.format(
+                upvoted_annotation.id, own_annotation.id, inactive_annotation.id
+            ))
+
+        self.assertEqual(response_data, [
+            {'id': str(upvoted_annotation.id), 'doesBelongToUser': False, 'annotationUpvote': str(upvote.id),
+             'upvoteCount': 1, 'upvoteCountExceptUser': 0},
+            {'id': str(own_annotation.id), 'doesBelongToUser': True, 'annotationUpvote': None,
+             'upvoteCount': 1, 'upvoteCountExceptUser': 1},
+        ])
+
+    def test_user_state__many_annotations_single_query(self):
+        annotations = mommy.make('annotation.Annotation', _quantity=20)
+        for annotation in annotations[::2]:
+            AnnotationUpvote.objects.create(user=self.user, annotation=annotation)
+        for annotation in annotations[::3]:
+            AnnotationUpvote.objects.create(user=create_test_user(unique=True)[0], annotation=annotation)
+
+        with self.assertNumQueries(2):
+            # User and the annotations (with the user's upvotes)
+            response_data = self.get_user_state(','.join(str(annotation.id) for annotation in annotations))
+
+        self.assertEqual([state['id'] for state in response_data], [str(annotation.id) for annotation in annotations])
+        for i, state in enumerate(response_data):
+            self.assertEqual(state['annotationUpvote'] is not None, i % 2 == 0)
+            self.assertEqual(state['upvoteCount'], int(i % 2 == 0) + int(i % 3 == 0))
+            self.assertEqual(state['upvoteCountExceptUser'], int(i % 3 == 0))
+
+    def test_user_state__invalid_ids(self):
+        for ids in ('', 'a,b'):
+            response = self.client.get(self.user_state_url, {'ids': ids}, HTTP_AUTHORIZATION=self.token_header)
+            self.assertEqual(response.status_code, 400)
+
+    def test_user_state__unauthorized(self):
+        response = self.client.get(self.user_state_url, {'ids': '1'})
+        self.assertEqual(response.status_code, 401)
@@ -0,0 +1,101 @@
+import json
+from unittest import mock
+
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from model_mommy import mommy
+from rest_framework_simplejwt.tokens import AccessToken
+
+from apps.annotation import snapshots
+from apps.annotation.models import Annotation, AnnotationUpvote
+from apps.annotation.tests.utils import create_test_user
+from apps.annotation.utils import hash_url_id, standardize_url_id
+
+
+@override_settings(ANNOTATION_SNAPSHOT_HIT_THRESHOLD=1)
+class AnnotationSnapshotTest(TestCase):
+    list_url = "/api/annotations"
+    page_url = 'http://example.com/article'
+
+    def setUp(self):
+        self.user, self.password = create_test_user()
+        self.token_header = 'JWT %s' % str(AccessToken.for_user(self.user))
+        self.url_hash = hash_url_id(standardize_url_id(self.page_url))
+        cache.clear()
+
+    def list_annotations(self, **params):
+        response = self.client.get(self.list_url, {'url': self.page_url, **params},
+                                   HTTP_AUTHORIZATION=self.token_header)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['content-type'], 'application/vnd.api+json')
+        return json.loads(response.content.decode('utf8'))
+
+    def test_snapshot__same_as_regular_list(self):
+        own_annotation = mommy.make('annotation.Annotation', url=self.page_url, user=self.user,
+                                    range={'start': '/p[1]', 'end': '/p[1]'})
+        upvoted_annotation = mommy.make('annotation.Annotation', url=self.page_url)
+        mommy.make('annotation.Annotation', url=self.page_url)
+        AnnotationUpvote.objects.create(user=self.user, annotation=upvoted_annotation)
+        AnnotationUpvote.objects.create(user=create_test_user(unique=True)[0], annotation=upvoted_annotation)
+        AnnotationUpvote.objects.create(user=create_test_user(unique=True)[0], annotation=own_annotation)
+        self.assertIsNone(snapshots.get_snapshot(self.url_hash))
+
+        # Rendering the snapshot is requested (and run eagerly by Celery in tests) when the list is not snapshotted
+        regular = self.list_annotations(**{'page[limit]': 2, 'page[offset]': 1})
+        self.assertIsNotNone(snapshots.get_snapshot(self.url_hash))
+
+        # Bypassing save() (and so invalidation) proves the snapshot is used
+        Annotation.objects.filter(url_hash=self.url_hash).update(comment='changed')
+        with self.assertNumQueries(2):
+            # User and user's upvotes
+            from_snapshot = self.list_annotations(**{'page[limit]': 2, 'page[offset]': 1})
+        self.assertEqual(from_snapshot, regular)
+
+        regular = self.list_annotations()
+        other_user, password = create_test_user(unique=True)
+        self.token_header = 'JWT %s' % str(AccessToken.for_user(other_user))
+        self.assertNotEqual(self.list_annotations(), regular)
+
+    def test_snapshot__outdated_after_write(self):
+        annotation = mommy.make('annotation.Annotation', url=self.page_url)
+        snapshots.render_snapshot(self.url_hash)
+
+        annotation.comment = 'changed'
+        annotation.save()
+        self.assertIsNone(snapshots.get_snapshot(self.url_hash))
+        self.assertEqual(self.list_annotations()['data'][0]['attributes']['comment'], 'changed')
+
+    def test_snapshot__links_of_request(self):
+        annotation = mommy.make('annotation.Annotation', url=self.page_url)
+        snapshots.render_snapshot(self.url_hash)
+
+        data = self.list_annotations()['data'][0]
+        self.assertEqual(data['links']['self'], 'http://testserver/api/annotations/{}'.format(annotation.id))
+
+    def test_snapshot__same_bytes_as_regular_list(self):
+        mommy.make('annotation.Annotation', url=self.page_url, comment='Zażółć gęślą jaźń, "{}": {}'.format(
+            snapshots.SNAPSHOT_ORIGIN, 'http://testserver'
+        ))
+        with override_settings(ANNOTATION_SNAPSHOT_HIT_THRESHOLD=2):
+            regular = self.client.get(self.list_url, {'url': self.page_url}, HTTP_AUTHORIZATION=self.token_header)
+            self.assertIsNone(snapshots.get_snapshot(self.url_hash))
+            from_snapshot = self.client.get(self.list_url, {'url': self.page_url},
+                                            HTTP_AUTHORIZATION=self.token_header)
+        self.assertIsNotNone(snapshots.get_snapshot(self.url_hash))
+        from_snapshot = self.client.get(self.list_url, {'url': self.page_url}, HTTP_AUTHORIZATION=self.token_header)
+        self.assertEqual(from_snapshot.content, regular.content)
+
+    @override_settings(ANNOTATION_SNAPSHOT_HIT_THRESHOLD=3)
+    def test_snapshot__hot_urls_only(self):
+        annotation = mommy.make('annotation.Annotation', url=self.page_url)
+        for i in range(2):
+            self.list_annotations()
+        self.assertIsNone(snapshots.get_snapshot(self.url_hash))
+        self.list_annotations()
+        self.assertIsNotNone(snapshots.get_snapshot(self.url_hash))
+
+        # Not rendered again after writes once the URL is not listed anymore
+        cache.delete(snapshots.URL_HITS_KEY.format(url_hash=self.url_hash))
+        with mock.patch.object(snapshots, 'request_snapshot') as request_snapshot:
+            snapshots.refresh_snapshot(annotation.url_hash)
+        request_snapshot.assert_not_called()
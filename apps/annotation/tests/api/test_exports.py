@@ -0,0 +1,61 @@
+import csv
+import json
+from io import StringIO
+
+from django.test import TestCase
+from model_mommy import mommy
+from rest_framework_simplejwt.tokens import AccessToken
+
+from apps.annotation.models import AnnotationUpvote
+from apps.annotation.tests.utils import create_test_user
+
+
+class ExportTest(TestCase):
+    export_url = "/api/exports/{}"
+
+    def setUp(self):
+        self.user, self.password = create_test_user()
+        self.user.role = self.user.ROLE_EDITOR
+        self.user.save()
+        self.token_header = 'JWT %s' % str(AccessToken.for_user(self.user))
+
+    def export(self, name, **params):
+        response = self.client.get(self.export_url.format(name), params, HTTP_AUTHORIZATION=self.token_header)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        return b''.join(response.streaming_content).decode('utf8')
+
+    def test_export__ndjson(self):
+        upvotes = [AnnotationUpvote.objects.create(user=self.user, annotation=annotation)
+                   for annotation in mommy.make('annotation.Annotation', 3)]
+
+        rows = [json.loads(line) for line in self.export('annotationUpvotes.ndjson').splitlines()]
+
+        self.assertEqual([(row['id'], row['annotation_id']) for row in rows],
+                         [(upvote.id, upvote.annotation_id) for upvote in upvotes])
+
+    def test_export__csv(self):
+        annotation_request = mommy.make('annotation.AnnotationRequest', url='http://example.com/article',
+                                        range={'start': '/p[1]', 'end': None}, notification_email='user@example.com')
+
+        rows = list(csv.DictReader(StringIO(self.export('annotationRequests.csv'))))
+
+        self.assertEqual([(row['id'], row['url']) for row in rows],
+                         [(str(annotation_request.id), 'http://example.com/article')])
+        self.assertEqual(json.loads(rows[0]['range']), {'start': '/p[1]', 'end': None})
+        self.assertNotIn('notification_email', rows[0])
+
+    def test_export__since(self):
+        response = self.client.get(self.export_url.format('annotations.ndjson'), {'since': 'yesterday'},
+                                   HTTP_AUTHORIZATION=self.token_header)
+        self.assertEqual(response.status_code, 400)
+
+    def test_export__only_editor(self):
+        user, password = create_test_user(unique=True)
+        response = self.client.get(self.export_url.format('annotations.csv'),
+                                   HTTP_AUTHORIZATION='JWT %s' % str(AccessToken.for_user(user)))
+        self.assertEqual(response.status_code, 403)
+
+    def test_export__unknown(self):
+        response = self.client.get(self.export_url.format('users.csv'), HTTP_AUTHORIZATION=self.token_header)
+        self.assertEqual(response.status_code, 404)
@@ -0,0 +1,119 @@
+import json
+import re
+
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase
+from model_mommy import mommy
+from rest_framework_simplejwt.tokens import AccessToken
+
+from apps.annotation import aliases
+from apps.annotation.models import Annotation
+from apps.annotation.tests.utils import create_test_user
+
+# Tables of the list actions, which must never be read in whole
+CHECKED_TABLES = ('annotation_annotation', 'annotation_annotationrequest', 'annotation_annotatedurl',
+                  'annotation_annotationupvote')
+
+
+def get_full_scans(sql, params):
+    """
+    Return tables of CHECKED_TABLES read by a sequential (full) scan in the plan of the query
+    """
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            # Tiny test tables are cheaper to read in whole, so the planner is asked to avoid it whenever it can
+            cursor.execute('SET LOCAL enable_seqscan = off')
+            cursor.execute('EXPLAIN (FORMAT JSON) ' + sql, params)
+            plan = cursor.fetchone()[0]
+            nodes, scans = [plan[0]['Plan']], []
+            while nodes:
+                node = nodes.pop()
+                if node['Node Type'] == 'Seq Scan' and node['Relation Name'] in CHECKED_TABLES:
+                    scans.append(node['Relation Name'])
+                nodes.extend(node.get('Plans', []))
+            return scans
+        cursor.execute('EXPLAIN QUERY PLAN ' + sql, params)
+        # e.g. "SCAN TABLE annotation_annotation" (unlike "SEARCH TABLE ... USING INDEX ..." or an ordered
+        # "SCAN TABLE ... USING INDEX ...", stopped at the limit); newer versions of SQLite omit "TABLE"
+        return [match.group(1) for row in cursor.fetchall()
+                for match in [re.match(r'SCAN (?:TABLE )?(\w+)(?: AS \w+)?$', row[-1])]
+                if match and match.group(1) in CHECKED_TABLES]
+
+
+class QueryPlansTest(TestCase):
+    """
+    Queries of the list actions should be served by indexes, whatever the data
+    """
+    page_url = 'https://example.com/article/1'
+
+    def setUp(self):
+        self.user, self.password = create_test_user()
+        self.token_header = 'JWT %s' % str(AccessToken.for_user(self.user))
+        cache.clear()
+        aliases._local_aliases.clear()
+
+        for i in range(20):
+            url = 'https://example.com/article/{}'.format(i % 5)
+            annotation_request = mommy.make('annotation.AnnotationRequest', url=url, active=i % 3 > 0)
+            annotation = mommy.make('annotation.Annotation', url=url, active=i % 4 > 0,
+                                    annotation_request=annotation_request)
+            if i % 2:
+                mommy.make('annotation.AnnotationUpvote', annotation=annotation, user=self.user)
+            mommy.make('annotation.AnnotationUpvote', annotation=annotation)
+        mommy.make('annotation.Annotation', publisher='DEMAGOG', publisher_annotation_id='1')
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+
+    def capture_queries(self, url, params):
+        queries = []
+
+        def capture(execute, sql, query_params, many, context):
+            queries.append((sql, query_params))
+            return execute(sql, query_params, many, context)
+
+        with connection.execute_wrapper(capture):
+            response = self.client.get(url, params, HTTP_AUTHORIZATION=self.token_header)
+        self.assertEqual(response.status_code, 200)
+        return [(sql, query_params) for sql, query_params in queries if sql.startswith('SELECT')]
+
+    def assertNoFullScans(self, url, params):
+        queries = self.capture_queries(url, params)
+        self.assertTrue(queries)
+        for sql, query_params in queries:
+            self.assertEqual(get_full_scans(sql, query_params), [], 'Full scan in {}'.format(sql))
+
+    def test_annotations_of_url(self):
+        self.assertNoFullScans('/api/annotations', {'url': self.page_url})
+
+    def test_annotations_keyset(self):
+        first_page = self.client.get('/api/annotations', {'page[cursor]': '', 'page[limit]': 3},
+                                     HTTP_AUTHORIZATION=self.token_header)
+        next_url = json.loads(first_page.content.decode('utf8'))['links']['next']
+        self.assertNoFullScans(next_url, {})
+
+    def test_annotation_requests_of_url(self):
+        self.assertNoFullScans('/api/annotationRequests', {'url': self.page_url})
+
+    def test_annotation_requests_keyset(self):
+        self.assertNoFullScans('/api/annotationRequests', {'page[cursor]': '', 'page[limit]': 3})
+
+    def test_answered_annotation_requests_keyset(self):
+        self.assertNoFullScans('/api/annotationRequests', {'answered': 'true', 'page[cursor]': '', 'page[limit]': 3})
+
+    def test_annotated_urls_of_domain(self):
+        self.assertNoFullScans('/api/annotatedUrls', {'domain': 'example.com'})
+
+    def test_user_state(self):
+        # A few ids only, as reading a good part of the tiny test table in whole is (rightly) cheaper for SQLite
+        ids = Annotation.objects.values_list('id', flat=True)[:3]
+        self.assertNoFullScans('/api/annotations/userState', {'ids': ','.join(str(id) for id in ids)})
+
+    def test_demagog_statement_lookup(self):
+        queryset = Annotation.objects.filter(publisher='DEMAGOG', publisher_annotation_id='1')
+        sql, params = queryset.query.sql_with_params()
+        self.assertEqual(get_full_scans(sql, params), [])
+
+    def test_full_scan_detected(self):
+        sql, params = Annotation.objects.filter(comment='').query.sql_with_params()
+        self.assertEqual(get_full_scans(sql, params), ['annotation_annotation'])
@@ -1,5 +1,6 @@
 import responses
 from django.conf import settings
+from django.core.cache import cache
 from django.test import TestCase
 from mock import patch
 from model_mommy import mommy
@@ -29,6 +30,7 @@ class AnnotationTestBase(TestCase):
         self.user, password = create_test_user()
         self.token = str(AccessToken.for_user(self.user))
         self.token_header = 'JWT %s' % self.token
+        cache.clear()
         Annotation.objects.all().update(check_status=Annotation.UNVERIFIED)
 
     def request_to_generic_class_view(self, view_class, method, data=None, headers=None):
@@ -0,0 +1,99 @@
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.test import TestCase, TransactionTestCase
+from model_mommy import mommy
+
+from apps.annotation import aliases, membership
+from apps.annotation.models import Annotation, URLAlias
+from apps.annotation.utils import hash_url_id, standardize_url_id
+
+
+def url_hash(url):
+    return hash_url_id(standardize_url_id(url))
+
+
+class URLAliasTest(TestCase):
+    alias_url = 'https://example.com/redirect/123'
+    canonical_url = 'https://example.com/article'
+
+    def setUp(self):
+        cache.clear()
+        aliases._local_aliases.clear()
+
+    def tearDown(self):
+        aliases._local_aliases.clear()
+
+    def test_resolve(self):
+        URLAlias.objects.create(alias_url=self.alias_url, canonical_url=self.canonical_url)
+        self.assertEqual(aliases.resolve_url_alias(standardize_url_id(self.alias_url)),
+                         (standardize_url_id(self.canonical_url), url_hash(self.canonical_url)))
+        self.assertEqual(aliases.resolve_url_alias(standardize_url_id(self.canonical_url)),
+                         (standardize_url_id(self.canonical_url), url_hash(self.canonical_url)))
+
+    def test_resolve__cached(self):
+        URLAlias.objects.create(alias_url=self.alias_url, canonical_url=self.canonical_url)
+        url_ids = [standardize_url_id(self.alias_url), standardize_url_id('https://example.com/other')]
+        with self.assertNumQueries(1):
+            aliases.resolve_url_aliases(url_ids)
+        with self.assertNumQueries(0):
+            aliases.resolve_url_aliases(url_ids)
+
+        # Other processes use the shared cache
+        aliases._local_aliases.clear()
+        with self.assertNumQueries(0):
+            resolved = aliases.resolve_url_aliases(url_ids)
+        self.assertEqual(resolved[url_ids[0]][1], url_hash(self.canonical_url))
+
+    def test_saved_under_canonical_url(self):
+        URLAlias.objects.create(alias_url=self.alias_url, canonical_url=self.canonical_url)
+        annotation = mommy.make('annotation.Annotation', url=self.alias_url)
+        self.assertEqual(annotation.url, self.alias_url)
+        self.assertEqual(annotation.url_hash, url_hash(self.canonical_url))
+
+    def test_merge(self):
+        annotation = mommy.make('annotation.Annotation', url=self.alias_url)
+        annotation_request = mommy.make('annotation.AnnotationRequest', url=self.alias_url)
+        other_alias = URLAlias.objects.create(alias_url='https://example.com/redirect/456',
+                                              canonical_url=self.alias_url)
+
+        URLAlias.objects.create(alias_url=self.alias_url, canonical_url=self.canonical_url)
+
+        for instance in (annotation, annotation_request, other_alias):
+            instance.refresh_from_db()
+        self.assertEqual(annotation.url_hash, url_hash(self.canonical_url))
+        self.assertEqual(annotation_request.url_id, standardize_url_id(self.canonical_url))
+        # The history is kept, with the move recorded
+        history = Annotation.history.filter(id=annotation.id).order_by('history_id')
+        self.assertEqual([record.url_hash for record in history],
+                         [url_hash(self.alias_url), url_hash(self.canonical_url)])
+        # No chains of aliases
+        self.assertEqual(other_alias.canonical_hash, url_hash(self.canonical_url))
+        self.assertEqual(aliases.resolve_url_alias(other_alias.alias_url_id)[1], url_hash(self.canonical_url))
+
+    def test_deleted(self):
+        alias = URLAlias.objects.create(alias_url=self.alias_url, canonical_url=self.canonical_url)
+        aliases.resolve_url_alias(alias.alias_url_id)
+        alias.delete()
+        self.assertEqual(aliases.resolve_url_alias(alias.alias_url_id)[1], url_hash(self.alias_url))
+
+    def test_clean(self):
+        URLAlias.objects.create(alias_url=self.alias_url, canonical_url=self.canonical_url)
+        with self.assertRaises(ValidationError):
+            URLAlias(alias_url=self.alias_url + '?utm_source=x', canonical_url='https://example.com/other').clean()
+        with self.assertRaises(ValidationError):
+            URLAlias(alias_url='https://www.example.com/other', canonical_url='https://example.com/other').clean()
+
+
+class URLAliasMembershipFilterTest(TransactionTestCase):
+    alias_url = 'https://example.com/redirect/123'
+    canonical_url = 'https://example.com/article'
+
+    def setUp(self):
+        cache.clear()
+        aliases._local_aliases.clear()
+
+    def test_membership_filter(self):
+        mommy.make('annotation.Annotation', url=self.canonical_url)
+        membership.rebuild_membership_filter()
+        URLAlias.objects.create(alias_url=self.alias_url, canonical_url=self.canonical_url)
+        self.assertIn(url_hash(self.alias_url), membership.get_membership_filter())
@@ -0,0 +1,54 @@
+import tempfile
+from datetime import datetime
+
+from django.test import TestCase
+from django.utils import timezone
+from model_mommy import mommy
+
+from apps.annotation import analytics
+from apps.annotation.models import Annotation, AnnotationUpvote
+
+
+class AnalyticsSnapshotTest(TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        # The mock data inserted by migrations would make counting harder
+        Annotation.objects.all().delete()
+
+    def test_dictionary_encode(self):
+        self.assertEqual(analytics.dictionary_encode(['PP', 'DEMAGOG', 'PP', None]),
+                         {'dictionary': ['PP', 'DEMAGOG', None], 'values': [0, 1, 0, 2]})
+
+    def test_write_and_load(self):
+        january = timezone.make_aware(datetime(2019, 1, 15))
+        february = timezone.make_aware(datetime(2019, 2, 15))
+        pp_annotation = mommy.make('annotation.Annotation', publisher=Annotation.PP_PUBLISHER,
+                                   url='http://example.com/article')
+        demagog_annotation = mommy.make('annotation.Annotation', publisher=Annotation.DEMAGOG_PUBLISHER,
+                                        url='https://www.other.org/article')
+        for annotation, create_date in ((pp_annotation, january), (pp_annotation, january),
+                                        (pp_annotation, february), (demagog_annotation, february)):
+            mommy.make('annotation.AnnotationUpvote', annotation=annotation, create_date=create_date)
+        mommy.make('annotation.AnnotationRequest', url='http://example.com/other-article')
+
+        analytics.write_snapshot(self.directory.name)
+
+        annotations = analytics.load_table('annotations', self.directory.name)
+        upvotes = analytics.load_table('annotationUpvotes', self.directory.name)
+        requests = analytics.load_table('annotationRequests', self.directory.name)
+
+        self.assertEqual(annotations.row_count, 2)
+        self.assertEqual(annotations.columns['publisher']['dictionary'],
+                         [Annotation.PP_PUBLISHER, Annotation.DEMAGOG_PUBLISHER])
+        self.assertEqual(annotations.value_counts('domain'), {'example.com': 1, 'other.org': 1})
+        self.assertEqual(requests.value_counts('domain'), {'example.com': 1})
+        self.assertEqual(upvotes.row_count, AnnotationUpvote.objects.count())
+
+        publishers = dict(annotations.rows('id', 'publisher'))
+        self.assertEqual(
+            analytics.count_by(upvotes.rows('annotation_id', 'create_date'),
+                               lambda id, date: (publishers[id], analytics.month(date))),
+            {('PP', '2019-01'): 2, ('PP', '2019-02'): 1, ('DEMAGOG', '2019-02'): 1}
+        )
@@ -0,0 +1,223 @@
+import csv
+import json
+from datetime import timedelta
+from io import StringIO
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from model_mommy import mommy
+
+from apps.annotation.models import AnnotatedURL, Annotation, AnnotationRequest, URLCanonicalizationRun
+from apps.annotation.utils import get_canonicalization_rules_fingerprint, hash_url_id
+
+
+class BackfillURLHashCommandTest(TestCase):
+
+    def call_command(self, *args):
+        call_command('backfill_url_hash', *args, stdout=StringIO())
+
+    def test_backfill(self):
+        annotations = mommy.make('annotation.Annotation', 3, url='http://example.com/page')
+        annotation_request = mommy.make('annotation.AnnotationRequest', url='http://example.com/other')
+        # Simulate rows saved before url_hash existed
+        Annotation.objects.update(url_hash='')
+        AnnotationRequest.objects.update(url_hash='')
+
+        self.call_command('--batch-size', '2')
+
+        for annotation in annotations:
+            annotation.refresh_from_db()
+            self.assertEqual(annotation.url_hash, hash_url_id('example.com/page'))
+        annotation_request.refresh_from_db()
+        self.assertEqual(annotation_request.url_hash, hash_url_id('example.com/other'))
+
+    def test_backfill__start_id(self):
+        first, second = mommy.make('annotation.Annotation', 2, url='http://example.com/page')
+        Annotation.objects.update(url_hash='')
+
+        self.call_command('--start-id', str(second.id))
+
+        first.refresh_from_db()
+        second.refresh_from_db()
+        self.assertEqual(first.url_hash, '')
+        self.assertEqual(second.url_hash, hash_url_id('example.com/page'))
+
+
+class ReconcileUpvoteCountsCommandTest(TestCase):
+
+    def call_command(self, *args):
+        out = StringIO()
+        call_command('reconcile_upvote_counts', *args, stdout=out)
+        return out.getvalue()
+
+    def test_reconcile(self):
+        annotation, other_annotation, not_upvoted = mommy.make('annotation.Annotation', 3)
+        mommy.make('annotation.AnnotationUpvote', 2, annotation=annotation)
+        mommy.make('annotation.AnnotationUpvote', annotation=other_annotation)
+        Annotation.objects.filter(pk=annotation.pk).update(upvote_count=5)
+        Annotation.objects.filter(pk=not_upvoted.pk).update(upvote_count=1)
+
+        out = self.call_command('--batch-size', '2')
+
+        self.assertIn('2 drifted', out)
+        self.assertEqual(
+            dict(Annotation.objects.filter(pk__in=[annotation.pk, other_annotation.pk, not_upvoted.pk]).values_list(
+                'pk', 'upvote_count'
+            )),
+            {annotation.pk: 2, other_annotation.pk: 1, not_upvoted.pk: 0}
+        )
+
+    def test_reconcile__dry_run(self):
+        annotation = mommy.make('annotation.Annotation')
+        Annotation.objects.filter(pk=annotation.pk).update(upvote_count=5)
+
+        out = self.call_command('--dry-run')
+
+        self.assertIn('1 drifted', out)
+        annotation.refresh_from_db()
+        self.assertEqual(annotation.upvote_count, 5)
+
+
+class ExportAnnotationsCommandTest(TestCase):
+
+    def call_command(self, *args):
+        out = StringIO()
+        call_command('export_annotations', *args, stdout=out)
+        return out.getvalue()
+
+    def test_export__ndjson(self):
+        annotations = mommy.make('annotation.Annotation', 2)
+
+        rows = [json.loads(line) for line in self.call_command('annotations').splitlines()]
+
+        self.assertEqual([row['id'] for row in rows],
+                         list(Annotation.objects.order_by('pk').values_list('pk', flat=True)))
+        self.assertEqual(rows[-1]['url_hash'], annotations[-1].url_hash)
+        self.assertEqual(rows[-1]['user_id'], annotations[-1].user_id)
+
+    def test_export__csv_since(self):
+        mommy.make('annotation.AnnotationRequest', create_date=timezone.now() - timedelta(days=2))
+        new_request = mommy.make('annotation.AnnotationRequest')
+
+        out = self.call_command('annotationRequests', '--format', 'csv',
+                                '--since', (timezone.now() - timedelta(days=1)).isoformat())
+
+        rows = list(csv.DictReader(StringIO(out)))
+        self.assertEqual([row['id'] for row in rows], [str(new_request.id)])
+        self.assertEqual(rows[0]['url_hash'], new_request.url_hash)
+
+    def test_export__invalid_since(self):
+        with self.assertRaises(CommandError):
+            self.call_command('annotations', '--since', 'yesterday')
+
+
+class BenchmarkURLStandardizationCommandTest(TestCase):
+
+    def test_benchmark(self):
+        out = StringIO()
+        call_command('benchmark_url_standardization', '--size', '200', '--distinct', '50', '--repeat', '1',
+                     stdout=out)
+        self.assertIn('output identical', out.getvalue())
+
+
+class RecomputeURLIdsCommandTest(TestCase):
+
+    def setUp(self):
+        cache.clear()
+
+    def call_command(self, *args):
+        out = StringIO()
+        call_command('recompute_url_ids', *args, stdout=out)
+        return out.getvalue()
+
+    def test_recompute(self):
+        annotation = mommy.make('annotation.Annotation', url='https://www.example.com/article?fbclid=1')
+        other_annotation = mommy.make('annotation.Annotation', url='https://example.com/other')
+        annotation_request = mommy.make('annotation.AnnotationRequest', url='https://m.example.com/article')
+        # Simulate rows saved with the previous rules
+        Annotation.objects.filter(pk=annotation.pk).update(url_id='www.example.com/article?fbclid=1',
+                                                           url_hash=hash_url_id('www.example.com/article?fbclid=1'))
+        AnnotationRequest.objects.filter(pk=annotation_request.pk).update(url_id='m.example.com/article')
+
+        out = self.call_command('--batch-size', '1')
+
+        self.assertIn('AnnotationRequest: 1 rows updated', out)
+        for instance in (annotation, annotation_request):
+            instance.refresh_from_db()
+            self.assertEqual(instance.url_id, 'example.com/article')
+            self.assertEqual(instance.url_hash, hash_url_id('example.com/article'))
+        other_annotation.refresh_from_db()
+        self.assertEqual(other_annotation.url_id, 'example.com/other')
+        run = URLCanonicalizationRun.objects.get(fingerprint=get_canonicalization_rules_fingerprint())
+        self.assertIsNotNone(run.finish_date)
+        self.assertEqual(run.progress, {})
+
+    def test_recompute__blank_hash_and_domain(self):
+        annotation = mommy.make('annotation.Annotation', url='https://example.com/article')
+        # url_id is up to date, but the row was saved without the other columns
+        Annotation.objects.filter(pk=annotation.pk).update(url_hash='', domain='')
+
+        self.call_command()
+
+        annotation.refresh_from_db()
+        self.assertEqual(annotation.url_hash, hash_url_id('example.com/article'))
+        self.assertEqual(annotation.domain, 'example.com')
+
+    def test_recompute__if_rules_changed(self):
+        self.call_command()
+        # Regardless of the cache
+        cache.clear()
+        self.assertIn('have not changed', self.call_command('--if-rules-changed'))
+
+        rules = dict(settings.URL_CANONICALIZATION, HOST_ALIAS_PREFIX='^$')
+        with override_settings(URL_CANONICALIZATION=rules):
+            self.assertNotIn('have not changed', self.call_command('--if-rules-changed'))
+
+    def test_recompute__resumed(self):
+        first, second = mommy.make('annotation.Annotation', 2, url='https://www.example.com/article')
+        Annotation.objects.update(url_id='www.example.com/article')
+        # As if interrupted after the first row
+        URLCanonicalizationRun.objects.create(fingerprint=get_canonicalization_rules_fingerprint(),
+                                              progress={'Annotation': first.pk})
+
+        self.call_command()
+
+        first.refresh_from_db()
+        second.refresh_from_db()
+        self.assertEqual(first.url_id, 'www.example.com/article')
+        self.assertEqual(second.url_id, 'example.com/article')
+
+
+class RebuildDomainIndexCommandTest(TestCase):
+
+    def test_rebuild(self):
+        annotation = mommy.make('annotation.Annotation', url='https://www.example.com/article')
+        Annotation.objects.filter(pk=annotation.pk).update(domain='')
+        AnnotatedURL.objects.all().delete()
+
+        call_command('rebuild_domain_index', stdout=StringIO())
+
+        annotation.refresh_from_db()
+        self.assertEqual(annotation.domain, 'example.com')
+        self.assertEqual(AnnotatedURL.objects.get(url_hash=annotation.url_hash).annotation_count, 1)
+
+
+class BenchmarkRangeSerializationCommandTest(TestCase):
+
+    def test_benchmark(self):
+        mommy.make('annotation.Annotation', range={'start': '/p[1]', 'end': '/p[2]'})
+        out = StringIO()
+        call_command('benchmark_range_serialization', '--number', '2', '--repeat', '1', stdout=out)
+        self.assertIn('output identical', out.getvalue())
+
+
+class BenchmarkJSONAPIRendererCommandTest(TestCase):
+
+    def test_benchmark(self):
+        mommy.make('annotation.Annotation', range={'start': '/p[1]', 'end': '/p[2]'})
+        out = StringIO()
+        call_command('benchmark_json_api_renderer', '--number', '2', '--repeat', '1', stdout=out)
+        self.assertIn('output identical', out.getvalue())
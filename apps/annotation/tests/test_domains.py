@@ -0,0 +1,79 @@
+from unittest import mock
+
+from django.test import TestCase
+from model_mommy import mommy
+
+from apps.annotation import domains
+from apps.annotation.models import AnnotatedURL, Annotation
+from apps.annotation.utils import hash_url_id, standardize_url_id
+
+
+def url_hash(url):
+    return hash_url_id(standardize_url_id(url))
+
+
+class AnnotatedURLTest(TestCase):
+    page_url = 'https://www.example.com/article'
+
+    def get_annotated_url(self, url):
+        return AnnotatedURL.objects.filter(url_hash=url_hash(url)).first()
+
+    def test_counted(self):
+        annotation = mommy.make('annotation.Annotation', url=self.page_url)
+        mommy.make('annotation.Annotation', url=self.page_url)
+        mommy.make('annotation.AnnotationRequest', url=self.page_url)
+
+        self.assertEqual(annotation.domain, 'example.com')
+        annotated_url = self.get_annotated_url(self.page_url)
+        self.assertEqual(annotated_url.domain, 'example.com')
+        self.assertEqual(annotated_url.url_id, 'example.com/article')
+        self.assertEqual(annotated_url.annotation_count, 2)
+        self.assertEqual(annotated_url.annotation_request_count, 1)
+        self.assertEqual(annotated_url.last_annotation_date,
+                         Annotation.objects.filter(url_hash=url_hash(self.page_url)).latest('create_date').create_date)
+
+    def test_deactivated(self):
+        annotation = mommy.make('annotation.Annotation', url=self.page_url)
+        annotation_request = mommy.make('annotation.AnnotationRequest', url=self.page_url)
+
+        annotation.active = False
+        annotation.save()
+        self.assertEqual(self.get_annotated_url(self.page_url).annotation_count, 0)
+
+        annotation_request.delete()
+        self.assertIsNone(self.get_annotated_url(self.page_url))
+
+    def test_moved(self):
+        annotation = mommy.make('annotation.Annotation', url=self.page_url)
+        annotation.url = 'https://other.org/article'
+        annotation.save()
+
+        self.assertIsNone(self.get_annotated_url(self.page_url))
+        self.assertEqual(self.get_annotated_url('https://other.org/article').annotation_count, 1)
+
+    def test_not_recounted_when_edited(self):
+        annotation = mommy.make('annotation.Annotation', url=self.page_url)
+        annotation = Annotation.objects.get(id=annotation.id)
+        with mock.patch.object(domains, 'refresh_annotated_urls') as refresh_annotated_urls:
+            annotation.comment = 'changed'
+            annotation.save()
+        refresh_annotated_urls.assert_not_called()
+
+        annotation.active = False
+        annotation.save()
+        self.assertIsNone(self.get_annotated_url(self.page_url))
+
+    def test_upserted(self):
+        mommy.make('annotation.Annotation', url=self.page_url)
+        # As a transaction recounting the URL at the same time would write it (SQLite supports the same statement)
+        domains.upsert_annotated_urls([{
+            'url_hash': url_hash(self.page_url), 'url_id': 'example.com/article', 'domain': 'example.com',
+            'annotation_count': 2, 'annotation_request_count': 0, 'last_annotation_date': None,
+        }, {
+            'url_hash': url_hash('https://other.org/article'), 'url_id': 'other.org/article', 'domain': 'other.org',
+            'annotation_count': 1, 'annotation_request_count': 0, 'last_annotation_date': None,
+        }])
+
+        self.assertEqual(self.get_annotated_url(self.page_url).annotation_count, 2)
+        self.assertEqual(self.get_annotated_url('https://other.org/article').annotation_count, 1)
+        self.assertEqual(AnnotatedURL.objects.filter(url_hash=url_hash(self.page_url)).count(), 1)
@@ -0,0 +1,90 @@
+from unittest import mock
+
+from django.core.cache import cache
+from django.test import SimpleTestCase, TransactionTestCase
+from model_mommy import mommy
+
+from apps.annotation import membership
+from apps.annotation.membership import BloomFilter
+from apps.annotation.tasks import rebuild_membership_filter
+from apps.annotation.utils import hash_url_id, standardize_url_id
+
+
+def url_hash(url):
+    return hash_url_id(standardize_url_id(url))
+
+
+class BloomFilterTest(SimpleTestCase):
+
+    def test_no_false_negatives(self):
+        bloom_filter = BloomFilter(size=2 ** 16, hash_count=7)
+        url_hashes = [url_hash('http://example.com/%s' % i) for i in range(1000)]
+        for item in url_hashes:
+            bloom_filter.add(item)
+        self.assertTrue(all(item in bloom_filter for item in url_hashes))
+
+    def test_false_positives_rare(self):
+        bloom_filter = BloomFilter(size=2 ** 16, hash_count=7)
+        for i in range(1000):
+            bloom_filter.add(url_hash('http://example.com/%s' % i))
+        false_positives = sum(url_hash('http://other.com/%s' % i) in bloom_filter for i in range(1000))
+        self.assertLess(false_positives, 10)
+
+    def test_bits_layout(self):
+        bloom_filter = BloomFilter(size=64, hash_count=3)
+        item = url_hash('http://example.com/')
+        bloom_filter.add(item)
+        h1, h2 = int(item[0:8], 16), int(item[8:16], 16) | 1
+        expected_positions = {(h1 + i * h2) % 64 for i in range(3)}
+        positions = {p for p in range(64) if (bloom_filter.bits[p // 8] >> (p % 8)) & 1}
+        self.assertEqual(positions, expected_positions)
+
+
+class MembershipFilterTest(TransactionTestCase):
+    # Annotations are added to the filter once committed
+
+    def setUp(self):
+        cache.clear()
+
+    def test_built_from_active_annotations(self):
+        mommy.make('annotation.Annotation', url='http://example.com/active')
+        mommy.make('annotation.Annotation', url='http://example.com/inactive', active=False)
+
+        # Built by the task (run at once in tests) rather than while reading
+        self.assertIsNone(membership.get_membership_filter())
+        membership_filter = membership.get_membership_filter()
+
+        self.assertIn(url_hash('http://example.com/active'), membership_filter)
+        self.assertNotIn(url_hash('http://example.com/inactive'), membership_filter)
+
+    def test_annotation_created__added(self):
+        membership.rebuild_membership_filter()
+        mommy.make('annotation.Annotation', url='http://example.com/new')
+        self.assertIn(url_hash('http://example.com/new'), membership.get_membership_filter())
+
+    def test_annotation_deactivated__removed_by_rebuild(self):
+        annotation = mommy.make('annotation.Annotation', url='http://example.com/page')
+        membership.rebuild_membership_filter()
+
+        annotation.active = False
+        annotation.save()
+        self.assertIn(url_hash('http://example.com/page'), membership.get_membership_filter())
+        rebuild_membership_filter.delay()
+        self.assertNotIn(url_hash('http://example.com/page'), membership.get_membership_filter())
+
+    def test_annotation_url_changed__added(self):
+        annotation = mommy.make('annotation.Annotation', url='http://example.com/page')
+        membership.rebuild_membership_filter()
+
+        annotation.url = 'http://example.com/other-page'
+        annotation.save()
+        self.assertIn(url_hash('http://example.com/other-page'), membership.get_membership_filter())
+        rebuild_membership_filter.delay()
+        self.assertNotIn(url_hash('http://example.com/page'), membership.get_membership_filter())
+
+    def test_annotation_deleted__not_rebuilt(self):
+        annotation = mommy.make('annotation.Annotation', url='http://example.com/page')
+        membership.rebuild_membership_filter()
+        with mock.patch.object(membership, 'build_membership_filter') as build_membership_filter:
+            annotation.delete()
+        build_membership_filter.assert_not_called()
@@ -32,9 +32,28 @@ class AnnotationUpvoteModelTest(TestCase):
 
     def test_updating_annotation_upvote_count(self):
         AnnotationUpvote.objects.create(user=self.user2, annotation=self.annotation)
-        self.annotation.count_upvote()
+        self.annotation.refresh_from_db()
         self.assertEqual(1, self.annotation.upvote_count)
 
+    def test_upvote_count_maintained(self):
+        upvote = AnnotationUpvote.objects.create(user=self.user, annotation=self.annotation)
+        AnnotationUpvote.objects.create(user=self.user2, annotation=self.annotation)
+        self.annotation.refresh_from_db()
+        self.assertEqual(2, self.annotation.upvote_count)
+
+        upvote.delete()
+        self.annotation.refresh_from_db()
+        self.assertEqual(1, self.annotation.upvote_count)
+
+    def test_upvote_count_not_overwritten_by_save(self):
+        annotation = Annotation.objects.get(pk=self.annotation.pk)
+        AnnotationUpvote.objects.create(user=self.user, annotation=self.annotation)
+        annotation.comment = 'changed'
+        annotation.save()
+        annotation.refresh_from_db()
+        self.assertEqual('changed', annotation.comment)
+        self.assertEqual(1, annotation.upvote_count)
+
 
 class AnnotationRequestFeedbackModelTest(TestCase):
     def setUp(self):
@@ -0,0 +1,121 @@
+from unittest import mock
+
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from model_mommy import mommy
+
+from apps.annotation import upvotes
+from apps.annotation.models import Annotation, AnnotationUpvote
+from apps.annotation.tasks import flush_upvote_buffer
+from apps.annotation.tests.utils import create_test_user, mock_upvote_id_sequence
+
+
+@override_settings(ANNOTATION_UPVOTE_WRITE_BEHIND=True)
+class UpvoteBufferTest(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        mock_upvote_id_sequence(self)
+        self.user, password = create_test_user()
+        self.annotation = mommy.make('annotation.Annotation')
+
+    def get_upvote_count(self):
+        return Annotation.objects.get(id=self.annotation.id).upvote_count
+
+    def test_upvote_written_by_flush(self):
+        upvote = upvotes.buffer_upvote(self.user, self.annotation)
+        self.assertFalse(AnnotationUpvote.objects.filter(annotation=self.annotation).exists())
+        self.assertEqual(upvotes.get_pending_upvotes(self.user), {self.annotation.id: upvote.id})
+        self.assertEqual(upvotes.get_upvote(self.user, annotation_id=self.annotation.id).id, upvote.id)
+
+        flush_upvote_buffer.delay()
+
+        stored = AnnotationUpvote.objects.get(annotation=self.annotation)
+        self.assertEqual((stored.id, stored.user_id), (upvote.id, self.user.id))
+        self.assertEqual(self.get_upvote_count(), 1)
+        self.assertEqual(upvotes.get_pending_upvotes(self.user), {})
+        self.assertEqual(cache.get(upvotes.PENDING_USERS_KEY), set())
+
+    def test_upvote_idempotent(self):
+        upvote = upvotes.buffer_upvote(self.user, self.annotation)
+        self.assertEqual(upvotes.buffer_upvote(self.user, self.annotation).id, upvote.id)
+        upvotes.flush_upvotes()
+        self.assertEqual(upvotes.buffer_upvote(self.user, self.annotation).id, upvote.id)
+        self.assertEqual(upvotes.get_pending_upvotes(self.user), {})
+        self.assertEqual(upvotes.flush_upvotes(), 0)
+        self.assertEqual(self.get_upvote_count(), 1)
+
+    def test_removed_before_flush(self):
+        upvote = upvotes.buffer_upvote(self.user, self.annotation)
+        upvotes.buffer_upvote_removal(upvote)
+        self.assertIsNone(upvotes.get_upvote(self.user, upvote_id=upvote.id))
+
+        upvotes.flush_upvotes()
+        self.assertFalse(AnnotationUpvote.objects.filter(annotation=self.annotation).exists())
+        self.assertEqual(self.get_upvote_count(), 0)
+
+    def test_stored_upvote_removed(self):
+        upvote = AnnotationUpvote.objects.create(user=self.user, annotation=self.annotation)
+        upvotes.buffer_upvote_removal(upvote)
+        self.assertIsNone(upvotes.get_upvote(self.user, upvote_id=upvote.id))
+        self.assertEqual(self.get_upvote_count(), 1)
+
+        upvotes.flush_upvotes()
+        self.assertFalse(AnnotationUpvote.objects.filter(id=upvote.id).exists())
+        self.assertEqual(self.get_upvote_count(), 0)
+
+    def test_stored_upvote_removed_and_upvoted_again(self):
+        upvote = AnnotationUpvote.objects.create(user=self.user, annotation=self.annotation)
+        upvotes.buffer_upvote_removal(upvote)
+        self.assertEqual(upvotes.buffer_upvote(self.user, self.annotation).id, upvote.id)
+
+        upvotes.flush_upvotes()
+        self.assertTrue(AnnotationUpvote.objects.filter(id=upvote.id).exists())
+        self.assertEqual(self.get_upvote_count(), 1)
+
+    def test_intents_recorded_during_flush_kept(self):
+        upvote = upvotes.buffer_upvote(self.user, self.annotation)
+        write_upvotes = upvotes._write_upvotes
+
+        def write_and_remove(intents):
+            write_upvotes(intents)
+            upvotes.buffer_upvote_removal(upvote)
+
+        with mock.patch.object(upvotes, '_write_upvotes', write_and_remove):
+            upvotes.flush_upvotes()
+        self.assertEqual(upvotes.get_pending_upvotes(self.user), {self.annotation.id: None})
+        self.assertEqual(cache.get(upvotes.PENDING_USERS_KEY), {self.user.id})
+
+        upvotes.flush_upvotes()
+        self.assertFalse(AnnotationUpvote.objects.filter(annotation=self.annotation).exists())
+        self.assertEqual(self.get_upvote_count(), 0)
+
+    def test_upvotes_of_deleted_annotation_dropped(self):
+        upvotes.buffer_upvote(self.user, self.annotation)
+        Annotation.objects.filter(id=self.annotation.id).delete()
+        upvotes.flush_upvotes()
+        self.assertFalse(AnnotationUpvote.objects.filter(annotation_id=self.annotation.id).exists())
+        self.assertEqual(upvotes.get_pending_upvotes(self.user), {})
+
+    def test_flush_batched(self):
+        def count_flush_queries(user_count):
+            for i in range(user_count):
+                user, password = create_test_user(unique=True)
+                upvotes.buffer_upvote(user, self.annotation)
+            with CaptureQueriesContext(connection) as queries:
+                upvotes.flush_upvotes()
+            return len(queries)
+
+        self.assertEqual(count_flush_queries(2), count_flush_queries(20))
+        self.assertEqual(self.get_upvote_count(), 22)
+
+    @override_settings(ANNOTATION_UPVOTE_WRITE_BEHIND=False)
+    def test_disabled(self):
+        with override_settings(ANNOTATION_UPVOTE_WRITE_BEHIND=True):
+            upvotes.buffer_upvote(self.user, self.annotation)
+        self.assertEqual(upvotes.get_pending_upvotes(self.user), {})
+        # Intents buffered before are still written
+        upvotes.flush_upvotes()
+        self.assertEqual(self.get_upvote_count(), 1)
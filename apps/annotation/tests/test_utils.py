@@ -1,9 +1,13 @@
 from collections import namedtuple
 
-from django.test import SimpleTestCase
+from django.conf import settings
+from django.test import SimpleTestCase, override_settings
 from parameterized import parameterized
 
-from apps.annotation.utils import standardize_url, standardize_url_id
+from apps.annotation.management.commands.benchmark_url_standardization import generate_corpus, \
+    reference_standardize_url, reference_standardize_url_id
+from apps.annotation.utils import canonicalize_url, get_url_id_domain, hash_url_id, standardize_url, \
+    standardize_url_id
 
 
 class StandardizeURLTest(SimpleTestCase):
@@ -30,6 +34,9 @@ class StandardizeURLTest(SimpleTestCase):
         # Strip irrelevant querystring
         ("https://docs.python.org/2/library/urlparse.html?utm_campaign=buy-it&a=1",
          "https://docs.python.org/2/library/urlparse.html?a=1"),
+        # Host is kept as it is
+        ("https://www.docs.python.org/?fbclid=IwAR0",
+         "https://www.docs.python.org/"),
     ])
     def test_standardize_url(self, input_url, expected_url):
         self.assertEqual(standardize_url(input_url), expected_url)
@@ -56,6 +63,84 @@ class StandardizeURLTest(SimpleTestCase):
         # Strip irrelevant querystring
         ("https://docs.python.org/2/library/urlparse.html?utm_campaign=buy-it&a=1",
          "docs.python.org/2/library/urlparse.html?a=1"),
+        # Strip click identifiers
+        ("https://docs.python.org/2/library/urlparse.html?fbclid=IwAR0&a=1&gclid=EAIa&igshid=1x",
+         "docs.python.org/2/library/urlparse.html?a=1"),
+        # Ignore www and mobile host prefixes
+        ("https://www.docs.python.org/",
+         "docs.python.org/"),
+        ("https://m.docs.python.org/",
+         "docs.python.org/"),
+        # ...but keep the domain itself
+        ("https://m.org/",
+         "m.org/"),
+        # Strip AMP version
+        ("https://docs.python.org/2/library/amp",
+         "docs.python.org/2/library"),
+        ("https://docs.python.org/2/library.amp?amp=1",
+         "docs.python.org/2/library"),
     ])
     def test_standardize_url_id(self, input_url, expected_url):
         self.assertEqual(standardize_url_id(input_url), expected_url)
+
+
+class CanonicalizeURLTest(SimpleTestCase):
+
+    def test_canonicalize_url__both_forms(self):
+        self.assertEqual(canonicalize_url('https://docs.python.org?utm_source=fb&a=1#anchor'),
+                         ('https://docs.python.org/?a=1', 'docs.python.org/?a=1'))
+
+    def test_canonicalize_url__same_as_reference(self):
+        for url in set(generate_corpus(size=2000, distinct=500)):
+            self.assertEqual(canonicalize_url(url), (reference_standardize_url(url), reference_standardize_url_id(url)))
+
+    def test_canonicalize_url__configurable(self):
+        rules = dict(settings.URL_CANONICALIZATION, OMITTED_QUERY_VARS=['a'], HOST_ALIAS_PREFIX='^$', PATH_RULES=[])
+        with override_settings(URL_CANONICALIZATION=rules):
+            self.assertEqual(standardize_url_id('https://www.docs.python.org/amp?a=1&utm_source=fb'),
+                             'www.docs.python.org/amp?utm_source=fb')
+        self.assertEqual(standardize_url_id('https://www.docs.python.org/amp?a=1&utm_source=fb'),
+                         'docs.python.org/?a=1')
+
+    def test_canonicalize_url__no_omitted_query_vars(self):
+        rules = dict(settings.URL_CANONICALIZATION, OMITTED_QUERY_VARS=[])
+        with override_settings(URL_CANONICALIZATION=rules):
+            self.assertEqual(standardize_url_id('https://docs.python.org/?a=1&utm_source=fb'),
+                             'docs.python.org/?a=1&utm_source=fb')
+
+    def test_canonicalize_url__cached(self):
+        canonicalize_url.cache_clear()
+        standardize_url('https://docs.python.org/')
+        standardize_url_id('https://docs.python.org/')
+        self.assertEqual(canonicalize_url.cache_info().hits, 1)
+
+
+class HashURLIdTest(SimpleTestCase):
+
+    def test_hash_url_id__empty(self):
+        self.assertEqual(hash_url_id(''), '')
+
+    def test_hash_url_id__fixed_width(self):
+        short_hash = hash_url_id('docs.python.org/')
+        long_hash = hash_url_id('docs.python.org/' + 'a' * 2000)
+        self.assertEqual(len(short_hash), 40)
+        self.assertEqual(len(long_hash), 40)
+        self.assertNotEqual(short_hash, long_hash)
+
+    def test_hash_url_id__same_for_same_standardized_url(self):
+        self.assertEqual(
+            hash_url_id(standardize_url_id('https://docs.python.org/?utm_source=fb#anchor')),
+            hash_url_id(standardize_url_id('http://docs.python.org'))
+        )
+
+
+class GetURLIdDomainTest(SimpleTestCase):
+
+    @parameterized.expand([
+        ("docs.python.org/2/library/urlparse.html", "docs.python.org"),
+        ("Docs.Python.org:8080/", "docs.python.org"),
+        ("user:password@docs.python.org/", "docs.python.org"),
+        ("", ""),
+    ])
+    def test_get_url_id_domain(self, url_id, domain):
+        self.assertEqual(get_url_id_domain(url_id), domain)
@@ -1,4 +1,6 @@
+import itertools
 import string
+from unittest import mock
 
 import random
 from deepmerge import Merger
@@ -6,6 +8,8 @@ from django.contrib.auth import get_user_model
 from django.contrib.auth.models import AbstractUser
 from django.urls import reverse
 
+from apps.annotation import upvotes
+
 
 def create_test_user(unique=False, use_id=None):
     password = 'password'
@@ -25,6 +29,16 @@ def get_or_create_user(pk):
     return user
 
 
+def mock_upvote_id_sequence(test_case):
+    """
+    Replace the PostgreSQL sequence ids of upvotes written behind are reserved from (tests run on SQLite)
+    for the duration of the test; ids are handed out far above those of upvotes created by the test otherwise.
+    """
+    patcher = mock.patch.object(upvotes, '_reserve_upvote_id', side_effect=itertools.count(10 ** 6).__next__)
+    patcher.start()
+    test_case.addCleanup(patcher.stop)
+
+
 def testserver_reverse(*args, **kwargs):
     """
     Prepend to reverse() prefix "http://testserver" which is default domain (+protocol) used by Django test Client.
@@ -0,0 +1,192 @@
+"""
+Write-behind ingestion of upvotes (enabled by ANNOTATION_UPVOTE_WRITE_BEHIND).
+
+Bursts of upvotes of a viral annotation are many tiny transactions, all contending on the (user, annotation)
+unique index and on the upvote_count of the same annotation row. In the write-behind mode upvoting
+(and removing an upvote) only records the intent of the user in the shared cache and is acknowledged right away;
+the flush_upvote_buffer task writes all the intents to the database periodically in a few batched statements.
+
+Intents are kept per user as {annotation_id: upvote id, or None if the upvote is removed}:
+  - the latest intent wins, so repeating a request changes nothing (the same upvote id is returned),
+  - ids of new upvotes are reserved from the database sequence when the intent is recorded,
+    so the upvote can be referred to (e.g. removed) before it is written (hence the mode requires PostgreSQL),
+  - every read of the user's upvotes applies the user's intents over the database (see get_pending_upvotes),
+    so the user sees their own writes at once, everybody else once they are flushed.
+Users having any intents are listed in an index read by the flush. Both are updated under cache.add locks.
+"""
+import logging
+import time
+from collections import Counter
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache as django_cache
+from django.db import connection, transaction
+from django.db.models import Case, F, IntegerField, Value, When
+
+from apps.annotation import cache, snapshots
+from apps.annotation.models import Annotation, AnnotationUpvote
+
+logger = logging.getLogger('pp.annotation')
+
+PENDING_UPVOTES_KEY = 'upvotes:pending:{user_id}'
+PENDING_USERS_KEY = 'upvotes:pending-users'
+
+
+def get_pending_upvotes(user):
+    """
+    Return dict of annotation_id -> upvote id (None if removed) of the intents of the user not written yet
+    """
+    if not settings.ANNOTATION_UPVOTE_WRITE_BEHIND or not getattr(user, 'is_authenticated', False):
+        return {}
+    return django_cache.get(PENDING_UPVOTES_KEY.format(user_id=user.id)) or {}
+
+
+def get_upvote(user, upvote_id=None, annotation_id=None):
+    """
+    Return the upvote (with the id or of the annotation) as seen by the user, i.e. with the user's intents applied;
+    None if there is none. Upvotes not written yet are returned unsaved.
+    """
+    pending = get_pending_upvotes(user)
+    for pending_annotation_id, pending_upvote_id in pending.items():
+        if pending_upvote_id is not None and (pending_upvote_id == upvote_id or pending_annotation_id == annotation_id):
+            return AnnotationUpvote(id=pending_upvote_id, user=user, annotation_id=pending_annotation_id)
+
+    lookup = {'id': upvote_id} if upvote_id is not None else {'user': user, 'annotation_id': annotation_id}
+    upvote = AnnotationUpvote.objects.filter(**lookup).first()
+    if upvote is not None and upvote.user_id == user.id and upvote.annotation_id in pending:
+        # Removed, but not written yet
+        return None
+    return upvote
+
+
+def buffer_upvote(user, annotation):
+    """
+    Record the intent of the user to upvote the annotation; return the (possibly unsaved) upvote
+    """
+    def upvote(pending):
+        upvote_id = pending.get(annotation.id)
+        if upvote_id is None:
+            stored_id = AnnotationUpvote.objects.filter(
+                user=user, annotation=annotation
+            ).values_list('id', flat=True).first()
+            if stored_id is not None and annotation.id not in pending:
+                # Upvoted already, nothing to write
+                return stored_id
+            upvote_id = pending[annotation.id] = stored_id if stored_id is not None else _reserve_upvote_id()
+        return upvote_id
+
+    return AnnotationUpvote(id=_update_pending(user.id, upvote), user=user, annotation=annotation)
+
+
+def buffer_upvote_removal(upvote):
+    def remove(pending):
+        pending[upvote.annotation_id] = None
+
+    _update_pending(upvote.user_id, remove)
+
+
+def flush_upvotes():
+    """
+    Write the intents of all users to the database; return the number of intents written
+    """
+    with _lock(PENDING_USERS_KEY + ':lock'):
+        user_ids = django_cache.get(PENDING_USERS_KEY) or set()
+    if not user_ids:
+        return 0
+    keys = {PENDING_UPVOTES_KEY.format(user_id=user_id): user_id for user_id in user_ids}
+    pending = {keys[key]: intents for key, intents in django_cache.get_many(keys).items()}
+    _write_upvotes({(user_id, annotation_id): upvote_id
+                    for user_id, intents in pending.items() for annotation_id, upvote_id in intents.items()})
+
+    # Only the intents written are dropped, those changed in the meantime are written by the next flush
+    for user_id, written in pending.items():
+        def drop_written(intents):
+            for annotation_id, upvote_id in written.items():
+                if annotation_id in intents and intents[annotation_id] == upvote_id:
+                    del intents[annotation_id]
+
+        _update_pending(user_id, drop_written)
+    with _lock(PENDING_USERS_KEY + ':lock'):
+        # Intents recorded after the check above add the user to the index again (waiting for the lock)
+        remaining = django_cache.get_many(keys)
+        django_cache.set(PENDING_USERS_KEY, (django_cache.get(PENDING_USERS_KEY) or set()) - {
+            user_id for key, user_id in keys.items() if not remaining.get(key)
+        }, None)
+    return sum(len(intents) for intents in pending.values())
+
+
+def _write_upvotes(intents):
+    if not intents:
+        return
+    user_ids = {user_id for user_id, annotation_id in intents}
+    annotation_ids = {annotation_id for user_id, annotation_id in intents}
+    with transaction.atomic():
+        stored = {(user_id, annotation_id): id for id, user_id, annotation_id in AnnotationUpvote.objects.filter(
+            user_id__in=user_ids, annotation_id__in=annotation_ids
+        ).values_list('id', 'user_id', 'annotation_id')}
+        # Upvotes of annotations or by users deleted in the meantime are dropped
+        annotation_ids = set(Annotation.objects.filter(id__in=annotation_ids).values_list('id', flat=True))
+        user_ids = set(get_user_model().objects.filter(id__in=user_ids).values_list('id', flat=True))
+
+        created = [AnnotationUpvote(id=upvote_id, user_id=user_id, annotation_id=annotation_id)
+                   for (user_id, annotation_id), upvote_id in intents.items()
+                   if upvote_id is not None and (user_id, annotation_id) not in stored
+                   and user_id in user_ids and annotation_id in annotation_ids]
+        deleted = {pair: stored[pair] for pair, upvote_id in intents.items() if upvote_id is None and pair in stored}
+        AnnotationUpvote.objects.bulk_create(created)
+        # Deleting sends the per-row signals (updating the count and the cache), while bulk_create sends none,
+        # so their work is done below for all the created upvotes at once
+        AnnotationUpvote.objects.filter(id__in=deleted.values()).delete()
+
+        counts = Counter(upvote.annotation_id for upvote in created)
+        if counts:
+            Annotation.objects.filter(pk__in=counts).update(upvote_count=F('upvote_count') + Case(
+                *[When(pk=pk, then=Value(count)) for pk, count in counts.items()],
+                default=Value(0), output_field=IntegerField()
+            ))
+        for url_hash in set(Annotation.objects.filter(pk__in=counts).values_list('url_hash', flat=True)):
+            cache.invalidate_url(url_hash)
+            snapshots.refresh_snapshot(url_hash)
+    logger.info('Upvotes written: {} created, {} deleted'.format(len(created), len(deleted)))
+
+
+def _reserve_upvote_id():
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT nextval(pg_get_serial_sequence(%s, 'id'))", [AnnotationUpvote._meta.db_table])
+        return cursor.fetchone()[0]
+
+
+def _update_pending(user_id, update):
+    """
+    Modify intents of the user with update(intents) (in place) under the user's lock; return what update returns
+    """
+    key = PENDING_UPVOTES_KEY.format(user_id=user_id)
+    with _lock(key + ':lock'):
+        intents = django_cache.get(key) or {}
+        had_intents = bool(intents)
+        result = update(intents)
+        if intents:
+            django_cache.set(key, intents, None)
+        else:
+            django_cache.delete(key)
+    if intents and not had_intents:
+        with _lock(PENDING_USERS_KEY + ':lock'):
+            django_cache.set(PENDING_USERS_KEY, (django_cache.get(PENDING_USERS_KEY) or set()) | {user_id}, None)
+    return result
+
+
+@contextmanager
+def _lock(key):
+    # cache.add is atomic, the same as for the membership filter (see apps.annotation.membership)
+    lock_timeout = settings.ANNOTATION_UPVOTE_BUFFER_LOCK_TIMEOUT
+    deadline = time.monotonic() + lock_timeout
+    while not django_cache.add(key, True, lock_timeout):
+        if time.monotonic() > deadline:
+            raise TimeoutError('Could not acquire upvote buffer lock {}'.format(key))
+        time.sleep(0.01)
+    try:
+        yield
+    finally:
+        django_cache.delete(key)
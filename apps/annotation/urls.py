@@ -1,11 +1,14 @@
-from django.urls import path
+from django.urls import path, re_path
 
+from apps.annotation.views.annotated_urls import AnnotatedURLViewSet
 from apps.annotation.views.annotation_requests import AnnotationRequestViewSet
 from apps.annotation.views.annotation_upvotes import AnnotationUpvoteViewSet
 from apps.annotation.views.annotations import AnnotationViewSet
 from apps.api.routers import RouterWithoutPut
 from apps.auth import views as auth_views
+from . import exports
 from .views import annotation_reports, annotation_upvotes
+from .views.exports import ExportView
 
 app_name = 'annotation'
 
@@ -13,6 +16,7 @@ router = RouterWithoutPut(trailing_slash=False)
 router.register('annotations', AnnotationViewSet)
 router.register('annotationRequests', AnnotationRequestViewSet)
 router.register('annotationUpvotes', AnnotationUpvoteViewSet)
+router.register('annotatedUrls', AnnotatedURLViewSet)
 
 urlpatterns = router.urls + [
     path('annotationReports', annotation_reports.AnnotationReportCreateView.as_view()),
@@ -21,5 +25,9 @@ urlpatterns = router.urls + [
          name='annotation_related_user'),
     path('annotations/<int:annotation_id>/upvote', annotation_upvotes.AnnotationRelatedAnnotationUpvote.as_view(),
          name='annotation_related_upvote'),
+
+    re_path(r'^exports/(?P<resource>{})\.(?P<export_format>{})$'.format(
+        '|'.join(exports.EXPORT_MODELS), '|'.join(exports.EXPORT_FORMATS)
+    ), ExportView.as_view(), name='export'),
 ]
 
@@ -1,15 +1,81 @@
+import fnmatch
+import hashlib
+import json
+import re
+from collections import namedtuple
+from functools import lru_cache
 from urllib.parse import urlencode, parse_qsl, urlsplit
 
-OMITTED_QUERY_VARS = (
-    # Universal Tracking Module convention names
-    'utm_campaign',
-    'utm_medium',
-    'utm_term',
-    'utm_name',
-    'utm_source',
-    # General convention for references
-    'ref',
-)
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+
+CanonicalizationRules = namedtuple('CanonicalizationRules', ['omitted_query_var', 'host_alias_prefix', 'path_rules'])
+
+
+@lru_cache(maxsize=None)
+def get_canonicalization_rules():
+    """
+    settings.URL_CANONICALIZATION compiled to regular expressions (once)
+    """
+    config = settings.URL_CANONICALIZATION
+    # With no patterns the alternative would be the empty regex matching every name, so match none instead
+    omitted_query_var = '|'.join(fnmatch.translate(pattern) for pattern in config['OMITTED_QUERY_VARS']) or '(?!)'
+    return CanonicalizationRules(
+        omitted_query_var=re.compile(omitted_query_var),
+        host_alias_prefix=re.compile(config['HOST_ALIAS_PREFIX']),
+        path_rules=[(re.compile(pattern), replacement) for pattern, replacement in config['PATH_RULES']],
+    )
+
+
+def get_canonicalization_rules_fingerprint():
+    """
+    Identifier of the current rules; url_id of stored rows needs recomputing when it changes
+    """
+    return hashlib.md5(json.dumps(settings.URL_CANONICALIZATION, sort_keys=True).encode('utf8')).hexdigest()
+
+
+@receiver(setting_changed)
+def clear_canonicalization_cache(setting, **kwargs):
+    if setting == 'URL_CANONICALIZATION':
+        get_canonicalization_rules.cache_clear()
+        canonicalize_url.cache_clear()
+
+
+# Number of most recently standardized URLs remembered; the same (popular) URLs are standardized over and over
+# again: on every save, URL filter and serialized annotation
+URL_CACHE_SIZE = 4096
+
+StandardizedURL = namedtuple('StandardizedURL', ['url', 'url_id'])
+
+
+@lru_cache(maxsize=URL_CACHE_SIZE)
+def canonicalize_url(data):
+    """
+    Parse url once and return both its standardized forms (see standardize_url and standardize_url_id)
+    """
+    if not data:
+        return StandardizedURL('', '')
+    rules = get_canonicalization_rules()
+    url_parsed = urlsplit(data)
+    query = ''
+    if url_parsed.query:
+        query_tuples = [(var_name, val) for var_name, val in parse_qsl(url_parsed.query)
+                        if not rules.omitted_query_var.match(var_name)]
+        if query_tuples:
+            query = '?' + urlencode(query_tuples)
+    path = url_parsed.path
+    for pattern, replacement in rules.path_rules:
+        path = pattern.sub(replacement, path)
+    path_and_query = '{path}{query}'.format(path=path if path else '/', query=query)
+    return StandardizedURL(
+        url='{scheme}{netloc}{path_and_query}'.format(
+            scheme=url_parsed.scheme + '://' if url_parsed.scheme else '',
+            netloc=url_parsed.netloc,
+            path_and_query=path_and_query
+        ),
+        url_id=rules.host_alias_prefix.sub('', url_parsed.netloc, count=1) + path_and_query
+    )
 
 
 def standardize_url_id(data):
@@ -18,22 +84,20 @@ def standardize_url_id(data):
       - ignores protocol
       - ignores fragment(anchor)
       - ignores some blacklisted query vars like utm etc
+      - ignores host prefixes like www. or m.
+      - normalizes path (e.g. of AMP versions)
       - set '/' as a path if none given
       - removes '?' if no query string
     """
-    if not data:
-        return ''
-    url_parsed = urlsplit(data)
-    query_tuples = parse_qsl(url_parsed.query)
-    new_query_tuples = []
-    for var_name, val in query_tuples:
-        if var_name not in OMITTED_QUERY_VARS:
-            new_query_tuples.append((var_name, val))
-    return '{netloc}{path}{query}'.format(
-        netloc=url_parsed.netloc,
-        path=url_parsed.path if url_parsed.path else '/',
-        query='?' + urlencode(new_query_tuples) if new_query_tuples else ''
-    )
+    return canonicalize_url(data).url_id
+
+
+def get_url_id_domain(url_id):
+    """
+    Host of a standardized url_id (e.g. example.com/article), lowercase and without port or credentials
+    """
+    netloc = url_id.split('/', 1)[0]
+    return netloc.rsplit('@', 1)[-1].split(':', 1)[0].lower()
 
 
 def standardize_url(data):
@@ -41,20 +105,17 @@ def standardize_url(data):
         Format url in the way that:
           - ignores fragment(anchor)
           - ignores some blacklisted query vars like utm etc
+          - normalizes path (e.g. of AMP versions)
           - set '/' as a path if none given
           - removes '?' if no query string
     """
-    if not data:
+    return canonicalize_url(data).url
+
+
+def hash_url_id(url_id):
+    """
+    Fixed-width (40 chars) digest of an already standardized url_id, suitable for an indexed exact lookup.
+    """
+    if not url_id:
         return ''
-    url_parsed = urlsplit(data)
-    query_tuples = parse_qsl(url_parsed.query)
-    new_query_tuples = []
-    for var_name, val in query_tuples:
-        if var_name not in OMITTED_QUERY_VARS:
-            new_query_tuples.append((var_name, val))
-    return '{scheme}{netloc}{path}{query}'.format(
-        scheme=url_parsed.scheme + '://' if url_parsed.scheme else '',
-        netloc=url_parsed.netloc,
-        path=url_parsed.path if url_parsed.path else '/',
-        query='?' + urlencode(new_query_tuples) if new_query_tuples else ''
-    )
+    return hashlib.sha1(url_id.encode('utf-8')).hexdigest()
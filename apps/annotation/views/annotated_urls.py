@@ -0,0 +1,37 @@
+import django_filters
+from django.utils.decorators import method_decorator
+from django_filters.rest_framework import DjangoFilterBackend
+from drf_yasg.utils import swagger_auto_schema
+from rest_framework import mixins, viewsets
+from rest_framework.filters import OrderingFilter
+
+from ..models import AnnotatedURL
+from ..serializers import AnnotatedURLSerializer
+from ..utils import get_url_id_domain, standardize_url_id
+
+
+class AnnotatedURLFilterSet(django_filters.FilterSet):
+    domain = django_filters.CharFilter(method='filter_domain')
+
+    class Meta:
+        model = AnnotatedURL
+        fields = []
+
+    def filter_domain(self, queryset, name, value):
+        # Domain is standardized the same way as hosts of URLs are (e.g. www.example.com is example.com)
+        return queryset.filter(domain=get_url_id_domain(standardize_url_id('//' + value)))
+
+
+@method_decorator(name='list', decorator=swagger_auto_schema(
+    operation_description='Annotated URLs (most annotated first) with numbers of their annotations and requests; '
+                          'filter by domain to get everything annotated under a site'
+))
+class AnnotatedURLViewSet(mixins.ListModelMixin, viewsets.GenericViewSet):
+    resource_name = 'annotatedUrls'
+    serializer_class = AnnotatedURLSerializer
+    queryset = AnnotatedURL.objects.all()
+
+    filter_backends = (OrderingFilter, DjangoFilterBackend)
+    ordering_fields = ('annotation_count', 'annotation_request_count', 'last_annotation_date')
+    ordering = ('-annotation_count', 'id')
+    filterset_class = AnnotatedURLFilterSet
@@ -1,21 +1,23 @@
 import django_filters
 from django.apps import apps
+from django.db.models import Prefetch
 from django.utils.decorators import method_decorator
 from django_filters.rest_framework import DjangoFilterBackend
 from drf_yasg.utils import swagger_auto_schema
 from rest_framework import mixins, viewsets
 from rest_framework.filters import OrderingFilter
-from rest_framework_json_api.pagination import LimitOffsetPagination
 
+from apps.api.pagination import KeysetPagination
 from apps.api.permissions import OnlyOwnerCanWrite
 from ..filters import BooleanFilter, RequestUserBooleanFilter, StandardizedURLFilterBackend
 from ..mails import notify_editors_about_annotation_request
-from ..models import AnnotationRequest
+from ..models import Annotation, AnnotationRequest
 from ..serializers import AnnotationRequestSerializer
+from .mixins import URLVersionETagMixin
 
 
 class AnnotationRequestFilterSet(django_filters.FilterSet):
-    answered = BooleanFilter(field_name='annotation', lookup_expr='isnull', exclude=True)
+    answered = BooleanFilter(field_name='answered')
     belongs_to_me = RequestUserBooleanFilter(field_name='user')
 
     class Meta:
@@ -26,23 +28,29 @@ class AnnotationRequestFilterSet(django_filters.FilterSet):
 @method_decorator(name='list', decorator=swagger_auto_schema(
     manual_parameters=StandardizedURLFilterBackend.get_manual_parameters()
 ))
-class AnnotationRequestViewSet(mixins.CreateModelMixin,
+class AnnotationRequestViewSet(URLVersionETagMixin,
+                               mixins.CreateModelMixin,
                                mixins.RetrieveModelMixin,
                                mixins.ListModelMixin,
                                mixins.DestroyModelMixin,
                                viewsets.GenericViewSet):
 
     serializer_class = AnnotationRequestSerializer
-    queryset = AnnotationRequest.objects.filter(active=True).prefetch_related('annotation_set')
+    queryset = AnnotationRequest.objects.filter(active=True).prefetch_related(Prefetch(
+        'annotation_set',
+        # Annotations are rendered as relationships (ids) only, so nothing else of the (long) rows is loaded
+        queryset=Annotation.objects.filter(active=True).only('id', 'annotation_request'),
+        to_attr='active_annotations'
+    ))
     permission_classes = [OnlyOwnerCanWrite]
     owner_field = 'user'
 
-    pagination_class = LimitOffsetPagination
+    pagination_class = KeysetPagination
     filter_backends = (OrderingFilter, DjangoFilterBackend, StandardizedURLFilterBackend)
     ordering_fields = ('create_date',)
     ordering = "-create_date"
     filterset_class = AnnotationRequestFilterSet
-    url_filter_model_field = 'url_id'
+    url_filter_model_field = 'url_hash'
 
     def perform_create(self, serializer):
         instance = serializer.save(user=self.request.user)
@@ -1,16 +1,64 @@
-from rest_framework import mixins, viewsets, generics
+from django.conf import settings
+from django.db import transaction
+from django.http import Http404
+from rest_framework import mixins, status, viewsets, generics
+from rest_framework.response import Response
 
 from apps.annotation import models
 from apps.annotation import serializers
+from apps.annotation import upvotes
 from apps.api.permissions import OnlyOwnerCanRead
 
 
 class AnnotationUpvoteViewSet(viewsets.GenericViewSet, mixins.CreateModelMixin, mixins.DestroyModelMixin):
+    """
+    With ANNOTATION_UPVOTE_WRITE_BEHIND enabled upvotes are written to the database later (see apps.annotation.upvotes):
+    creation is answered with 202 Accepted (also when upvoted already, with the same upvote) and removal takes effect
+    at once for the request user only.
+    """
     queryset = models.AnnotationUpvote.objects.all()
     serializer_class = serializers.AnnotationUpvoteSerializer
     permission_classes = [OnlyOwnerCanRead]
     owner_field = 'user'
 
+    def get_serializer_class(self):
+        if self.action == 'create' and settings.ANNOTATION_UPVOTE_WRITE_BEHIND:
+            return serializers.AnnotationUpvoteIntentSerializer
+        return super().get_serializer_class()
+
+    def get_object(self):
+        if not settings.ANNOTATION_UPVOTE_WRITE_BEHIND:
+            return super().get_object()
+        try:
+            upvote = upvotes.get_upvote(self.request.user, upvote_id=int(self.kwargs[self.lookup_field]))
+        except ValueError:
+            upvote = None
+        if upvote is None:
+            raise Http404
+        self.check_object_permissions(self.request, upvote)
+        return upvote
+
+    def create(self, request, *args, **kwargs):
+        if not settings.ANNOTATION_UPVOTE_WRITE_BEHIND:
+            return super().create(request, *args, **kwargs)
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        upvote = upvotes.buffer_upvote(request.user, serializer.validated_data['annotation'])
+        return Response(self.get_serializer(upvote).data, status=status.HTTP_202_ACCEPTED)
+
+    # Annotation.upvote_count is updated (by signals) in the same transaction as the upvote itself
+
+    @transaction.atomic
+    def perform_create(self, serializer):
+        super().perform_create(serializer)
+
+    @transaction.atomic
+    def perform_destroy(self, instance):
+        if settings.ANNOTATION_UPVOTE_WRITE_BEHIND:
+            upvotes.buffer_upvote_removal(instance)
+            return
+        super().perform_destroy(instance)
+
 
 class AnnotationRelatedAnnotationUpvote(generics.RetrieveAPIView):
     queryset = models.AnnotationUpvote.objects.all()
@@ -24,3 +72,13 @@ class AnnotationRelatedAnnotationUpvote(generics.RetrieveAPIView):
 
     def get_queryset(self):
         return super().get_queryset().filter(user=self.request.user)
+
+    def get_object(self):
+        if not settings.ANNOTATION_UPVOTE_WRITE_BEHIND:
+            return super().get_object()
+        # Including the request user's upvote intents not written yet
+        upvote = upvotes.get_upvote(self.request.user, annotation_id=self.kwargs[self.lookup_url_kwarg])
+        if upvote is None:
+            raise Http404
+        self.check_object_permissions(self.request, upvote)
+        return upvote
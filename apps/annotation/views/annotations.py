@@ -1,20 +1,39 @@
+import hashlib
 import logging
+from collections import OrderedDict
+from datetime import timedelta
 
 import django_filters
 from django.apps import apps
-from django.db.models import Count, Prefetch
+from django.conf import settings
+from django.db.models import OuterRef, Prefetch, Subquery, prefetch_related_objects
+from django.http import HttpResponse
+from django.utils import timezone
+from django.utils.cache import patch_cache_control, patch_vary_headers
 from django.utils.decorators import method_decorator
 from django_filters.rest_framework import DjangoFilterBackend
+from djangorestframework_camel_case.parser import CamelCaseJSONParser
+from djangorestframework_camel_case.render import CamelCaseJSONRenderer
+from drf_yasg import openapi
 from drf_yasg.utils import swagger_auto_schema
-from rest_framework import viewsets
+from rest_framework import status, viewsets
+from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
 from rest_framework.filters import OrderingFilter
-from rest_framework_json_api.pagination import LimitOffsetPagination
+from rest_framework.permissions import AllowAny, IsAuthenticated
+from rest_framework.response import Response
+from rest_framework_json_api.renderers import JSONRenderer
 
-from apps.annotation import serializers
+from apps.annotation import cache, membership, serializers, snapshots, upvotes
+from apps.annotation.aliases import resolve_url_aliases
 from apps.annotation.filters import StandardizedURLFilterBackend, ListORFilter
 from apps.annotation.models import Annotation, AnnotationUpvote
+from apps.annotation.utils import standardize_url_id
+from apps.api import links
+from apps.api.pagination import KeysetPagination
 from apps.api.permissions import OnlyEditorCanWrite, OnlyOwnerCanWrite
 from apps.docs.utils import unless_swagger
+from .mixins import URLVersionETagMixin
 
 logger = logging.getLogger('pp.annotation')
 
@@ -30,18 +49,18 @@ class AnnotationListFilter(django_filters.FilterSet):
 @method_decorator(name='list', decorator=swagger_auto_schema(
     manual_parameters=StandardizedURLFilterBackend.get_manual_parameters()
 ))
-class AnnotationViewSet(viewsets.ModelViewSet):
+class AnnotationViewSet(URLVersionETagMixin, viewsets.ModelViewSet):
     queryset = Annotation.objects.filter(active=True)
     permission_classes = (OnlyEditorCanWrite & OnlyOwnerCanWrite,)
     owner_field = 'user'
 
     # List related definitions
-    pagination_class = LimitOffsetPagination
+    pagination_class = KeysetPagination
     filter_backends = (OrderingFilter, DjangoFilterBackend, StandardizedURLFilterBackend)
     ordering_fields = ('create_date', 'id')
     ordering = "-create_date"
     filter_class = AnnotationListFilter
-    url_filter_model_field = 'url_id'
+    url_filter_model_field = 'url_hash'
 
     # Router
     lookup_url_kwarg = 'annotation_id'
@@ -49,21 +68,279 @@ class AnnotationViewSet(viewsets.ModelViewSet):
     def get_serializer_class(self):
         if self.action in ('update', 'partial_update'):
             return serializers.AnnotationPatchSerializer
+        elif self.action == 'shared':
+            return serializers.AnnotationSharedSerializer
         else:
             return serializers.AnnotationSerializer
 
     def get_queryset(self):
-        return super().get_queryset().annotate(
-            total_upvote_count=Count('annotationupvote')
-        ).select_related(
+        # The request user's upvote is selected along (see AnnotationSerializer.get_user_annotation_upvote)
+        return self.get_shared_queryset().annotate(user_annotation_upvote_id=self.get_user_annotation_upvote_id(
+            unless_swagger(self, lambda: self.request.user, default=None)
+        ))
+
+    def get_shared_queryset(self):
+        # The part of the queryset that does not depend on the request user.
+        # The user and the annotation request are rendered as ids only, so nothing else of them is loaded
+        # (and cached along, see apps.annotation.cache): their rows hold password hashes and emails
+        return super().get_queryset().select_related(
             'user', 'annotation_request'
-        ).prefetch_related(Prefetch(
+        ).only(
+            *[field.name for field in Annotation._meta.concrete_fields], 'user__id', 'annotation_request__id'
+        )
+
+    @staticmethod
+    def get_user_annotation_upvote_id(user):
+        # Correlated subquery of the (user, annotation) unique index
+        return Subquery(AnnotationUpvote.objects.filter(user=user, annotation=OuterRef('pk')).values('id')[:1])
+
+    def get_user_annotation_upvotes_prefetch(self):
+        # For lists of annotations already fetched (cached) without the request user's upvote
+        return Prefetch(
             lookup='annotationupvote_set',
             queryset=AnnotationUpvote.objects.filter(
                 user=unless_swagger(self, lambda: self.request.user, default=None)
             ),
             to_attr='user_annotation_upvotes'
-        ))
+        )
+
+    def list(self, request, *args, **kwargs):
+        url_hash = self.get_cacheable_url_hash()
+        if url_hash is None:
+            return super().list(request, *args, **kwargs)
+        return self.conditional_response(request, lambda: self.list_cached(url_hash))
+
+    def list_cached(self, url_hash):
+        hot = snapshots.record_hit(url_hash)
+        if isinstance(self.request.accepted_renderer, JSONRenderer):
+            resources = snapshots.get_snapshot(url_hash)
+            if resources is not None:
+                return self.list_snapshot(resources)
+
+        # Same result as the regular list, but the user-independent part is shared with everyone viewing the URL
+        annotations = cache.get_url_annotations(
+            url_hash,
+            lambda: self.get_shared_queryset().filter(url_hash=url_hash).order_by(self.ordering)
+        )
+        if annotations and hot:
+            snapshots.request_snapshot(url_hash)
+        prefetch_related_objects(annotations, self.get_user_annotation_upvotes_prefetch())
+
+        page = self.paginate_queryset(annotations)
+        serializer = self.get_serializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
+
+    def list_snapshot(self, resources):
+        # Same result as the regular list, rendered without any serializer or renderer
+        page = self.paginate_queryset(resources)
+        paginated = self.get_paginated_response(None).data
+        document = OrderedDict([
+            ('links', paginated['links']),
+            ('data', snapshots.splice_user_fields(
+                page, self.request.user, links.get_request_origin(self.request),
+                upvotes.get_pending_upvotes(self.request.user)
+            )),
+            ('meta', paginated['meta']),
+        ])
+        return HttpResponse(snapshots.render_document(document),
+                            content_type=self.request.accepted_media_type)
+
+    @swagger_auto_schema(manual_parameters=StandardizedURLFilterBackend.get_manual_parameters())
+    @action(detail=False, methods=['get'], url_path='shared', authentication_classes=[], permission_classes=[AllowAny])
+    def shared(self, request, *args, **kwargs):
+        """
+        Annotations of the URL (passed the same way as for the list) without any user specific fields,
+        so the response does not depend on the JWT and may be cached by browsers and proxies.
+        The user specific fields can be fetched with userState.
+        """
+        url_hash = StandardizedURLFilterBackend().get_url_hash(request)
+        if url_hash is None:
+            raise ValidationError({'url': 'URL is required'})
+        response = self.conditional_response(request, lambda: self.list_shared(url_hash), user_dependent=False)
+        patch_cache_control(response, public=True, max_age=settings.ANNOTATION_SHARED_LIST_MAX_AGE)
+        patch_vary_headers(response, [StandardizedURLFilterBackend.secret_url_header])
+        return response
+
+    def list_shared(self, url_hash):
+        annotations = cache.get_url_annotations(
+            url_hash,
+            lambda: self.get_shared_queryset().filter(url_hash=url_hash).order_by(self.ordering)
+        )
+        page = self.paginate_queryset(annotations)
+        serializer = self.get_serializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
+
+    @swagger_auto_schema(responses={200: serializers.AnnotationUserStateSerializer(many=True)},
+                         manual_parameters=[openapi.Parameter(
+                             name='ids', in_=openapi.IN_QUERY, type=openapi.TYPE_STRING, required=True,
+                             description='Comma-separated annotation ids'
+                         )])
+    @action(detail=False, methods=['get'], url_path='userState', renderer_classes=[CamelCaseJSONRenderer],
+            permission_classes=[IsAuthenticated])
+    def user_state(self, request, *args, **kwargs):
+        """
+        The request user specific fields of the annotations, complementing the shared list,
+        along with the current upvote counts (the shared list may be cached for a while).
+        All the annotations (e.g. to refresh upvote buttons) are read by a single query of the primary key.
+        """
+        query_serializer = serializers.AnnotationUserStateQuerySerializer(data={
+            'ids': [id for id in request.query_params.get('ids', '').split(',') if id]
+        })
+        query_serializer.is_valid(raise_exception=True)
+        ids = query_serializer.validated_data['ids']
+
+        states = {state['id']: state for state in Annotation.objects.filter(active=True, id__in=ids).annotate(
+            user_upvote_id=self.get_user_annotation_upvote_id(request.user)
+        ).values('id', 'user_id', 'user_upvote_id', 'upvote_count')}
+        pending_upvotes = upvotes.get_pending_upvotes(request.user)
+        serializer = serializers.AnnotationUserStateSerializer([{
+            'id': state['id'],
+            'does_belong_to_user': state['user_id'] == request.user.id,
+            'annotation_upvote': pending_upvotes.get(state['id'], state['user_upvote_id']),
+            'upvote_count': state['upvote_count'],
+            'upvote_count_except_user': Annotation.get_upvote_count_except_user(
+                state['upvote_count'], state['user_upvote_id']
+            ),
+        } for state in (states[id] for id in dict.fromkeys(ids) if id in states)], many=True)
+
+        response = Response(serializer.data)
+        patch_cache_control(response, private=True, no_cache=True)
+        return response
+
+    @swagger_auto_schema(request_body=serializers.AnnotationBatchSerializer)
+    @action(detail=False, methods=['post'], url_path='batch',
+            parser_classes=[CamelCaseJSONParser], permission_classes=[IsAuthenticated])
+    def batch(self, request, *args, **kwargs):
+        """
+        List annotations of many URLs at once.
+        URLs are sent in the request body (not as query params) for the same reason as PP-SITE-URL header is used
+        """
+        batch_serializer = serializers.AnnotationBatchSerializer(data=request.data)
+        batch_serializer.is_valid(raise_exception=True)
+        urls = batch_serializer.validated_data['urls']
+
+        url_ids = {url: standardize_url_id(url) for url in urls}
+        canonical_urls = resolve_url_aliases(set(url_ids.values()))
+        url_hashes = {url: canonical_urls[url_id][1] for url, url_id in url_ids.items()}
+        url_annotations = cache.get_many_url_annotations(
+            set(url_hashes.values()),
+            lambda missing_url_hashes: self.get_shared_queryset().filter(
+                url_hash__in=missing_url_hashes
+            ).order_by(self.ordering)
+        )
+        annotations = list({annotation.id: annotation
+                            for url_hash in url_hashes.values()
+                            for annotation in url_annotations[url_hash]}.values())
+        prefetch_related_objects(annotations, self.get_user_annotation_upvotes_prefetch())
+
+        serializer = self.get_serializer(annotations, many=True)
+        return Response({
+            'results': serializer.data,
+            'meta': {
+                'urls': [{
+                    'url': url,
+                    'annotations': [str(annotation.id) for annotation in url_annotations[url_hashes[url]]]
+                } for url in urls],
+            },
+        })
+
+    @swagger_auto_schema(manual_parameters=StandardizedURLFilterBackend.get_manual_parameters() + [
+        openapi.Parameter(name='token', in_=openapi.IN_QUERY, type=openapi.TYPE_INTEGER,
+                          description='Change token returned by the previous request (meta.token)'),
+        openapi.Parameter(name='since', in_=openapi.IN_QUERY, type=openapi.TYPE_STRING, format=openapi.FORMAT_DATETIME,
+                          description='Used when there is no token yet'),
+    ])
+    @action(detail=False, methods=['get'], url_path='changes', permission_classes=[IsAuthenticated])
+    def changes(self, request, *args, **kwargs):
+        """
+        Annotations of the URL (passed the same way as for the list) created or modified after the token
+        (or since the date, if there is no token yet).
+        Annotations deactivated, deleted or moved to another URL in the meantime are listed in meta.deleted.
+        meta.token should be passed to the next request. Upvote counts do not make annotations changed.
+        Annotations changed recently may be listed again by the next request.
+        """
+        url_hash = StandardizedURLFilterBackend().get_url_hash(request)
+        if url_hash is None:
+            raise ValidationError({'url': 'URL is required'})
+        query_serializer = serializers.AnnotationChangesQuerySerializer(data=request.query_params)
+        query_serializer.is_valid(raise_exception=True)
+        token = query_serializer.validated_data.get('token')
+        since = query_serializer.validated_data.get('since')
+
+        # Read first, so changes made while responding are (harmlessly) listed once again next time.
+        # Ids are taken from the sequence on insert rather than on commit, so a change with a lower id than
+        # the greatest one seen may still be committed later: the token is held back behind the recent changes,
+        # which are listed once again next time (rather than never)
+        History = Annotation.history.model
+        next_token = History.objects.filter(
+            history_date__lt=timezone.now() - timedelta(seconds=settings.ANNOTATION_CHANGES_TOKEN_OVERLAP)
+        ).order_by('-history_id').values_list('history_id', flat=True).first() or 0
+
+        # Historical records of the annotation after a move to another URL have a different url_hash,
+        # so the annotations ever having the URL are looked for first
+        history = History.objects.filter(id__in=History.objects.filter(url_hash=url_hash).values('id'))
+        if token is not None:
+            history = history.filter(history_id__gt=token)
+        elif since is not None:
+            history = history.filter(history_date__gt=since)
+        changed_ids = set(history.values_list('id', flat=True).distinct())
+
+        annotations = list(self.get_queryset().filter(id__in=changed_ids, url_hash=url_hash).order_by(self.ordering))
+        serializer = self.get_serializer(annotations, many=True)
+        return Response({
+            'results': serializer.data,
+            'meta': {
+                'deleted': [str(id) for id in sorted(changed_ids - {annotation.id for annotation in annotations})],
+                'token': next_token,
+            },
+        })
+
+    @swagger_auto_schema(responses={200: serializers.AnnotationExistsSerializer},
+                         manual_parameters=StandardizedURLFilterBackend.get_manual_parameters())
+    @action(detail=False, methods=['get'], url_path='exists', renderer_classes=[CamelCaseJSONRenderer],
+            permission_classes=[IsAuthenticated])
+    def exists(self, request, *args, **kwargs):
+        """
+        Cheap check whether there are any annotations for the URL (passed the same way as for the list)
+        """
+        url_hash = StandardizedURLFilterBackend().get_url_hash(request)
+        if url_hash is None:
+            raise ValidationError({'url': 'URL is required'})
+        exists = Annotation.objects.filter(active=True, url_hash=url_hash).exists()
+        return Response(serializers.AnnotationExistsSerializer({'exists': exists}).data)
+
+    @swagger_auto_schema(responses={200: serializers.AnnotationMembershipFilterSerializer})
+    @action(detail=False, methods=['get'], url_path='membershipFilter', renderer_classes=[CamelCaseJSONRenderer],
+            permission_classes=[IsAuthenticated])
+    def membership_filter(self, request, *args, **kwargs):
+        """
+        Bloom filter of URLs with annotations, see apps.annotation.membership for the bit positions scheme.
+        Answered with 503 (and Retry-After) until the filter is built.
+        """
+        membership_filter = membership.get_membership_filter()
+        if membership_filter is None:
+            # Being built (by a task, as it takes a scan of all annotations)
+            return Response(status=status.HTTP_503_SERVICE_UNAVAILABLE, headers={
+                'Retry-After': str(settings.ANNOTATION_MEMBERSHIP_FILTER_RETRY_AFTER)
+            })
+        etag = '"{}"'.format(hashlib.md5(membership_filter.bits).hexdigest())
+        if request.META.get('HTTP_IF_NONE_MATCH') == etag:
+            return Response(status=status.HTTP_304_NOT_MODIFIED, headers={'ETag': etag})
+        return Response(serializers.AnnotationMembershipFilterSerializer(membership_filter).data,
+                        headers={'ETag': etag})
+
+    def get_cacheable_url_hash(self):
+        """
+        Return url_hash if the list is filtered by URL only (the way the extension requests it), None otherwise
+        """
+        allowed_params = {
+            StandardizedURLFilterBackend.url_data_query_param,
+            self.paginator.limit_query_param,
+            self.paginator.offset_query_param,
+        }
+        if set(self.request.query_params) - allowed_params:
+            return None
+        return StandardizedURLFilterBackend().get_url_hash(self.request)
 
     def perform_create(self, serializer):
         serializer.save(user=self.request.user)
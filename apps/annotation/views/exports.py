@@ -0,0 +1,37 @@
+from django.http import StreamingHttpResponse
+from drf_yasg import openapi
+from drf_yasg.utils import swagger_auto_schema
+from rest_framework import serializers
+from rest_framework.views import APIView
+
+from apps.annotation import exports
+from apps.api.permissions import OnlyEditor
+
+
+class ExportQuerySerializer(serializers.Serializer):
+    since = serializers.DateTimeField(required=False)
+
+
+class ExportView(APIView):
+    """
+    Stream all annotations, annotation requests or upvotes as NDJSON or CSV
+    """
+    permission_classes = [OnlyEditor]
+
+    @swagger_auto_schema(
+        manual_parameters=[openapi.Parameter(name='since', in_=openapi.IN_QUERY, type=openapi.TYPE_STRING,
+                                             format=openapi.FORMAT_DATETIME,
+                                             description='Export only rows created since then')],
+        responses={200: openapi.Response('NDJSON or CSV file', schema=openapi.Schema(type=openapi.TYPE_STRING))}
+    )
+    def get(self, request, resource, export_format):
+        query_serializer = ExportQuerySerializer(data=request.query_params)
+        query_serializer.is_valid(raise_exception=True)
+
+        response = StreamingHttpResponse(
+            exports.export_lines(exports.EXPORT_MODELS[resource], export_format,
+                                 since=query_serializer.validated_data.get('since')),
+            content_type=exports.EXPORT_FORMATS[export_format]
+        )
+        response['Content-Disposition'] = 'attachment; filename="{}.{}"'.format(resource, export_format)
+        return response
@@ -0,0 +1,41 @@
+from django.utils.http import parse_etags
+from rest_framework import status
+from rest_framework.response import Response
+
+from apps.annotation import cache, upvotes
+from apps.annotation.filters import StandardizedURLFilterBackend
+
+
+class URLVersionETagMixin:
+    """
+    Conditional GET of lists filtered by URL.
+    The ETag is derived from the URL version (see apps.annotation.cache), so a matching If-None-Match
+    is answered with 304 before the queryset or the serializer is even touched.
+    """
+
+    def list(self, request, *args, **kwargs):
+        return self.conditional_response(request, lambda: super(URLVersionETagMixin, self).list(
+            request, *args, **kwargs
+        ))
+
+    def conditional_response(self, request, get_response, user_dependent=True):
+        # The version is read before the data, so a concurrent write can only make the ETag outdated too early
+        etag = self.get_url_etag(request, user_dependent)
+        if etag is not None and etag in parse_etags(request.META.get('HTTP_IF_NONE_MATCH', '')):
+            return Response(status=status.HTTP_304_NOT_MODIFIED, headers={'ETag': etag})
+        response = get_response()
+        if etag is not None and response.status_code == status.HTTP_200_OK:
+            response['ETag'] = etag
+        return response
+
+    def get_url_etag(self, request, user_dependent):
+        url_hash = StandardizedURLFilterBackend().get_url_hash(request)
+        if url_hash is None:
+            return None
+        parts = [self.__class__.__name__, self.action, request.accepted_media_type, request.get_full_path(),
+                 request.user.id if user_dependent else None]
+        # The user's upvotes not written yet (so with no new URL version) change the response as well
+        pending_upvotes = upvotes.get_pending_upvotes(request.user) if user_dependent else None
+        if pending_upvotes:
+            parts.append(sorted(pending_upvotes.items()))
+        return cache.get_url_etag(url_hash, *parts)
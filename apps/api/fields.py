@@ -24,11 +24,12 @@ class ObjectField(serializers.Field):
         return json_data if self.json_internal_type else data
 
     def to_representation(self, value):
+        if not self.json_internal_type:
+            # Already deserialized (e.g. by a JSONField), passed through as it is
+            return value
         if value is None or value == "":
             return None
-        if self.json_internal_type:
-            return json.loads(value)
-        return value
+        return json.loads(value)
 
 
 class StandardizedRepresentationURLField(serializers.URLField):
@@ -0,0 +1,74 @@
+"""
+Links of serialized resources (self links, related links) built from URL templates.
+
+Django reverse() resolves the whole URLconf on every call, which is done a few times per serialized row.
+Instead every route is reversed once (per process) with placeholder ids, turned into a template and from then on
+a link is just the template formatted with the id and prefixed with the origin of the request (computed once per
+request as well). The output is identical to rest_framework.reverse.reverse, which is still used for anything
+the templates do not cover (non-integer ids, format suffixes, versioning).
+"""
+from functools import lru_cache
+
+from django.urls import get_script_prefix, reverse as django_reverse
+from rest_framework.relations import HyperlinkedIdentityField
+from rest_framework.reverse import reverse as drf_reverse
+from rest_framework.settings import api_settings
+from rest_framework_json_api.relations import ResourceRelatedField, SerializerMethodResourceRelatedField
+
+# Placeholder ids, unlikely to appear in any URL otherwise
+PLACEHOLDER_ID = 7310000001
+
+
+@lru_cache(maxsize=None)
+def get_link_template(viewname, kwarg_names, script_prefix):
+    """
+    Return str.format template of the path of viewname with kwarg_names placeholders, None if it cannot be built
+    """
+    placeholders = {name: PLACEHOLDER_ID + i for i, name in enumerate(kwarg_names)}
+    path = django_reverse(viewname, kwargs=placeholders).replace('{', '{{').replace('}', '}}')
+    for name, placeholder in placeholders.items():
+        if path.count(str(placeholder)) != 1:
+            return None
+        path = path.replace(str(placeholder), '{%s}' % name)
+    return path
+
+
+def get_request_origin(request):
+    origin = getattr(request, '_link_origin', None)
+    if origin is None:
+        origin = request._link_origin = request.build_absolute_uri('/')[:-1]
+    return origin
+
+
+def reverse(viewname, args=None, kwargs=None, request=None, format=None, **extra):
+    """
+    Drop-in replacement of rest_framework.reverse.reverse
+    """
+    if args or format or extra or not kwargs or getattr(request, 'versioning_scheme', None) is not None or \
+            not all(type(value) is int for value in kwargs.values()) or \
+            (request is not None and api_settings.URL_FORMAT_OVERRIDE in request.GET):
+        return drf_reverse(viewname, args, kwargs, request, format, **extra)
+
+    template = get_link_template(viewname, tuple(sorted(kwargs)), get_script_prefix())
+    if template is None:
+        return drf_reverse(viewname, args, kwargs, request, format, **extra)
+    path = template.format(**kwargs)
+    return get_request_origin(request) + path if request is not None else path
+
+
+class TemplatedLinksMixin:
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.reverse = reverse
+
+
+class TemplatedHyperlinkedIdentityField(TemplatedLinksMixin, HyperlinkedIdentityField):
+    pass
+
+
+class TemplatedResourceRelatedField(TemplatedLinksMixin, ResourceRelatedField):
+    pass
+
+
+class TemplatedSerializerMethodResourceRelatedField(TemplatedLinksMixin, SerializerMethodResourceRelatedField):
+    pass
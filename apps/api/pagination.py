@@ -0,0 +1,139 @@
+import base64
+import binascii
+from collections import OrderedDict
+
+from django.db import connections
+from django.db.models import Q, QuerySet
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import NotFound
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+from rest_framework.views import Response
+from rest_framework_json_api.pagination import LimitOffsetPagination
+
+
+def estimate_count(queryset):
+    """
+    Planner's estimate of the number of rows (instead of an exact, but slow COUNT(*)); None if not available
+    """
+    connection = connections[queryset.db]
+    if connection.vendor != 'postgresql':
+        return None
+    sql, params = queryset.query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute('EXPLAIN (FORMAT JSON) ' + sql, params)
+        plan = cursor.fetchone()[0]
+    return plan[0]['Plan']['Plan Rows']
+
+
+class KeysetPagination(LimitOffsetPagination):
+    """
+    Limit/offset pagination with an opt-in keyset (cursor) mode, enabled by sending page[cursor] param
+    (empty for the first page):
+
+        /api/annotations?page[cursor]=&page[limit]=20
+        /api/annotations?page[cursor]=<value taken from links.next>&page[limit]=20
+
+    In the keyset mode items are always ordered from the newest ((create_date, id) descending, sort param is ignored),
+    each page is a single indexed range query and no COUNT(*) is made, so deep pages are as fast as the first one.
+    The total number of items is not known, an approximate one may be requested with page[total]=approximate.
+    """
+    max_limit = None
+    cursor_query_param = 'page[cursor]'
+    total_query_param = 'page[total]'
+    keyset_fields = ('create_date', 'id')
+
+    NEXT = 'n'
+    PREVIOUS = 'p'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        # Lists (of cached objects) are always paginated with limit/offset
+        if self.cursor_query_param not in request.query_params or isinstance(queryset, list):
+            self.keyset = False
+            return super().paginate_queryset(queryset, request, view)
+
+        self.keyset = True
+        self.request = request
+        self.limit = self.get_limit(request)
+        self.approximate_count = None
+        if request.query_params.get(self.total_query_param) == 'approximate':
+            self.approximate_count = estimate_count(queryset)
+
+        cursor = self.decode_cursor(request.query_params[self.cursor_query_param])
+        date_field, id_field = self.keyset_fields
+        ordering = ('-' + date_field, '-' + id_field)
+        if cursor is not None:
+            direction, create_date, id = cursor
+            if direction == self.NEXT:
+                queryset = queryset.filter(Q(**{date_field + '__lt': create_date}) |
+                                           Q(**{date_field: create_date, id_field + '__lt': id}))
+            else:
+                queryset = queryset.filter(Q(**{date_field + '__gt': create_date}) |
+                                           Q(**{date_field: create_date, id_field + '__gt': id}))
+                ordering = (date_field, id_field)
+
+        # One item more than needed tells whether there is a page further in the same direction
+        items = list(queryset.order_by(*ordering)[:self.limit + 1])
+        has_more = len(items) > self.limit
+        items = items[:self.limit]
+
+        if cursor is not None and cursor[0] == self.PREVIOUS:
+            items.reverse()
+            self.has_next, self.has_previous = True, has_more
+        else:
+            self.has_next, self.has_previous = has_more, cursor is not None
+        self.page = items
+        return items
+
+    def get_paginated_response(self, data):
+        if not self.keyset:
+            return super().get_paginated_response(data)
+
+        pagination = OrderedDict([
+            ('limit', self.limit),
+        ])
+        if self.approximate_count is not None:
+            pagination['approximate_count'] = self.approximate_count
+        return Response({
+            'results': data,
+            'meta': {
+                'pagination': pagination
+            },
+            'links': OrderedDict([
+                ('first', self.get_cursor_link('')),
+                ('last', None),
+                ('next', self.get_cursor_link(self.encode_cursor(self.NEXT, self.page[-1]))
+                    if self.has_next and self.page else None),
+                ('prev', self.get_cursor_link(self.encode_cursor(self.PREVIOUS, self.page[0]))
+                    if self.has_previous and self.page else None),
+            ])
+        })
+
+    def get_count(self, queryset):
+        # Annotations (e.g. subqueries of the request user) would be computed and grouped by for every row counted
+        if isinstance(queryset, QuerySet):
+            queryset = queryset.values('pk')
+        return super().get_count(queryset)
+
+    def get_cursor_link(self, cursor):
+        url = self.request.build_absolute_uri()
+        url = replace_query_param(url, self.limit_query_param, self.limit)
+        url = remove_query_param(url, self.offset_query_param)
+        return replace_query_param(url, self.cursor_query_param, cursor)
+
+    def encode_cursor(self, direction, item):
+        date_field, id_field = self.keyset_fields
+        value = '{}|{}|{}'.format(direction, getattr(item, date_field).isoformat(), getattr(item, id_field))
+        return base64.urlsafe_b64encode(value.encode('utf8')).decode('ascii')
+
+    def decode_cursor(self, encoded):
+        if not encoded:
+            return None
+        try:
+            direction, create_date, id = base64.urlsafe_b64decode(encoded.encode('ascii')).decode('utf8').split('|')
+            create_date = parse_datetime(create_date)
+            id = int(id)
+        except (TypeError, ValueError, UnicodeError, binascii.Error):
+            raise NotFound('Invalid cursor')
+        if direction not in (self.NEXT, self.PREVIOUS) or create_date is None:
+            raise NotFound('Invalid cursor')
+        return direction, create_date, id
@@ -53,3 +53,8 @@ class OnlyEditorCanWrite(ViewSetRequiredMixin, IsAuthenticated):
         if view.action in read_actions:
             return True
         return request.user.role == request.user.ROLE_EDITOR
+
+
+class OnlyEditor(IsAuthenticated):
+    def has_permission(self, request, view):
+        return super().has_permission(request, view) and request.user.role == request.user.ROLE_EDITOR
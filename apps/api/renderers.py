@@ -0,0 +1,180 @@
+"""
+Faster drop-in replacement of rest_framework_json_api.renderers.JSONRenderer, rendering byte-identical documents.
+
+The original renderer checks the type of every field for every row, reformats keys of every (nested) object
+with regular expressions and emits a deprecation warning for each of them. Here:
+  - fields of the serializer are classified once per response (what goes to attributes, to relationships
+    and to links) and every row is built in a single pass over that plan,
+  - formatted keys are memoized, as there are just a few distinct ones,
+  - the document is encoded the same way as before (DRF JSONRenderer, i.e. the C encoder of the json module);
+    other encoders do not produce the same bytes (escaping, floats, dates).
+Documents with anything the plan does not cover (included resources, polymorphic or nested serializers,
+other relation fields, meta fields) are rendered by the original renderer.
+"""
+from collections import OrderedDict
+from functools import lru_cache
+
+import inflection
+from django.utils.encoding import force_text
+from rest_framework import relations, renderers
+from rest_framework.serializers import BaseSerializer
+from rest_framework.settings import api_settings
+from rest_framework_json_api import renderers as json_api_renderers, utils
+from rest_framework_json_api.relations import ResourceRelatedField, SkipDataMixin
+from rest_framework_json_api.serializers import PolymorphicModelSerializer
+from rest_framework_json_api.settings import json_api_settings
+
+
+@lru_cache(maxsize=4096)
+def format_key(key, format_type):
+    # Same as rest_framework_json_api.utils.format_keys does to every key
+    if format_type == 'dasherize':
+        return inflection.dasherize(inflection.underscore(key))
+    elif format_type == 'camelize':
+        return inflection.camelize(key, False)
+    elif format_type == 'capitalize':
+        return inflection.camelize(key)
+    return inflection.underscore(key)
+
+
+def format_keys(obj, format_type):
+    """
+    Memoized equivalent of rest_framework_json_api.utils.format_keys (keys of nested objects are formatted too)
+    """
+    if isinstance(obj, dict):
+        return OrderedDict((format_key(key, format_type), format_keys(value, format_type))
+                           for key, value in obj.items())
+    if isinstance(obj, list):
+        return [format_keys(item, format_type) for item in obj]
+    return obj
+
+
+def format_field_names(obj, format_type):
+    """
+    Memoized equivalent of rest_framework_json_api.utils.format_field_names (top-level keys only)
+    """
+    if isinstance(obj, dict):
+        return OrderedDict((format_key(key, format_type), value) for key, value in obj.items())
+    return obj
+
+
+def format_object(obj):
+    # Same as rest_framework_json_api.utils._format_object
+    if json_api_settings.FORMAT_KEYS is not None:
+        if json_api_settings.FORMAT_KEYS not in ('dasherize', 'camelize', 'underscore', 'capitalize'):
+            return obj
+        return format_keys(obj, json_api_settings.FORMAT_KEYS)
+    if json_api_settings.FORMAT_FIELD_NAMES is None:
+        return obj
+    return format_field_names(obj, json_api_settings.FORMAT_FIELD_NAMES)
+
+
+class UnsupportedDocument(Exception):
+    pass
+
+
+class JSONRenderer(json_api_renderers.JSONRenderer):
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        try:
+            render_data = self.build_document(data, renderer_context or {})
+        except UnsupportedDocument:
+            return super().render(data, accepted_media_type, renderer_context)
+        return renderers.JSONRenderer.render(self, render_data, accepted_media_type, renderer_context)
+
+    def build_document(self, data, renderer_context):
+        """
+        Return the document to be encoded, raise UnsupportedDocument if it should be built by the original renderer
+        """
+        from rest_framework_json_api.views import RelationshipView
+
+        view = renderer_context.get('view')
+        request = renderer_context.get('request')
+        response = renderer_context.get('response')
+        resource_name = utils.get_resource_name(renderer_context)
+        if resource_name in ('errors', None, False) or (response is not None and response.status_code == 204) or \
+                isinstance(view, RelationshipView) or view.__class__.__name__ == 'APIRoot':
+            raise UnsupportedDocument()
+
+        serializer_data = data['results'] if data and 'results' in data else data
+        serializer = getattr(serializer_data, 'serializer', None)
+        if serializer is None or utils.get_included_resources(request, serializer) or \
+                getattr(serializer, 'get_root_meta', None) or \
+                getattr(getattr(serializer, 'child', None), 'get_root_meta', None):
+            raise UnsupportedDocument()
+
+        if getattr(serializer, 'many', False):
+            if isinstance(serializer.child, PolymorphicModelSerializer):
+                raise UnsupportedDocument()
+            plan = self.get_plan(serializer.child)
+            json_api_data = [
+                self.build_resource(plan, resource, resource_instance, resource_name)
+                for resource, resource_instance in zip(serializer_data, serializer.instance)
+            ]
+        else:
+            plan = self.get_plan(serializer)
+            json_api_data = self.build_resource(plan, serializer_data, serializer.instance, resource_name)
+
+        render_data = OrderedDict()
+        if isinstance(data, dict) and data.get('links'):
+            render_data['links'] = data.get('links')
+        render_data['data'] = json_api_data
+        json_api_meta = data.get('meta', {}) if isinstance(data, dict) else {}
+        if json_api_meta:
+            render_data['meta'] = format_object(json_api_meta)
+        return render_data
+
+    def get_plan(self, serializer):
+        """
+        Return (attribute fields, relationship fields, whether the self link is rendered) of the serializer
+        """
+        if getattr(getattr(serializer, 'Meta', None), 'meta_fields', None) or \
+                getattr(serializer, '_poly_force_type_resolution', False):
+            raise UnsupportedDocument()
+        attribute_fields, relationship_fields, self_link = [], [], False
+        for field_name, field in utils.get_serializer_fields(serializer).items():
+            if field.write_only:
+                continue
+            if field_name == api_settings.URL_FIELD_NAME:
+                self_link = isinstance(field, relations.RelatedField)
+            if not isinstance(field, (relations.RelatedField, relations.ManyRelatedField, BaseSerializer)):
+                if field_name != 'id':
+                    attribute_fields.append((field_name, field))
+            elif field_name == api_settings.URL_FIELD_NAME:
+                continue
+            elif isinstance(field, ResourceRelatedField) and not isinstance(field, relations.HyperlinkedIdentityField):
+                relationship_fields.append((field_name, field))
+            else:
+                raise UnsupportedDocument()
+        return attribute_fields, relationship_fields, self_link
+
+    def build_resource(self, plan, resource, resource_instance, resource_name):
+        attribute_fields, relationship_fields, self_link = plan
+
+        attributes = OrderedDict()
+        for field_name, field in attribute_fields:
+            if field_name not in resource and field.read_only:
+                continue
+            attributes[field_name] = resource.get(field_name)
+
+        relationships = OrderedDict()
+        if resource_instance is not None:
+            for field_name, field in relationship_fields:
+                relation_data = {}
+                links = field.get_links(resource_instance, field.related_link_lookup_field)
+                if links:
+                    relation_data['links'] = links
+                if not isinstance(field, SkipDataMixin):
+                    relation_data['data'] = resource.get(field_name)
+                relationships[field_name] = relation_data
+
+        resource_object = OrderedDict([
+            ('type', resource_name),
+            ('id', force_text(resource_instance.pk) if resource_instance else None),
+            ('attributes', format_object(attributes)),
+        ])
+        if relationships:
+            resource_object['relationships'] = format_object(relationships)
+        if self_link and api_settings.URL_FIELD_NAME in resource:
+            resource_object['links'] = {'self': resource[api_settings.URL_FIELD_NAME]}
+        return resource_object
@@ -0,0 +1,39 @@
+from django.test import RequestFactory, SimpleTestCase
+from parameterized import parameterized
+from rest_framework.request import Request
+from rest_framework.reverse import reverse as drf_reverse
+
+from apps.api import links
+
+
+class LinksTest(SimpleTestCase):
+
+    def setUp(self):
+        self.request = Request(RequestFactory().get('/api/annotations', HTTP_HOST='testserver:8000'))
+
+    @parameterized.expand([
+        ('api:annotation:annotation-detail', {'annotation_id': 1}),
+        ('api:annotation:annotation-detail', {'annotation_id': 1234567890}),
+        ('api:annotation:annotation_related_user', {'annotation_id': 10}),
+        ('api:annotation:annotation_related_upvote', {'annotation_id': 7310000001}),
+    ])
+    def test_identical_to_reverse(self, viewname, kwargs):
+        self.assertEqual(links.reverse(viewname, kwargs=kwargs, request=self.request),
+                         drf_reverse(viewname, kwargs=kwargs, request=self.request))
+        self.assertEqual(links.reverse(viewname, kwargs=kwargs), drf_reverse(viewname, kwargs=kwargs))
+
+    def test_template_compiled_once(self):
+        links.get_link_template.cache_clear()
+        for annotation_id in range(10):
+            links.reverse('api:annotation:annotation-detail', kwargs={'annotation_id': annotation_id},
+                          request=self.request)
+        self.assertEqual(links.get_link_template.cache_info().misses, 1)
+
+    def test_fallback(self):
+        request = Request(RequestFactory().get('/api/annotations', {'format': 'json'}))
+        self.assertEqual(
+            links.reverse('api:annotation:annotation-detail', kwargs={'annotation_id': 1}, request=request),
+            drf_reverse('api:annotation:annotation-detail', kwargs={'annotation_id': 1}, request=request)
+        )
+        self.assertEqual(links.reverse('api:annotation:annotation-detail', kwargs={'annotation_id': '1'}),
+                         drf_reverse('api:annotation:annotation-detail', kwargs={'annotation_id': '1'}))
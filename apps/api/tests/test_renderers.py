@@ -0,0 +1,130 @@
+import json
+
+from django.core.cache import cache
+from django.test import TestCase
+from model_mommy import mommy
+from parameterized import parameterized
+from rest_framework_json_api.renderers import JSONRenderer as JSONAPIRenderer
+from rest_framework_simplejwt.tokens import AccessToken
+
+from apps.annotation import aliases
+from apps.annotation.tests.utils import create_test_user
+from apps.api.renderers import JSONRenderer, UnsupportedDocument, format_keys
+
+
+class FormatKeysTest(TestCase):
+
+    def test_nested_keys(self):
+        self.assertEqual(
+            format_keys({'quote_context': {'start_offset': 1}, 'urls': [{'url_id': 'a'}], 'x': 'y_z'}, 'camelize'),
+            {'quoteContext': {'startOffset': 1}, 'urls': [{'urlId': 'a'}], 'x': 'y_z'}
+        )
+
+
+class JSONRendererGoldenTest(TestCase):
+    """
+    Every response must be rendered to exactly the same bytes as by rest_framework_json_api renderer
+    """
+    page_url = 'https://example.com/article/1'
+
+    def setUp(self):
+        self.user, self.password = create_test_user()
+        self.user.role = self.user.ROLE_EDITOR
+        self.user.save()
+        self.token_header = 'JWT %s' % str(AccessToken.for_user(self.user))
+        cache.clear()
+        aliases._local_aliases.clear()
+
+        self.annotation_request = mommy.make('annotation.AnnotationRequest', url=self.page_url,
+                                             quote='Zażółć "gęślą" jaźń\n')
+        self.annotation = mommy.make('annotation.Annotation', url=self.page_url, user=self.user,
+                                     range={'start_offset': 1, 'nested': [{'end_node': '/p[1]'}]},
+                                     quote='Zażółć <gęślą> jaźń  ', annotation_request=self.annotation_request)
+        self.other_annotation = mommy.make('annotation.Annotation', url=self.page_url, range={})
+        mommy.make('annotation.AnnotationUpvote', annotation=self.annotation, user=self.user)
+        mommy.make('annotation.AnnotationUpvote', annotation=self.other_annotation)
+
+    def tearDown(self):
+        aliases._local_aliases.clear()
+
+    def assertRenderedIdentically(self, response, fast=True):
+        self.assertTrue(200 <= response.status_code < 500, msg=response.content)
+        self.assertIsInstance(response.accepted_renderer, JSONRenderer)
+        expected = JSONAPIRenderer().render(response.data, response.accepted_media_type, response.renderer_context)
+        self.assertEqual(response.content, expected)
+        if fast:
+            # The document was not just left to the original renderer
+            JSONRenderer().build_document(response.data, response.renderer_context)
+
+    @parameterized.expand([
+        ('/api/annotations', {}),
+        ('/api/annotations', {'page[limit]': 1, 'page[offset]': 1}),
+        ('/api/annotations', {'page[cursor]': '', 'page[limit]': 1}),
+        ('/api/annotations/shared', {'url': page_url}),
+        ('/api/annotations/changes', {'url': page_url, 'since': '2000-01-01T00:00:00Z'}),
+        ('/api/annotationRequests', {}),
+        ('/api/annotationRequests', {'url': page_url}),
+        ('/api/annotatedUrls', {'domain': 'example.com'}),
+    ])
+    def test_list(self, url, params):
+        response = self.client.get(url, params, HTTP_AUTHORIZATION=self.token_header)
+        self.assertRenderedIdentically(response)
+
+    def test_list_of_url(self):
+        # Rendered by the renderer when there is no snapshot of the URL yet
+        cache.clear()
+        response = self.client.get('/api/annotations', {'url': self.page_url}, HTTP_AUTHORIZATION=self.token_header)
+        self.assertRenderedIdentically(response)
+
+    def test_empty_list(self):
+        response = self.client.get('/api/annotations', {'url': 'https://example.com/nothing'},
+                                   HTTP_AUTHORIZATION=self.token_header)
+        self.assertRenderedIdentically(response)
+        response = self.client.get('/api/annotatedUrls', {'domain': 'nothing.org'},
+                                   HTTP_AUTHORIZATION=self.token_header)
+        self.assertRenderedIdentically(response)
+
+    def test_batch(self):
+        response = self.client.post('/api/annotations/batch', json.dumps({'urls': [self.page_url]}),
+                                    content_type='application/json', HTTP_AUTHORIZATION=self.token_header)
+        self.assertRenderedIdentically(response)
+
+    @parameterized.expand([
+        ('/api/annotations/{annotation.id}',),
+        ('/api/annotations/{other_annotation.id}',),
+        ('/api/annotations/{annotation.id}/upvote',),
+        ('/api/annotations/{annotation.id}/user',),
+        ('/api/annotationRequests/{annotation_request.id}',),
+    ])
+    def test_detail(self, url):
+        response = self.client.get(url.format(**vars(self)), HTTP_AUTHORIZATION=self.token_header)
+        self.assertRenderedIdentically(response)
+
+    def test_create(self):
+        payload = {'data': {'type': 'annotations', 'attributes': {
+            'url': self.page_url, 'range': {'start': 'Od tad', 'end': 'do tad'}, 'quote': 'very nice',
+            'publisher': 'PP', 'ppCategory': 'ADDITIONAL_INFO', 'comment': 'komentarz',
+            'annotationLink': 'www.przypispowszechny.com', 'annotationLinkTitle': 'very nice too',
+        }}}
+        response = self.client.post('/api/annotations', json.dumps(payload), content_type='application/vnd.api+json',
+                                    HTTP_AUTHORIZATION=self.token_header)
+        self.assertEqual(response.status_code, 201, msg=response.content)
+        self.assertRenderedIdentically(response)
+
+    def test_errors(self):
+        response = self.client.post('/api/annotations', json.dumps({'data': {'type': 'annotations', 'attributes': {}}}),
+                                    content_type='application/vnd.api+json', HTTP_AUTHORIZATION=self.token_header)
+        self.assertEqual(response.status_code, 400)
+        self.assertRenderedIdentically(response, fast=False)
+        response = self.client.get('/api/annotations/0', HTTP_AUTHORIZATION=self.token_header)
+        self.assertEqual(response.status_code, 404)
+        self.assertRenderedIdentically(response, fast=False)
+
+    def test_included_resources_left_to_original_renderer(self):
+        response = self.client.get('/api/annotations', {'include': 'annotation_request'},
+                                   HTTP_AUTHORIZATION=self.token_header)
+        self.assertEqual(response.content, JSONAPIRenderer().render(
+            response.data, response.accepted_media_type, response.renderer_context
+        ))
+        with self.assertRaises(UnsupportedDocument):
+            JSONRenderer().build_document(response.data, response.renderer_context)
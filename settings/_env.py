@@ -17,5 +17,8 @@ if DEBUG and ENV == 'test':
 SECRET_KEY = environ.get('PP_SECRET_KEY') or environ.get('SECRET_KEY')
 HOST = environ.get('HEROKU_HOST') or environ.get('HOST')
 BROKER_URL = environ.get('REDIS_URL')
+REDIS_URL = environ.get('REDIS_URL')
+ANALYTICS_SNAPSHOT_DIR = environ.get('ANALYTICS_SNAPSHOT_DIR')
+ANNOTATION_UPVOTE_WRITE_BEHIND = strtobool(environ.get('ANNOTATION_UPVOTE_WRITE_BEHIND') or 'FALSE')
 FACEBOOK_GRAPH_SECRET = environ.get('FACEBOOK_GRAPH_SECRET')
 GOOGLE_OAUTH_SECRET = environ.get('GOOGLE_OAUTH_SECRET')
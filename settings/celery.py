@@ -28,7 +28,27 @@ CELERYBEAT_SCHEDULE = {
         # 15 minutes past every hour
         'schedule': crontab(minute=15),
     },
+    'write_analytics_snapshot': {
+        'task':
+            'apps.annotation.tasks.write_analytics_snapshot',
+        # At night, when the database is the least busy
+        'schedule': crontab(hour=3, minute=30),
+    },
+    'rebuild_membership_filter': {
+        'task':
+            'apps.annotation.tasks.rebuild_membership_filter',
+        # Drops URLs with no active annotations left, which can only be false positives until then
+        'schedule': crontab(minute=45),
+    },
 }
 
+if _env.ANNOTATION_UPVOTE_WRITE_BEHIND:
+    CELERYBEAT_SCHEDULE['flush_upvote_buffer'] = {
+        'task':
+            'apps.annotation.tasks.flush_upvote_buffer',
+        # Every 10 seconds, just a few cache reads when there is nothing buffered
+        'schedule': 10,
+    }
+
 if _env.ENV == 'test':
     CELERY_ALWAYS_EAGER = True
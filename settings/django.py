@@ -182,6 +182,19 @@ DATABASES = {
     'default': dj_database_url.config(conn_max_age=500) if _env.ENV != 'test' else
             {'ENGINE': 'django.db.backends.sqlite3', 'NAME': 'test-db'}
 }
+# Ids of upvotes written behind are reserved from the database sequence (see apps.annotation.upvotes)
+assert not _env.ANNOTATION_UPVOTE_WRITE_BEHIND or 'postgresql' in DATABASES['default']['ENGINE'], \
+    "ANNOTATION_UPVOTE_WRITE_BEHIND requires PostgreSQL"
+
+CACHES = {
+    # Shared by all web processes, so data cached by one of them is invalidated for all of them
+    'default': {
+        'BACKEND': 'django_redis.cache.RedisCache',
+        'LOCATION': _env.REDIS_URL,
+        'KEY_PREFIX': 'pp',
+    } if _env.ENV != 'test' else
+            {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}
+}
 
 
 AUTH_PASSWORD_VALIDATORS = [
@@ -214,7 +227,7 @@ REST_FRAMEWORK = {
         'rest_framework_json_api.parsers.JSONParser',
     ),
     'DEFAULT_RENDERER_CLASSES': (
-        'rest_framework_json_api.renderers.JSONRenderer',
+        'apps.api.renderers.JSONRenderer',
     ),
     'DEFAULT_FILTER_BACKENDS': (
         'django_filters.rest_framework.DjangoFilterBackend',
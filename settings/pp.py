@@ -1,3 +1,5 @@
+import os
+
 from . import _env
 
 # Unique identifier of user that is used to create Demagog annotations with.
@@ -11,3 +13,75 @@ if _env.ENV == 'prod':
     GA_TRACKING_ID = _GA_TRACKING_ID_PROD
 else:
     GA_TRACKING_ID = _GA_TRACKING_ID_DEV
+
+# Rules of URL standardization (see apps.annotation.utils.canonicalize_url); after changing them,
+# url_id of the stored rows is recomputed by the recompute_url_ids command (run on release)
+URL_CANONICALIZATION = {
+    # Query vars ignored (tracking etc.), shell-style wildcards are allowed
+    'OMITTED_QUERY_VARS': [
+        # Universal Tracking Module convention names
+        'utm_*',
+        # General convention for references
+        'ref',
+        # Click identifiers of Facebook, Google, DoubleClick, Yandex, Instagram, MailChimp and Google Analytics
+        'fbclid', 'gclid', 'dclid', 'yclid', 'igshid', 'mc_cid', 'mc_eid', '_ga',
+        # AMP versions
+        'amp',
+    ],
+    # Host prefix ignored when identifying URLs (url_id only), so www and mobile versions of a page are the same page
+    'HOST_ALIAS_PREFIX': r'^(?:www|m|mobile)\.(?=[^.]+\.[^.]+)',
+    # (regular expression, replacement) pairs applied to the path
+    'PATH_RULES': [
+        # AMP versions of articles, e.g. /article/amp or /article.amp
+        [r'(?:/amp|\.amp)/?$', ''],
+    ],
+}
+
+# Resolution of URL aliases (see apps.annotation.aliases) is cached in the shared cache (invalidated on change)
+# and for a short time in the memory of every process (not invalidated, so this is how long a change may be ignored)
+ANNOTATION_URL_ALIAS_CACHE_TIMEOUT = 24 * 60 * 60
+ANNOTATION_URL_ALIAS_LOCAL_TIMEOUT = 60
+ANNOTATION_URL_ALIAS_LOCAL_SIZE = 10000
+
+# How long (in seconds) user-independent annotation list data for a single URL is kept in cache.
+# Entries are invalidated on every write anyway, so this is only an upper bound for unexpected staleness.
+ANNOTATION_URL_CACHE_TIMEOUT = 60 * 60
+# Versions of URLs (used for ETags), after expiration clients just get the full response once again
+ANNOTATION_URL_VERSION_TIMEOUT = 24 * 60 * 60
+# Rendering of a URL's annotation list snapshot is scheduled at most once in this time (see apps.annotation.snapshots)
+ANNOTATION_SNAPSHOT_PENDING_TIMEOUT = 60
+# Only URLs listed this many times within the window (in seconds) are snapshotted
+ANNOTATION_SNAPSHOT_HIT_THRESHOLD = 10
+ANNOTATION_SNAPSHOT_HIT_WINDOW = 60
+
+# Changes of annotations (see the changes endpoint) made in this time (in seconds) are listed again by the next
+# request, since a transaction may commit a change after changes made later (with greater ids) are already listed
+ANNOTATION_CHANGES_TOKEN_OVERLAP = 60
+
+# Maximum number of URLs that can be looked up in a single annotations batch request
+ANNOTATION_BATCH_MAX_URLS = 100
+# Maximum number of annotations whose user specific state can be requested at once
+ANNOTATION_BATCH_MAX_IDS = 100
+
+# How long browsers and proxies may reuse the (user independent) shared annotation list of a URL
+ANNOTATION_SHARED_LIST_MAX_AGE = 60
+
+# Number of rows fetched at once from the server-side cursor when exporting (see apps.annotation.exports)
+ANNOTATION_EXPORT_CHUNK_SIZE = 2000
+
+# Bloom filter of annotated URLs (see apps.annotation.membership), 2^20 bits (128 KiB) and 7 hash functions
+# give below 1% of false positives for 100k URLs
+ANNOTATION_MEMBERSHIP_FILTER_SIZE = 2 ** 20
+ANNOTATION_MEMBERSHIP_FILTER_HASH_COUNT = 7
+ANNOTATION_MEMBERSHIP_FILTER_LOCK_TIMEOUT = 60
+# Seconds after which clients should ask again for the filter being built
+ANNOTATION_MEMBERSHIP_FILTER_RETRY_AFTER = 30
+
+# Upvotes are recorded in the shared cache and written to the database in batches by flush_upvote_buffer task
+# (see apps.annotation.upvotes), rather than one by one on every request
+ANNOTATION_UPVOTE_WRITE_BEHIND = _env.ANNOTATION_UPVOTE_WRITE_BEHIND
+ANNOTATION_UPVOTE_BUFFER_LOCK_TIMEOUT = 10
+
+# Directory of the columnar snapshots of annotation data for analytics (see apps.annotation.analytics)
+ANALYTICS_SNAPSHOT_DIR = _env.ANALYTICS_SNAPSHOT_DIR or \
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'analytics')